@@ -0,0 +1,229 @@
+'''
+Render with a module exported by Utils/AOT.py through Taichi's C API. This doesn't import Taichi's Python package, so no Python is traced and no kernels are compiled from Python when a worker starts
+'''
+import argparse
+import ctypes
+import importlib.util
+import json
+import os
+import time
+import numpy as np
+
+AOT_MANIFEST, AOT_SCENE = 'renderModule.json', 'scene.npz'
+TI_ARCHS = {'x64': 4, 'arm64': 5, 'vulkan': 1, 'cuda': 6} #TiArch values from taichi_core.h
+CPU_ARCHS = ('x64', 'arm64')
+TI_ARGUMENT_TYPE_I32, TI_ARGUMENT_TYPE_F32, TI_ARGUMENT_TYPE_NDARRAY = 0, 1, 2
+TI_DATA_TYPES = {np.dtype(np.float32): 1, np.dtype(np.int32): 5}
+TI_MEMORY_USAGE_STORAGE = 1
+
+class TiNdShape(ctypes.Structure):
+    _fields_ = [('dimCount', ctypes.c_uint32), ('dims', ctypes.c_uint32 * 16)]
+
+class TiNdArray(ctypes.Structure):
+    _fields_ = [('memory', ctypes.c_void_p), ('shape', TiNdShape), ('elemShape', TiNdShape), ('elemType', ctypes.c_uint32)]
+
+class TiArgumentValue(ctypes.Union):
+    _fields_ = [('i32', ctypes.c_int32), ('f32', ctypes.c_float), ('ndarray', TiNdArray), ('padding', ctypes.c_uint8 * 152)] #Padded to the size of the largest members (TiNdArray and TiTensor) so that arrays of arguments line up
+
+class TiArgument(ctypes.Structure):
+    _fields_ = [('type', ctypes.c_uint32), ('value', TiArgumentValue)]
+
+class TiMemoryAllocateInfo(ctypes.Structure):
+    _fields_ = [('size', ctypes.c_uint64), ('hostWrite', ctypes.c_uint32), ('hostRead', ctypes.c_uint32), ('exportSharing', ctypes.c_uint32), ('usage', ctypes.c_uint32)]
+
+def loadTaichiLibrary():
+    '''
+    Load the Taichi C API library that ships with the taichi wheel (found without importing taichi)
+    '''
+    taichiDir = importlib.util.find_spec('taichi').submodule_search_locations[0]
+    os.environ.setdefault('TI_LIB_DIR', os.path.join(taichiDir, '_lib', 'runtime')) #Where the runtime looks for its LLVM bitcode
+    library = ctypes.CDLL(os.path.join(taichiDir, '_lib', 'c_api', 'lib', 'libtaichi_c_api.so'))
+    for name, restype, argtypes in (
+        ('ti_create_runtime', ctypes.c_void_p, [ctypes.c_uint32, ctypes.c_uint32]),
+        ('ti_destroy_runtime', None, [ctypes.c_void_p]),
+        ('ti_load_aot_module', ctypes.c_void_p, [ctypes.c_void_p, ctypes.c_char_p]),
+        ('ti_destroy_aot_module', None, [ctypes.c_void_p]),
+        ('ti_get_aot_module_kernel', ctypes.c_void_p, [ctypes.c_void_p, ctypes.c_char_p]),
+        ('ti_launch_kernel', None, [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint32, ctypes.POINTER(TiArgument)]),
+        ('ti_allocate_memory', ctypes.c_void_p, [ctypes.c_void_p, ctypes.POINTER(TiMemoryAllocateInfo)]),
+        ('ti_free_memory', None, [ctypes.c_void_p, ctypes.c_void_p]),
+        ('ti_map_memory', ctypes.c_void_p, [ctypes.c_void_p, ctypes.c_void_p]),
+        ('ti_unmap_memory', None, [ctypes.c_void_p, ctypes.c_void_p]),
+        ('ti_wait', None, [ctypes.c_void_p]),
+        ('ti_get_last_error', ctypes.c_int32, [ctypes.POINTER(ctypes.c_uint64), ctypes.c_char_p])
+    ):
+        function = getattr(library, name)
+        function.restype, function.argtypes = restype, argtypes
+    return library
+
+class aotRenderer:
+    '''
+    Run the render, BVH build, and camera update kernels of an exported module. Scenes are passed in as arrays (like World.addSpheres and createMaterialTable make) and copied into the module's fields by its load kernels
+    '''
+    def __init__(self, moduleDir: str):
+        with open(os.path.join(moduleDir, AOT_MANIFEST)) as file:
+            self.manifest = json.load(file)
+        self.imageWidth, self.imageHeight, self.samplesPerPixel = self.manifest['imageWidth'], self.manifest['imageHeight'], self.manifest['samplesPerPixel']
+        self.numSpheres, self.numPasses = 0, 0
+
+        self.library = loadTaichiLibrary()
+        self.runtime = self.library.ti_create_runtime(TI_ARCHS[self.manifest['arch']], 0)
+        self.checkError('creating the runtime')
+        self.module = self.library.ti_load_aot_module(self.runtime, os.path.abspath(moduleDir).encode())
+        self.checkError(f'loading {moduleDir}')
+        self.kernels = {name: self.library.ti_get_aot_module_kernel(self.module, name.encode()) for name in self.manifest['kernels']}
+        self.checkError('finding the kernels')
+
+    def checkError(self, action: str):
+        size, message = ctypes.c_uint64(1024), ctypes.create_string_buffer(1024)
+        errorCode = self.library.ti_get_last_error(ctypes.byref(size), message)
+        if errorCode < 0:
+            raise RuntimeError(f'Taichi error {errorCode} while {action}: {message.value.decode()}')
+
+    def allocateArray(self, array):
+        '''
+        Copy a NumPy array to device memory and return the memory and the kernel argument for it
+        '''
+        array = np.ascontiguousarray(array)
+        memory = self.library.ti_allocate_memory(self.runtime, ctypes.byref(TiMemoryAllocateInfo(max(array.nbytes, 4), 1, 1, 0, TI_MEMORY_USAGE_STORAGE)))
+        self.checkError('allocating memory')
+        ctypes.memmove(self.library.ti_map_memory(self.runtime, memory), array.ctypes.data, array.nbytes)
+        self.library.ti_unmap_memory(self.runtime, memory)
+
+        argument = TiArgument(TI_ARGUMENT_TYPE_NDARRAY)
+        argument.value.ndarray.memory, argument.value.ndarray.elemType = memory, TI_DATA_TYPES[array.dtype]
+        argument.value.ndarray.shape.dimCount = array.ndim
+        for i, size in enumerate(array.shape):
+            argument.value.ndarray.shape.dims[i] = size
+        return memory, argument
+
+    def readArray(self, memory, shape, dtype):
+        self.library.ti_wait(self.runtime)
+        array = np.empty(shape, dtype)
+        ctypes.memmove(array.ctypes.data, self.library.ti_map_memory(self.runtime, memory), array.nbytes)
+        self.library.ti_unmap_memory(self.runtime, memory)
+        return array
+
+    def launch(self, name: str, *args):
+        '''
+        Launch a kernel with ints, floats, and arrays from allocateArray as its arguments
+        '''
+        arguments = (TiArgument * max(len(args), 1))()
+        for argument, value in zip(arguments, args):
+            if isinstance(value, TiArgument):
+                ctypes.pointer(argument)[0] = value
+            elif isinstance(value, (int, np.integer)):
+                argument.type, argument.value.i32 = TI_ARGUMENT_TYPE_I32, value
+            else:
+                argument.type, argument.value.f32 = TI_ARGUMENT_TYPE_F32, value
+        self.library.ti_launch_kernel(self.runtime, self.kernels[name], len(args), arguments)
+        self.checkError(f'launching {name}')
+
+    def launchWithArrays(self, name: str, arrays, *args):
+        memories, arguments = zip(*[self.allocateArray(array) for array in arrays])
+        self.launch(name, *arguments, *args)
+        self.freeMemory(*memories)
+
+    def freeMemory(self, *memories):
+        self.library.ti_wait(self.runtime)
+        if self.manifest['arch'] in CPU_ARCHS: #The CPU runtime can't free memory on its own, so it's freed along with the runtime
+            return 
+        for memory in memories:
+            self.library.ti_free_memory(self.runtime, memory)
+
+    def loadScene(self, centers, radii, materialIndices, materialTable):
+        '''
+        Load the spheres and the material table (from createMaterialTable), fill the light list with the emissive spheres, and build the BVH tree over the spheres
+        '''
+        centers, radii = np.asarray(centers, np.float32).reshape(-1, 3), np.asarray(radii, np.float32).reshape(-1)
+        materialIndices = np.asarray(materialIndices, np.int32).reshape(-1)
+        numMaterials = len(materialTable['materialType'])
+        if len(radii) > self.manifest['sphereCapacity'] or numMaterials > self.manifest['materialCapacity']:
+            raise ValueError(f'The module holds at most {self.manifest["sphereCapacity"]} spheres and {self.manifest["materialCapacity"]} materials')
+
+        self.launchWithArrays('loadMaterials', [np.asarray(materialTable[member], dtype) for member, dtype in (('materialType', np.int32), ('color', np.float32), ('fuzz', np.float32), ('refractionIndex', np.float32))], numMaterials)
+        self.launchWithArrays('loadSpheres', [centers, radii, materialIndices], len(radii))
+        lights = np.flatnonzero(np.asarray(materialTable['materialType'])[materialIndices] == self.manifest['emissiveMaterialType']).astype(np.int32)
+        self.launchWithArrays('loadLights', [np.pad(lights, (0, len(lights) == 0))], len(lights)) #Arrays can't be empty
+        self.numSpheres = len(radii)
+        self.buildTree()
+        self.resetAccumulation()
+
+    def buildTree(self):
+        '''
+        Build the LBVH the same way BVHTree.buildTree and radixSorter.sort do
+        '''
+        numKeys = self.numSpheres
+        numBlocks = max((numKeys + self.manifest['sortBlockSize'] - 1) // self.manifest['sortBlockSize'], 1)
+        self.launch('initLeaves', self.numSpheres)
+        self.launch('encodeLeaves')
+        inBuffer = False
+        for shift in self.manifest['sortShifts']:
+            self.launch('countDigitsBuffer' if inBuffer else 'countDigitsLeaves', numKeys, numBlocks, shift)
+            self.launch('scanDigitCounts', numBlocks)
+            self.launch('scatterBuffer' if inBuffer else 'scatterLeaves', numKeys, numBlocks, shift)
+            inBuffer = not inBuffer
+        if inBuffer:
+            self.launch('copyBack', numKeys)
+        self.launch('gatherBoundingBoxes')
+        self.launch('buildNodes')
+
+    def setView(self, cameraPos, lookAt):
+        '''
+        Move the camera to cameraPos looking at lookAt and throw away the accumulated samples
+        '''
+        self.launchWithArrays('loadView', [np.array([cameraPos, lookAt], np.float32)])
+        self.launch('updateCamera')
+        self.resetAccumulation()
+
+    def resetAccumulation(self):
+        self.launch('resetAccumulation')
+        self.numPasses = 0
+
+    def render(self, numPasses = 1):
+        for _ in range(numPasses):
+            self.launch('renderPixels')
+        self.library.ti_wait(self.runtime)
+        self.numPasses += numPasses
+
+    def linearImage(self):
+        '''
+        Return the accumulated linear image as a NumPy array (width x height x 3 like Camera.linearImage)
+        '''
+        memory, argument = self.allocateArray(np.zeros((self.imageWidth, self.imageHeight, 3), np.float32))
+        self.launch('readImage', argument)
+        image = self.readArray(memory, (self.imageWidth, self.imageHeight, 3), np.float32)
+        self.freeMemory(memory)
+        return image
+
+    def close(self):
+        self.library.ti_destroy_aot_module(self.module)
+        self.library.ti_destroy_runtime(self.runtime)
+
+def renderModule(moduleDir: str, numPasses: int, outputPath: str):
+    '''
+    Render the scene that was exported with the module and save the linear image as a .npy file
+    '''
+    start = time.perf_counter()
+    renderer = aotRenderer(moduleDir)
+    loadTime = time.perf_counter()
+    scene = np.load(os.path.join(moduleDir, AOT_SCENE))
+    renderer.loadScene(scene['centers'], scene['radii'], scene['materialIndices'], {member: scene[member] for member in ('materialType', 'color', 'fuzz', 'refractionIndex')})
+    renderer.setView(scene['cameraPos'], scene['lookAt'])
+    renderer.render(numPasses)
+    image = renderer.linearImage()
+    renderTime = time.perf_counter()
+    renderer.close()
+
+    os.makedirs(os.path.dirname(outputPath) or '.', exist_ok = True)
+    np.save(outputPath, image)
+    print(f'Loaded {moduleDir} in {loadTime - start:.3f} s and rendered {renderer.imageWidth}x{renderer.imageHeight} at {renderer.samplesPerPixel} spp x {numPasses} passes in {renderTime - loadTime:.3f} s')
+    print(f'Saved {outputPath}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Render the scene saved with a module from Main.py --export-aot without tracing or compiling Python kernels')
+    parser.add_argument('module', help = 'Directory of the exported module')
+    parser.add_argument('--passes', type = int, default = 1, help = 'Number of accumulated passes to render')
+    parser.add_argument('--output', default = 'render.npy', help = 'Where to save the linear image')
+    arguments = parser.parse_args()
+    renderModule(arguments.module, arguments.passes, arguments.output)
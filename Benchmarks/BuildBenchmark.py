@@ -0,0 +1,69 @@
+from Utils.BoundTree import *
+from Utils.Runtime import *
+import argparse
+import time 
+
+@ti.data_oriented 
+class benchmarkTree(BVHTree):
+    '''
+    BVH tree filled with randomly placed leaves so that the build can be timed without creating a scene
+    '''
+    def __init__(self, numLeaves: int):
+        super().__init__()
+        self.reserveLeaves(numLeaves)
+        self.numLeaves[None] = numLeaves
+
+    @ti.kernel 
+    def randomLeaves(self, radius: float):
+        '''
+        Fill the leaves with small boxes at random positions in the unit cube
+        '''
+        for i in ti.ndrange(self.numLeaves[None]):
+            center = randVectorRange(0.0, 1.0)
+            self.leaves[i].objectIndex = i 
+            self.leaves[i].boundingBox = aabb(setInterval(getX(center) - radius, getX(center) + radius), setInterval(getY(center) - radius, getY(center) + radius), setInterval(getZ(center) - radius, getZ(center) + radius))
+            self.leaves[i].mortonCode = mortonEncode(center)
+
+def timeBuild(tree, repeats: int):
+    '''
+    Return the best sort time, node generation time, and refit time over the repeats (every build refills the leaves because sorting changes them)
+    '''
+    sortTimes, nodeTimes, refitTimes = [], [], []
+    for _ in range(repeats):
+        tree.randomLeaves(0.5 / tree.numLeaves[None] ** (1 / 3))
+        ti.sync()
+
+        start = time.perf_counter()
+        tree.sortLeaves()
+        ti.sync()
+        sortedTime = time.perf_counter()
+        tree.buildNodes(tree.sceneVersion)
+        ti.sync()
+        builtTime = time.perf_counter()
+        tree.refit()
+        ti.sync()
+        end = time.perf_counter()
+
+        sortTimes.append(sortedTime - start)
+        nodeTimes.append(builtTime - sortedTime)
+        refitTimes.append(end - builtTime)
+    return min(sortTimes), min(nodeTimes), min(refitTimes)
+
+def runBenchmark(leafCounts, repeats: int):
+    print(f'{"leaves":>10} {"sort (ms)":>12} {"nodes (ms)":>12} {"build (ms)":>12} {"Mleaves/s":>10} {"refit (ms)":>12}')
+    for numLeaves in leafCounts:
+        tree = benchmarkTree(numLeaves)
+        timeBuild(tree, 1) #Compile the kernels before timing
+        sortTime, nodeTime, refitTime = timeBuild(tree, repeats)
+        buildTime = sortTime + nodeTime 
+        print(f'{numLeaves:>10} {sortTime * 1e3:>12.2f} {nodeTime * 1e3:>12.2f} {buildTime * 1e3:>12.2f} {numLeaves / buildTime / 1e6:>10.2f} {refitTime * 1e3:>12.2f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Time the LBVH build (Morton code sort and node generation) and refitting the tree for increasing numbers of leaves')
+    parser.add_argument('--backend', choices = list(BACKENDS), default = 'gpu', help = 'Taichi backend to run on')
+    parser.add_argument('--threads', type = int, default = None, help = 'Maximum number of CPU threads (all of them by default)')
+    parser.add_argument('--leaves', type = int, nargs = '+', default = [1000, 10000, 100000, 1000000], help = 'Leaf counts to time')
+    parser.add_argument('--repeats', type = int, default = 3, help = 'Number of timed builds for each leaf count (the best is reported)')
+    arguments = parser.parse_args()
+    initRenderer(arguments.backend, arguments.threads)
+    runBenchmark(arguments.leaves, arguments.repeats)
@@ -0,0 +1,64 @@
+from Utils.Camera import *
+from Main import createScene
+from Benchmarks.Scenes import createUnevenScene
+import argparse
+import time 
+import numpy as np 
+
+@ti.kernel 
+def traceClosestHits(camera: ti.template(), sceneVersion: ti.template()) -> int: #type: ignore
+    '''
+    Trace one primary ray for every pixel to the closest hit without shading (so only the tree is timed) and return how many rays hit something
+    '''
+    numHits = 0
+    for i, j in camera.pixelField:
+        if camera.hitObjects(camera.constructRay(i, j, randomSample2D()), initDefaultHitRecord(camera.tInterval)).hitAnything:
+            numHits += 1
+    return numHits 
+
+def timeIt(function, repeats: int):
+    '''
+    Return the best time of the function over the repeats
+    '''
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        ti.sync()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def benchmarkBuilder(sceneName: str, treeBuilder: str, imageWidth: int, repeats: int):
+    if sceneName == 'main':
+        camera = Camera(vec3(0, 0, 1), imageWidth, 90, vec3(0, 0, -1), 16 / 9, 0.001, 1e10, 1, 8, treeBuilder = treeBuilder)
+        createScene(camera)
+    else: 
+        camera = Camera(vec3(0, 3, 25), imageWidth, 60, vec3(0, 0, 0), 16 / 9, 0.001, 1e10, 1, 8, treeBuilder = treeBuilder)
+        createUnevenScene(camera, int(sceneName))
+    camera.updateScene()
+    traceClosestHits(camera, camera.sceneVersion)
+    camera.render() #Compile the kernels before timing
+
+    buildTime = timeIt(camera.compileTree, repeats)
+    traceTime = timeIt(lambda: traceClosestHits(camera, camera.sceneVersion), repeats)
+    renderTime = timeIt(camera.render, repeats)
+    numPixels = camera.imageWidth * camera.imageHeight 
+    return buildTime, camera.sahCost(), numPixels / traceTime / 1e6, numPixels / renderTime / 1e6
+
+def runBenchmark(sceneNames, imageWidth: int, repeats: int):
+    print(f'{"scene":>10} {"builder":>8} {"build (ms)":>12} {"SAH cost":>10} {"primary Mrays/s":>16} {"Msamples/s":>11}')
+    for sceneName in sceneNames:
+        for treeBuilder in (LBVH_BUILDER, SAH_BUILDER):
+            buildTime, sahCost, traceRate, sampleRate = benchmarkBuilder(sceneName, treeBuilder, imageWidth, repeats)
+            print(f'{sceneName:>10} {treeBuilder:>8} {buildTime * 1e3:>12.2f} {sahCost:>10.2f} {traceRate:>16.2f} {sampleRate:>11.2f}')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Compare the LBVH and binned SAH builders: build time, SAH cost of the tree, primary ray throughput, and full render throughput')
+    parser.add_argument('--backend', choices = list(BACKENDS), default = 'gpu', help = 'Taichi backend to run on')
+    parser.add_argument('--threads', type = int, default = None, help = 'Maximum number of CPU threads (all of them by default)')
+    parser.add_argument('--scenes', nargs = '+', default = ['main', '1000', '100000'], help = "Scenes to compare: 'main' for Main.py's scene or a number of random spheres next to a large ground sphere")
+    parser.add_argument('--width', type = int, default = 640, help = 'Image width in pixels')
+    parser.add_argument('--repeats', type = int, default = 3, help = 'Number of timed runs (the best is reported)')
+    arguments = parser.parse_args()
+    initRenderer(arguments.backend, arguments.threads)
+    runBenchmark(arguments.scenes, arguments.width, arguments.repeats)
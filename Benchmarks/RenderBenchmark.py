@@ -0,0 +1,139 @@
+from Utils.Camera import *
+from Main import createScene
+from Benchmarks.Scenes import randomSpheresCamera, randomSpheresScene
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+def timeCall(function):
+    start = time.perf_counter()
+    function()
+    ti.sync()
+    return time.perf_counter() - start
+
+def createBenchmarkCamera(sceneName: str, imageWidth: int, samplesPerPixel: int, maxDepth: int, treeBuilder: str, renderer: str, seed: int, countTraversal = False):
+    '''
+    Create the camera for a scene: 'main' for Main.py's scene or 'random-N' for the random spheres field with N spheres
+    '''
+    cameraOptions = {'treeBuilder': treeBuilder, 'renderer': renderer, 'countTraversal': countTraversal, 'countPaths': True} #The rays per second come from the path counters
+    if sceneName == 'main':
+        camera = Camera(vec3(0, 0, 1), imageWidth, 90, vec3(0, 0, -1), 16 / 9, 0.001, 1e10, samplesPerPixel, maxDepth, **cameraOptions)
+        createScene(camera)
+    elif sceneName.startswith('random-'):
+        numSpheres = int(sceneName[len('random-'):])
+        camera = randomSpheresCamera(numSpheres, imageWidth, samplesPerPixel, maxDepth, **cameraOptions)
+        randomSpheresScene(camera, numSpheres, seed)
+    else:
+        raise ValueError(f'Unknown scene {sceneName}')
+    camera.setCamera()
+    return camera
+
+def benchmarkScene(sceneName: str, imageWidth: int, samplesPerPixel: int, maxDepth: int, repeats: int, treeBuilder: str, renderer: str, seed: int, countTraversal = False):
+    '''
+    Time building and rendering a scene. The compile time is the time Camera.warmUp spends compiling the render kernels, and the first build time is its first build of the scene (which also compiles the build kernels). With countTraversal the traversal counters per ray are added to the results (counting slows the render down)
+    '''
+    camera = createBenchmarkCamera(sceneName, imageWidth, samplesPerPixel, maxDepth, treeBuilder, renderer, seed, countTraversal)
+    camera.warmUp()
+    buildTime = min(timeCall(camera.compileTree) for _ in range(repeats))
+
+    camera.resetCounters()
+    renderTimes = [timeCall(camera.render) for _ in range(repeats)]
+    numRays, numPaths = camera.pathStatistics.rayCountField[None], camera.pathStatistics.pathCountField[None]
+    renderTime = min(renderTimes)
+
+    numSamples = camera.imageWidth * camera.imageHeight * samplesPerPixel
+    counters = camera.traversalStatistics.perRay() if countTraversal else {}
+    return {
+        'scene': sceneName,
+        'numSpheres': camera.numSpheres,
+        'compileTime': startupTimes['compile'],
+        'firstBuildTime': startupTimes['scene'],
+        'buildTime': buildTime,
+        'renderTime': renderTime,
+        'mraysPerSecond': numRays / sum(renderTimes) / 1e6,
+        'samplesPerSecond': numSamples / renderTime,
+        'averagePathLength': numRays / max(numPaths, 1)
+    } | counters
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmarkMetadata(arguments):
+    '''
+    Record what the results were measured with so that two result files can be compared fairly
+    '''
+    return {
+        'commit': gitCommit(),
+        'taichiVersion': '.'.join(map(str, ti.__version__)),
+        'arch': str(ti.lang.impl.current_cfg().arch),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpuCount': os.cpu_count(),
+        'threads': arguments.threads,
+        'python': platform.python_version(),
+        'imageWidth': arguments.width,
+        'samplesPerPixel': arguments.spp,
+        'maxDepth': arguments.max_depth,
+        'repeats': arguments.repeats,
+        'builder': arguments.builder,
+        'renderer': arguments.renderer,
+        'counters': arguments.counters,
+        'seed': arguments.seed
+    }
+
+def compareResults(results, baselinePath: str):
+    '''
+    Print how much every timing changed relative to an earlier result file
+    '''
+    with open(baselinePath) as file:
+        baseline = {result['scene']: result for result in json.load(file)['results']}
+    print(f'\nChange from {baselinePath} (positive is better)')
+    print(f'{"scene":>16} {"compile":>9} {"build":>9} {"Mrays/s":>9} {"samples/s":>10}')
+    for result in results:
+        if result['scene'] not in baseline:
+            continue
+        old = baseline[result['scene']]
+        faster = lambda key: (old[key] / result[key] - 1) * 100 if result[key] > 0 else 0.0
+        higher = lambda key: (result[key] / old[key] - 1) * 100 if old[key] > 0 else 0.0
+        print(f'{result["scene"]:>16} {faster("compileTime"):>+8.1f}% {faster("buildTime"):>+8.1f}% {higher("mraysPerSecond"):>+8.1f}% {higher("samplesPerSecond"):>+9.1f}%')
+
+def runBenchmark(arguments):
+    results = []
+    print(f'{"scene":>16} {"spheres":>9} {"compile (s)":>12} {"build (ms)":>11} {"Mrays/s":>9} {"Msamples/s":>11} {"path length":>12}' + (f' {"boxes/ray":>10} {"objects/ray":>10} {"nodes/ray":>10}' if arguments.counters else ''))
+    for sceneName in arguments.scenes:
+        result = benchmarkScene(sceneName, arguments.width, arguments.spp, arguments.max_depth, arguments.repeats, arguments.builder, arguments.renderer, arguments.seed, arguments.counters)
+        results.append(result)
+        print(f'{sceneName:>16} {result["numSpheres"]:>9} {result["compileTime"]:>12.2f} {result["buildTime"] * 1e3:>11.2f} {result["mraysPerSecond"]:>9.2f} {result["samplesPerSecond"] / 1e6:>11.2f} {result["averagePathLength"]:>12.2f}' + (f' {result["boxTestsPerRay"]:>10.2f} {result["objectTestsPerRay"]:>10.2f} {result["nodesVisitedPerRay"]:>10.2f}' if arguments.counters else ''))
+
+    if arguments.output:
+        os.makedirs(os.path.dirname(arguments.output) or '.', exist_ok = True)
+        with open(arguments.output, 'w') as file:
+            json.dump({'metadata': benchmarkMetadata(arguments), 'results': results}, file, indent = 2)
+        print(f'Saved {arguments.output}')
+    if arguments.compare:
+        compareResults(results, arguments.compare)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Measure kernel compile time, BVH build time, and render throughput on procedural scenes at a fixed resolution and sample count, and write the results to JSON so they can be compared between commits')
+    parser.add_argument('--backend', choices = list(BACKENDS), default = 'gpu', help = 'Taichi backend to run on')
+    parser.add_argument('--threads', type = int, default = None, help = 'Maximum number of CPU threads (all of them by default)')
+    parser.add_argument('--scenes', nargs = '+', default = ['random-10', 'random-1000', 'random-100000', 'random-1000000'], help = "Scenes to render: 'main' for Main.py's scene or 'random-N' for the random spheres field with N spheres")
+    parser.add_argument('--width', type = int, default = 320, help = 'Image width in pixels')
+    parser.add_argument('--spp', type = int, default = 1, help = 'Samples per pixel for every render')
+    parser.add_argument('--max-depth', type = int, default = 8, help = 'Maximum number of ray bounces')
+    parser.add_argument('--repeats', type = int, default = 3, help = 'Number of timed runs (the best is reported)')
+    parser.add_argument('--builder', choices = [LBVH_BUILDER, SAH_BUILDER], default = LBVH_BUILDER, help = 'BVH builder')
+    parser.add_argument('--renderer', choices = [MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER], default = MEGAKERNEL_RENDERER, help = 'Renderer')
+    parser.add_argument('--counters', action = 'store_true', help = 'Also count the box tests, object tests, and BVH nodes visited per ray (this slows rendering down)')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Seed for the scene generators and the random numbers used while rendering')
+    parser.add_argument('--output', default = 'benchmark.json', help = 'Where to write the JSON results (an empty string skips writing them)')
+    parser.add_argument('--compare', default = None, help = 'Earlier JSON results to print the change from')
+    arguments = parser.parse_args()
+    initRenderer(arguments.backend, arguments.threads, randomSeed = arguments.seed)
+    runBenchmark(arguments)
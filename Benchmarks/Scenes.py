@@ -0,0 +1,38 @@
+from Utils.Camera import *
+import numpy as np
+
+def randomSpheresCamera(numSpheres: int, imageWidth: int, samplesPerPixel: int, maxDepth: int, **cameraOptions):
+    '''
+    Create a camera looking over the random spheres field from randomSpheresScene, moved back as the field grows so that all of it stays in view
+    '''
+    distance = max(1.0, np.sqrt(numSpheres) / 22)
+    return Camera(vec3(13 * distance, 2 * distance, 3 * distance), imageWidth, 20, vec3(0, 0, 0), 16 / 9, 0.001, 1e10, samplesPerPixel, maxDepth, **cameraOptions)
+
+def randomSpheresScene(camera, numSpheres: int, seed = 0):
+    '''
+    Add the classic random spheres field with numSpheres spheres in total: a large ground sphere, three large spheres (glass, lambertian, and metal), and small spheres with mixed materials jittered on a square grid. The spheres and materials only depend on the seed
+    '''
+    rng = np.random.default_rng(seed)
+    palette = [camera.addMaterial(lambertianMaterial(vec3(*color))) for color in rng.uniform(0, 1, (16, 3)) * rng.uniform(0, 1, (16, 3))]
+    metals = [camera.addMaterial(reflectiveMaterial(vec3(*color), float(fuzz))) for color, fuzz in zip(rng.uniform(0.5, 1, (8, 3)), rng.uniform(0, 0.5, 8))]
+    glass = camera.addMaterial(dielectricMaterial(1.5))
+
+    camera.addSpheres([[0, -1000, 0], [0, 1, 0], [-4, 1, 0], [4, 1, 0]], [1000, 1, 1, 1], [palette[0], glass, palette[1], metals[0]])
+    numSmall = max(numSpheres - 4, 0)
+    side = int(np.ceil(np.sqrt(numSmall)))
+    cells = np.arange(numSmall)
+    centers = np.c_[cells % side - side / 2 + 0.9 * rng.uniform(0, 1, numSmall), np.full(numSmall, 0.2), cells // side - side / 2 + 0.9 * rng.uniform(0, 1, numSmall)]
+    materialChoice = rng.uniform(0, 1, numSmall)
+    materialIndices = np.where(materialChoice < 0.8, rng.choice(palette, numSmall), np.where(materialChoice < 0.95, rng.choice(metals, numSmall), glass))
+    camera.addSpheres(centers, np.full(numSmall, 0.2), materialIndices)
+
+def createUnevenScene(camera, numSpheres: int, seed = 0):
+    '''
+    Add a large ground sphere and numSpheres small spheres with mixed sizes and materials (like Main.py's scene but larger)
+    '''
+    rng = np.random.default_rng(seed)
+    camera.addHittable(sphere3(vec3(0, -1000, 0), 1000, lambertianMaterial(vec3(0.5, 0.5, 0.5))))
+    materialIndices = [camera.addMaterial(lambertianMaterial(vec3(0.1, 0.2, 0.5))), camera.addMaterial(reflectiveMaterial(vec3(0.8, 0.6, 0.2), 0.2)), camera.addMaterial(dielectricMaterial(1.5))]
+    radii = rng.choice([0.05, 0.2, 1.0], numSpheres, p = [0.8, 0.18, 0.02])
+    centers = np.c_[rng.uniform(-20, 20, numSpheres), radii, rng.uniform(-20, 20, numSpheres)]
+    camera.addSpheres(centers, radii, rng.choice(materialIndices, numSpheres))
@@ -1,7 +1,16 @@
 from Utils import *
+import argparse
+import os
+import time 
+import numpy as np 
 
-def renderScene(cameraPos: vec3, imageWidth: int, fov: float, focalLength: float, aspectRatio: float, samplesPerPixel: float, maxDepth: int, tMin = 0.001, tMax = 1e10): #type: ignore
-    camera = Camera(cameraPos, imageWidth, fov, focalLength, aspectRatio, tMin, tMax, samplesPerPixel, maxDepth)
+def createScene(camera, meshPath = None, scenePath = None):
+    '''
+    Add the scene's materials and objects to the camera. With a mesh path the center sphere is replaced by the mesh (an OBJ or PLY file) fitted to the sphere's size, and with a scene path the scene file is loaded instead
+    '''
+    if scenePath is not None:
+        loadScene(camera, scenePath)
+        return 
 
     materialGround = lambertianMaterial(vec3(0.8, 0.8, 0.0))
     materialCenter = lambertianMaterial(vec3(0.1, 0.2, 0.5))
@@ -9,21 +18,172 @@ def renderScene(cameraPos: vec3, imageWidth: int, fov: float, focalLength: float
     materialRight = reflectiveMaterial(vec3(0.8, 0.6, 0.2), 0.5)
     materialFront = reflectiveMaterial(vec3(0.8, 0.8, 0.8), 0.2)
 
-    camera.addHittable(sphere3(vec3(0, 0, -1), 0.5, materialCenter))
+    if meshPath is None:
+        camera.addHittable(sphere3(vec3(0, 0, -1), 0.5, materialCenter))
+    else: 
+        camera.addMeshFile(meshPath, materialCenter, center = (0, 0, -1), size = 1)
     camera.addHittable(sphere3(vec3(0, -100.5, -1), 100, materialGround))
     camera.addHittable(sphere3(vec3(-1, 0, -1), 0.5, materialLeft))
     camera.addHittable(sphere3(vec3(1, 0, -1), 0.5, materialRight))
     camera.addHittable(sphere3(vec3(0, 0, 0), 0.5, materialFront))
 
+def renderScene(cameraPos: vec3, imageWidth: int, fov: float, focalLength: float, aspectRatio: float, samplesPerPixel: float, maxDepth: int, tMin = 0.001, tMax = 1e10, treeBuilder = LBVH_BUILDER, renderer = MEGAKERNEL_RENDERER, rouletteDepth = 3, adaptiveThreshold = None, targetFrameTime = None, minScale = 0.25, countTraversal = False, costHeatmap = False, meshPath = None, scenePath = None, treeCache = None, denoise = False, temporal = False, sampler = SOBOL_SAMPLER): #type: ignore
+    '''
+    Render the scene in a window that can be moved around in. With a target frame time the scene is rendered at a lower resolution while the camera moves to keep frames near that time. With costHeatmap the window shows the traversal cost of every pixel instead, and with countTraversal the performance counters are printed when the window closes. With denoise every full resolution frame is denoised before it's shown, and with temporal the accumulated samples are reprojected when the camera moves instead of starting over
+    '''
+    camera = Camera(cameraPos, imageWidth, fov, focalLength, aspectRatio, tMin, tMax, samplesPerPixel, maxDepth, treeBuilder = treeBuilder, renderer = renderer, rouletteDepth = rouletteDepth, adaptiveThreshold = adaptiveThreshold, countTraversal = countTraversal, treeCache = treeCache, denoise = denoise, temporal = temporal, sampler = sampler)
+    createScene(camera, meshPath, scenePath)
+    scaler = resolutionScaler(targetFrameTime, minScale) if targetFrameTime is not None else None 
+    camera.warmUp(compilePreview = scaler is not None)
+    print(startupReport())
+
     window = ti.ui.Window('Render Test', res = (camera.imageWidth, camera.imageHeight), pos = (100, 100))
     canvas = window.get_canvas()
 
     while window.running: 
         cameraKeyMovement(camera, window)
         cameraMouseMovement(camera, window)
-        camera.setCamera()
-        camera.render()
+        cameraMoving = camera.setCamera()
+
+        start = time.perf_counter()
+        if costHeatmap:
+            camera.renderCostHeatmap()
+        else: 
+            camera.render(scaler.renderScale(cameraMoving) if scaler is not None else 1.0)
+        ti.sync()
+        if scaler is not None and cameraMoving:
+            scaler.addFrameTime(time.perf_counter() - start)
         canvas.set_image(camera.pixelField)
         window.show()
-        
-renderScene(vec3(0, 0, 1), 2000, 90, vec3(0, 0, -1), 16 / 9, 2, 25)
\ No newline at end of file
+    if countTraversal:
+        printCounters(camera)
+
+def printCounters(camera):
+    print(', '.join(f'{name} {value:,.2f}' if isinstance(value, float) else f'{name} {value:,}' for name, value in camera.performanceCounters().items()))
+
+def saveRender(camera, outputPath: str):
+    '''
+    Save the render as a gamma corrected PNG and the raw linear floating point values as a .npy file next to it
+    '''
+    outputPath = os.path.splitext(outputPath)[0]
+    os.makedirs(os.path.dirname(outputPath) or '.', exist_ok = True)
+    ti.tools.imwrite(camera.pixelField.to_numpy(), outputPath + '.png')
+    np.save(outputPath + '.npy', camera.linearImage())
+    return outputPath + '.png', outputPath + '.npy'
+
+def renderHeadless(cameraPos: vec3, imageWidth: int, fov: float, focalLength: float, aspectRatio: float, samplesPerPixel: float, maxDepth: int, numPasses: int, outputPath: str, tMin = 0.001, tMax = 1e10, treeBuilder = LBVH_BUILDER, renderer = MEGAKERNEL_RENDERER, rouletteDepth = 3, adaptiveThreshold = None, countTraversal = False, costHeatmap = False, meshPath = None, scenePath = None, treeCache = None, denoise = False, sampler = SOBOL_SAMPLER): #type: ignore
+    '''
+    Render the scene for a fixed number of passes (or until every pixel converged with adaptive sampling) without opening a window and save the result to disk. The kernels are compiled before the first pass so every pass is timed. With costHeatmap only the traversal cost heatmap is saved, and with denoise the saved PNG is denoised (the .npy file keeps the raw accumulated samples)
+    '''
+    if numPasses < 1:
+        raise ValueError('At least one pass has to be rendered')
+    camera = Camera(cameraPos, imageWidth, fov, focalLength, aspectRatio, tMin, tMax, samplesPerPixel, maxDepth, treeBuilder = treeBuilder, renderer = renderer, rouletteDepth = rouletteDepth, adaptiveThreshold = adaptiveThreshold, countTraversal = countTraversal, treeCache = treeCache, denoise = denoise, sampler = sampler)
+    createScene(camera, meshPath, scenePath)
+    if costHeatmap:
+        maxCost = camera.renderCostHeatmap()
+        pngPath = os.path.splitext(outputPath)[0] + '.png'
+        os.makedirs(os.path.dirname(pngPath) or '.', exist_ok = True)
+        ti.tools.imwrite(camera.pixelField.to_numpy(), pngPath)
+        print(f'Saved the traversal cost heatmap to {pngPath} (red is {maxCost} box and object tests)')
+        return 
+    camera.warmUp()
+
+    passTimes = []
+    for _ in range(numPasses):
+        start = time.perf_counter()
+        camera.render()
+        ti.sync()
+        passTimes.append(time.perf_counter() - start)
+        if adaptiveThreshold is not None and camera.countActivePixels() == 0:
+            break
+
+    firstPassSamples, totalSamples = camera.imageWidth * camera.imageHeight * samplesPerPixel, camera.sampleCounts().sum()
+    pngPath, rawPath = saveRender(camera, outputPath)
+
+    print(startupReport())
+    print(f'Rendered {camera.imageWidth}x{camera.imageHeight} at {samplesPerPixel} spp x {len(passTimes)} passes (max depth {maxDepth})')
+    print(f'Wall time: {sum(passTimes):.3f} s (first pass {passTimes[0]:.3f} s)')
+    print(f'Samples per second: {totalSamples / sum(passTimes):,.0f}')
+    if countTraversal:
+        printCounters(camera)
+    if treeCache is not None:
+        print(f'BVH tree cache: {treeCache.hits} hits, {treeCache.misses} misses ({treeCache.cacheDir})')
+    print(f'Saved {pngPath} and {rawPath}')
+    if adaptiveThreshold is not None:
+        heatmapPath = os.path.splitext(outputPath)[0] + '_samples.png'
+        ti.tools.imwrite(camera.sampleHeatmap(), heatmapPath)
+        print(f'Took {totalSamples:,} samples ({totalSamples / (firstPassSamples * len(passTimes)):.1%} of sampling every pixel), heatmap saved to {heatmapPath}')
+
+def exportModule(cameraPos: vec3, imageWidth: int, fov: float, focalLength: float, aspectRatio: float, samplesPerPixel: float, maxDepth: int, moduleDir: str, tMin = 0.001, tMax = 1e10, rouletteDepth = 3, adaptiveThreshold = None, scenePath = None): #type: ignore
+    '''
+    Export the render, BVH build, and camera update kernels for the scene as an AOT module that AOTRenderer.py renders without compiling anything from Python
+    '''
+    camera = Camera(cameraPos, imageWidth, fov, focalLength, aspectRatio, tMin, tMax, samplesPerPixel, maxDepth, rouletteDepth = rouletteDepth, adaptiveThreshold = adaptiveThreshold)
+    createScene(camera, scenePath = scenePath)
+    start = time.perf_counter()
+    manifest = exportRenderModule(camera, moduleDir)
+    print(f'Exported {len(manifest["kernels"])} kernels for {camera.imageWidth}x{camera.imageHeight} at {samplesPerPixel} spp to {moduleDir} in {time.perf_counter() - start:.3f} s')
+
+def sceneView(scenePath = None):
+    '''
+    Return the camera position and look at point saved with a scene file (or the default view for the built in scene)
+    '''
+    view = readSceneHeader(scenePath).get('view') if scenePath is not None else None 
+    return (vec3(*view['cameraPos']), vec3(*view['lookAt'])) if view is not None else (vec3(0, 0, 1), vec3(0, 0, -1))
+
+def saveSceneFile(scenePath: str, cameraPos: vec3, lookAt: vec3, meshPath = None, inputScenePath = None): #type: ignore
+    world = World()
+    createScene(world, meshPath, inputScenePath)
+    saveScene(world, scenePath, cameraPos, lookAt)
+    numObjects = len(world.joinSphereChunks()[1]) + len(world.joinMeshChunks()[1])
+    print(f'Saved {numObjects:,} objects and {len(world.materialList)} materials to {scenePath}')
+
+def positiveInt(value: str):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not a positive integer')
+    return number
+
+def parseArguments():
+    parser = argparse.ArgumentParser(description = 'Render the scene interactively or headless to a file')
+    parser.add_argument('--backend', choices = list(BACKENDS), default = 'gpu', help = 'Taichi backend to run on')
+    parser.add_argument('--threads', type = int, default = None, help = 'Maximum number of CPU threads (all of them by default)')
+    parser.add_argument('--cache-dir', default = None, help = "Where compiled kernels are cached between runs (Taichi's default cache when not given)")
+    parser.add_argument('--headless', action = 'store_true', help = 'Render without a window and write the result to disk')
+    parser.add_argument('--width', type = int, default = 2000, help = 'Image width in pixels')
+    parser.add_argument('--spp', type = int, default = 2, help = 'Samples per pixel for every pass')
+    parser.add_argument('--max-depth', type = int, default = 25, help = 'Maximum number of ray bounces')
+    parser.add_argument('--passes', type = positiveInt, default = 1, help = 'Number of accumulated passes to render when headless')
+    parser.add_argument('--roulette-depth', type = int, default = 3, help = 'Number of bounces before paths can be ended by Russian roulette (set it to the max depth to turn it off)')
+    parser.add_argument('--adaptive', type = float, default = None, metavar = 'THRESHOLD', help = 'Stop sampling pixels once their 95%% confidence interval is narrower than THRESHOLD times their brightness (headless renders also save a sample count heatmap)')
+    parser.add_argument('--target-frame-time', type = float, default = None, metavar = 'MS', help = 'Lower the resolution while the camera moves in the viewer to keep frames near this many milliseconds')
+    parser.add_argument('--min-scale', type = float, default = 0.25, help = 'Lowest fraction of the resolution used while the camera moves')
+    parser.add_argument('--builder', choices = [LBVH_BUILDER, SAH_BUILDER], default = LBVH_BUILDER, help = 'BVH builder (the SAH builder is slower to build but faster to trace)')
+    parser.add_argument('--renderer', choices = [MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER], default = MEGAKERNEL_RENDERER, help = 'Trace every path in one kernel or run each bounce as separate kernels over ray queues binned by material')
+    parser.add_argument('--counters', action = 'store_true', help = 'Count the box tests, object tests, and BVH nodes visited for every ray and print them with the rays per frame and bounces per path')
+    parser.add_argument('--heatmap', action = 'store_true', help = "Show (or save when headless) how many box and object tests every pixel's camera ray takes instead of rendering")
+    parser.add_argument('--export-aot', default = None, metavar = 'DIR', help = 'Export the scene and its kernels as an AOT module to DIR for AOTRenderer.py instead of rendering (megakernel renderer and LBVH builder only)')
+    parser.add_argument('--mesh', default = None, metavar = 'PATH', help = 'Replace the center sphere with an OBJ or PLY mesh')
+    parser.add_argument('--scene', default = None, metavar = 'PATH', help = 'Render a scene file (a JSON header with its arrays next to it) instead of the built in scene')
+    parser.add_argument('--save-scene', default = None, metavar = 'PATH', help = 'Save the scene as a scene file instead of rendering')
+    parser.add_argument('--tree-cache', default = None, metavar = 'DIR', help = 'Save built BVH trees to DIR and load them from there when the same scene is rendered again')
+    parser.add_argument('--tree-cache-size', type = float, default = 1024, metavar = 'MB', help = 'Size of the BVH tree cache before the least recently used trees are removed')
+    parser.add_argument('--denoise', action = 'store_true', help = 'Run an edge-avoiding wavelet filter guided by the albedo and normals of the first hits over every full resolution frame before it is shown or saved')
+    parser.add_argument('--temporal', action = 'store_true', help = 'Reproject the accumulated samples to the new view when the camera moves in the viewer instead of starting over (pixels that were hidden before start over)')
+    parser.add_argument('--sampler', choices = list(SAMPLER_TYPES), default = SOBOL_SAMPLER, help = 'Take every sample from an Owen scrambled Sobol sequence for its pixel (lower noise for the same samples) or from independent random numbers')
+    parser.add_argument('--output', default = 'render.png', help = 'Output path when headless (a .npy file with the raw linear values is written next to the PNG)')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    arguments = parseArguments()
+    initRenderer(arguments.backend, arguments.threads, arguments.cache_dir)
+    cameraPos, lookAt = sceneView(arguments.scene)
+    treeCache = bvhCache(arguments.tree_cache, int(arguments.tree_cache_size * 2 ** 20)) if arguments.tree_cache is not None else None 
+    if arguments.save_scene is not None:
+        saveSceneFile(arguments.save_scene, cameraPos, lookAt, arguments.mesh, arguments.scene)
+    elif arguments.export_aot is not None:
+        exportModule(cameraPos, arguments.width, 90, lookAt, 16 / 9, arguments.spp, arguments.max_depth, arguments.export_aot, rouletteDepth = arguments.roulette_depth, adaptiveThreshold = arguments.adaptive, scenePath = arguments.scene)
+    elif arguments.headless:
+        renderHeadless(cameraPos, arguments.width, 90, lookAt, 16 / 9, arguments.spp, arguments.max_depth, arguments.passes, arguments.output, treeBuilder = arguments.builder, renderer = arguments.renderer, rouletteDepth = arguments.roulette_depth, adaptiveThreshold = arguments.adaptive, countTraversal = arguments.counters, costHeatmap = arguments.heatmap, meshPath = arguments.mesh, scenePath = arguments.scene, treeCache = treeCache, denoise = arguments.denoise, sampler = arguments.sampler)
+    else:
+        renderScene(cameraPos, arguments.width, 90, lookAt, 16 / 9, arguments.spp, arguments.max_depth, treeBuilder = arguments.builder, renderer = arguments.renderer, rouletteDepth = arguments.roulette_depth, adaptiveThreshold = arguments.adaptive, targetFrameTime = None if arguments.target_frame_time is None else arguments.target_frame_time / 1000, minScale = arguments.min_scale, countTraversal = arguments.counters, costHeatmap = arguments.heatmap, meshPath = arguments.mesh, scenePath = arguments.scene, treeCache = treeCache, denoise = arguments.denoise, temporal = arguments.temporal, sampler = arguments.sampler)
@@ -0,0 +1,11 @@
+from Utils.Runtime import initRenderer
+import pytest
+
+initRenderer('cpu', randomSeed = 0)
+
+@pytest.fixture(autouse = True, scope = 'module')
+def freshRuntime():
+    '''
+    Start every test module with a new Taichi runtime. Taichi only holds a few hundred field trees per runtime, which the whole suite's cameras would run out of, and this way each module sees the same random numbers no matter which modules ran before it
+    '''
+    initRenderer('cpu', randomSeed = 0)
@@ -0,0 +1,56 @@
+from Utils.Camera import *
+from Utils.AOT import *
+from Utils.SceneFiles import *
+from Tests.test_Camera import createTestCamera
+from Main import createScene
+import numpy as np
+import os
+import subprocess
+import sys
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def testModuleFieldsSplitsStructs():
+    camera = createTestCamera(MEGAKERNEL_RENDERER)
+    camera.updateScene()
+    names = dict(moduleFields(camera))
+    assert 'spheres.center' in names and 'leaves.boundingBox.x.minValue' in names and 'accumulation.colorSumField' in names
+    assert 'spheres' not in names
+
+def testExportRejectsWavefront():
+    with pytest.raises(ValueError):
+        exportRenderModule(createTestCamera(WAVEFRONT_RENDERER), 'unused')
+
+def testExportNeedsNewProcess(tmp_path):
+    createTestCamera(MEGAKERNEL_RENDERER).updateScene()
+    with pytest.raises(ValueError):
+        exportRenderModule(createTestCamera(MEGAKERNEL_RENDERER), str(tmp_path)) #The first camera holds fields too
+
+def testLoadedModuleMatchesCamera(tmp_path):
+    moduleDir, outputPath = str(tmp_path / 'module'), str(tmp_path / 'render.npy')
+    subprocess.run([sys.executable, 'Main.py', '--backend', 'cpu', '--export-aot', moduleDir, '--width', '64', '--spp', '4', '--max-depth', '8'], check = True, cwd = REPO_DIR) #Modules are exported and loaded in processes of their own
+    subprocess.run([sys.executable, 'AOTRenderer.py', moduleDir, '--passes', '16', '--output', outputPath], check = True, cwd = REPO_DIR)
+
+    camera = Camera(vec3(0, 0, 1), 64, 90, vec3(0, 0, -1), 16 / 9, 0.001, 1e10, 4, 8)
+    createScene(camera)
+    for _ in range(16):
+        camera.render()
+    image = np.load(outputPath)
+    assert image.shape == (camera.imageWidth, camera.imageHeight, 3)
+    assert np.allclose(image.mean(axis = (0, 1)), camera.linearImage().mean(axis = (0, 1)), atol = 0.01)
+
+def testLoadedModuleSamplesLights(tmp_path):
+    scenePath, moduleDir, outputPath = str(tmp_path / 'scene.json'), str(tmp_path / 'module'), str(tmp_path / 'render.npy')
+    world = World()
+    wall, lamp = world.addMaterial(lambertianMaterial(vec3(0.7, 0.7, 0.7))), world.addMaterial(emissiveMaterial(vec3(40, 40, 30)))
+    world.addSpheres([[0, -100.5, -1], [0, 0, -1], [0.6, 0.6, -0.8]], [100, 0.5, 0.05], [wall, wall, lamp])
+    saveScene(world, scenePath, (0, 0, 1), (0, 0, -1))
+    subprocess.run([sys.executable, 'Main.py', '--backend', 'cpu', '--export-aot', moduleDir, '--scene', scenePath, '--width', '64', '--spp', '4', '--max-depth', '8'], check = True, cwd = REPO_DIR)
+    subprocess.run([sys.executable, 'AOTRenderer.py', moduleDir, '--passes', '4', '--output', outputPath], check = True, cwd = REPO_DIR)
+
+    camera = Camera(vec3(0, 0, 1), 64, 90, vec3(0, 0, -1), 16 / 9, 0.001, 1e10, 4, 8)
+    loadScene(camera, scenePath)
+    for _ in range(4):
+        camera.render()
+    assert np.allclose(np.load(outputPath), camera.linearImage(), atol = 1e-4) #Both take the same Sobol samples, so the images only match when the module samples the lamp too
@@ -0,0 +1,116 @@
+from Utils.World import *
+import numpy as np 
+import pytest 
+
+@ti.kernel 
+def traceClosestHits(world: ti.template(), origins: ti.types.ndarray(dtype = ti.f32, ndim = 2), directions: ti.types.ndarray(dtype = ti.f32, ndim = 2), tTree: ti.template(), tAll: ti.template()): #type: ignore
+    for i in tTree:
+        ray = ray3(vec3(origins[i, 0], origins[i, 1], origins[i, 2]), vec3(directions[i, 0], directions[i, 1], directions[i, 2]))
+        tTree[i] = world.walkTree(ray, initDefaultHitRecord(interval(0.001, 1e10))).t()
+        tAll[i] = world.hitAllObjects(ray, initDefaultHitRecord(interval(0.001, 1e10))).t()
+
+def closestHits(world, tTree, tAll, seed = 0):
+    '''
+    Shoot random rays through the scene and record the closest hit found by walking the tree and by checking every object. The rays come from a seeded generator so that they're the same no matter which tests ran before
+    '''
+    rng = np.random.default_rng(seed)
+    origins, directions = rng.uniform(-3, 3, (tTree.shape[0], 3)), rng.normal(size = (tTree.shape[0], 3))
+    directions /= np.linalg.norm(directions, axis = 1, keepdims = True)
+    traceClosestHits(world, origins.astype(np.float32), directions.astype(np.float32), tTree, tAll)
+
+@pytest.mark.parametrize('numSpheres', [1, 2, 500])
+@pytest.mark.parametrize('treeBuilder', [LBVH_BUILDER, SAH_BUILDER])
+def testWalkTreeFindsClosestHit(numSpheres, treeBuilder):
+    rng = np.random.default_rng(numSpheres)
+    world = World(treeBuilder = treeBuilder)
+    material = lambertianMaterial(vec3(0.5, 0.5, 0.5))
+    for center, radius in zip(rng.uniform(-2, 2, (numSpheres, 3)), rng.uniform(0.01, 0.3, numSpheres)):
+        world.addHittable(sphere3(vec3(*center), float(radius), material))
+    if numSpheres > 2: #Duplicate Morton codes
+        world.addHittable(sphere3(vec3(0.5, 0.5, 0.5), 0.3, material))
+        world.addHittable(sphere3(vec3(0.5, 0.5, 0.5), 0.2, material))
+    world.compileTree()
+
+    tTree, tAll = ti.field(float, shape = (2000,)), ti.field(float, shape = (2000,))
+    closestHits(world, tTree, tAll)
+    assert np.allclose(tTree.to_numpy(), tAll.to_numpy())
+
+def testAddSpheresInBulk():
+    rng = np.random.default_rng(0)
+    centers, radii = rng.uniform(-10, 10, (20000, 3)), rng.uniform(0.01, 0.1, 20000)
+    world = World()
+    world.addSpheres(centers, radii, np.full(20000, world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))))
+    world.compileTree()
+
+    assert world.numLeaves[None] == 20000
+    assert (np.sort(world.leaves.objectIndex.to_numpy()[:20000]) == np.arange(20000)).all()
+    root = world.nodes.boundingBox.to_numpy()
+    assert np.isclose(root['x']['minValue'][0], (centers[:, 0] - radii).min())
+    assert np.isclose(root['y']['maxValue'][0], (centers[:, 1] + radii).max())
+
+def testSAHBuilderLowersCost():
+    rng = np.random.default_rng(1)
+    centers, radii = rng.uniform(-10, 10, (5000, 3)), rng.uniform(0.01, 0.1, 5000)
+    centers[0], radii[0] = (0, -1000, 0), 1000 #Large ground sphere next to small ones
+    sahCosts = []
+    for treeBuilder in (LBVH_BUILDER, SAH_BUILDER):
+        world = World(treeBuilder = treeBuilder)
+        world.addSpheres(centers, radii, np.full(5000, world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))))
+        world.compileTree()
+        assert (np.sort(world.leaves.objectIndex.to_numpy()[:5000]) == np.arange(5000)).all()
+        sahCosts.append(world.sahCost())
+    assert sahCosts[1] < sahCosts[0]
+
+@pytest.mark.parametrize('treeBuilder', [LBVH_BUILDER, SAH_BUILDER])
+def testRefitAfterMovingSpheres(treeBuilder):
+    rng = np.random.default_rng(2)
+    centers, radii = rng.uniform(-2, 2, (300, 3)), rng.uniform(0.01, 0.2, 300)
+    world = World(treeBuilder = treeBuilder)
+    world.addSpheres(centers, radii, np.full(300, world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))))
+    world.updateScene()
+
+    tTree, tAll = ti.field(float, shape = (2000,)), ti.field(float, shape = (2000,))
+    for offset in (0.05, 1.0):
+        world.updateSpheres(centers + rng.uniform(-offset, offset, centers.shape), radii * 1.5)
+        assert world.updateScene()
+        closestHits(world, tTree, tAll)
+        assert np.allclose(tTree.to_numpy(), tAll.to_numpy())
+        assert world.sahCost() <= world.refitThreshold * world.builtSAHCost 
+
+@pytest.mark.parametrize('treeBuilder', [LBVH_BUILDER, SAH_BUILDER])
+def testTreeDepthFitsStack(treeBuilder):
+    rng = np.random.default_rng(2)
+    world = World(treeBuilder = treeBuilder)
+    world.addSpheres(rng.uniform(-2, 2, (1000, 3)), np.full(1000, 0.05), np.full(1000, world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))))
+    world.compileTree()
+    assert world.checkTreeDepth() < BVH_STACK_SIZE
+
+def chainTreeWorld(numLeaves: int):
+    '''
+    World with spheres along the x axis and a tree where every node's left child is a leaf and its right child is the next node (as deep as a tree over the spheres can get)
+    '''
+    world = World()
+    centers = np.zeros((numLeaves, 3))
+    centers[:, 0] = np.arange(numLeaves)
+    world.addSpheres(centers, np.full(numLeaves, 0.4), np.full(numLeaves, world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))))
+    world.compileTree()
+
+    leaves, nodes = np.zeros(numLeaves, TREE_ARRAY_DTYPE), np.zeros(numLeaves - 1, TREE_ARRAY_DTYPE)
+    leaves['indices'] = np.stack([np.arange(numLeaves), np.zeros(numLeaves), np.minimum(np.arange(numLeaves), numLeaves - 2)], axis = 1)
+    leaves['boundingBox'] = np.stack([centers[:, 0] - 0.4, centers[:, 0] + 0.4, np.full(numLeaves, -0.4), np.full(numLeaves, 0.4), np.full(numLeaves, -0.4), np.full(numLeaves, 0.4)], axis = 1)
+    rightChildren = np.append(numLeaves + np.arange(1, numLeaves - 1), numLeaves - 1)
+    nodes['indices'] = np.stack([np.arange(numLeaves - 1), rightChildren, np.arange(-1, numLeaves - 2)], axis = 1)
+    nodes['boundingBox'] = [(i - 0.4, numLeaves - 0.6, -0.4, 0.4, -0.4, 0.4) for i in range(numLeaves - 1)]
+    world.setTreeArrays(leaves, nodes)
+    return world
+
+def testDeepestTreeThatFitsStack():
+    world = chainTreeWorld(BVH_STACK_SIZE)
+    assert world.checkTreeDepth() == BVH_STACK_SIZE - 1
+    tTree, tAll = ti.field(float, shape = (2000,)), ti.field(float, shape = (2000,))
+    closestHits(world, tTree, tAll)
+    assert np.allclose(tTree.to_numpy(), tAll.to_numpy())
+
+def testTooDeepTreeIsRejected():
+    with pytest.raises(ValueError):
+        chainTreeWorld(BVH_STACK_SIZE + 1).checkTreeDepth()
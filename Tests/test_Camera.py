@@ -0,0 +1,122 @@
+from Utils.Camera import *
+import numpy as np
+import pytest
+
+def createTestCamera(renderer, **cameraOptions):
+    camera = Camera(vec3(0, 0, 1), 64, 90, vec3(0, 0, -1), 16 / 9, 0.001, 1e10, 4, 8, renderer = renderer, **cameraOptions)
+    camera.addHittable(sphere3(vec3(0, 0, -1), 0.5, lambertianMaterial(vec3(0.1, 0.2, 0.5))))
+    camera.addHittable(sphere3(vec3(0, -100.5, -1), 100, lambertianMaterial(vec3(0.8, 0.8, 0.0))))
+    camera.addHittable(sphere3(vec3(-1, 0, -1), 0.5, dielectricMaterial(1.5)))
+    camera.addHittable(sphere3(vec3(1, 0, -1), 0.5, reflectiveMaterial(vec3(0.8, 0.6, 0.2), 0.5)))
+    return camera
+
+def testWavefrontMatchesMegakernel():
+    images = []
+    for renderer in (MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER):
+        camera = createTestCamera(renderer)
+        for _ in range(16):
+            camera.render()
+        images.append(camera.linearImage())
+    assert np.allclose(images[0].mean(axis = (0, 1)), images[1].mean(axis = (0, 1)), atol = 0.01)
+    assert np.abs(images[0] - images[1]).mean() < 0.05
+
+def testUnknownRenderer():
+    with pytest.raises(ValueError):
+        createTestCamera('scanline')
+
+def testSobolSamplerLowersError():
+    def renderImage(sampler, numPasses):
+        camera = createTestCamera(MEGAKERNEL_RENDERER, sampler = sampler)
+        for _ in range(numPasses):
+            camera.render()
+        return camera.linearImage()
+    reference = renderImage(RANDOM_SAMPLER, 128)
+    errors = [np.sqrt(((renderImage(sampler, 4) - reference) ** 2).mean()) for sampler in (RANDOM_SAMPLER, SOBOL_SAMPLER)]
+    assert errors[1] < 0.85 * errors[0]
+
+@pytest.mark.parametrize('renderer', [MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER])
+def testRussianRouletteShortensPaths(renderer):
+    images, pathLengths = [], []
+    for rouletteDepth in (8, 1):
+        camera = createTestCamera(renderer, rouletteDepth = rouletteDepth, countPaths = True)
+        for _ in range(16):
+            camera.render()
+        images.append(camera.linearImage())
+        pathLengths.append(camera.pathStatistics.averagePathLength())
+    assert pathLengths[1] < pathLengths[0]
+    assert np.allclose(images[0].mean(axis = (0, 1)), images[1].mean(axis = (0, 1)), atol = 0.01)
+
+@pytest.mark.parametrize('renderer', [MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER])
+def testAdaptiveSamplingStopsConvergedPixels(renderer):
+    camera = createTestCamera(renderer, adaptiveThreshold = 0.05, minPasses = 4)
+    for _ in range(12):
+        camera.render()
+    sampleCounts = camera.sampleCounts()
+    assert (sampleCounts[:, -1] == camera.minPasses * camera.samplesPerPixel).all() #The top row only sees the sky
+    assert sampleCounts.max() > 12 * camera.samplesPerPixel #The noisy pixels take the passes that the converged pixels free up
+    assert sampleCounts.sum() <= 12 * camera.imageWidth * camera.imageHeight * camera.samplesPerPixel 
+    assert camera.countActivePixels() < camera.imageWidth * camera.imageHeight 
+    assert np.isfinite(camera.linearImage()).all()
+
+def testResolutionScalerHoldsTargetFrameTime():
+    scaler = resolutionScaler(0.01, minScale = 0.1)
+    for _ in range(20):
+        scaler.addFrameTime(0.04 * scaler.renderScale(True) ** 2) #Frames take 40 ms at full resolution
+    assert abs(scaler.renderScale(True) - 0.5) < 0.01
+    assert scaler.renderScale(False) == 1.0
+
+def testRenderPreview():
+    camera = createTestCamera(MEGAKERNEL_RENDERER)
+    camera.render(0.25)
+    assert camera.accumulation.frameCountField[None] == 0
+    preview = camera.pixelField.to_numpy()
+    assert np.isfinite(preview).all() and preview.max() > 0
+    assert np.abs(preview[:, -1] - preview[:, -1].mean(axis = 0)).max() < 0.1 #The top row only sees the sky
+
+@pytest.mark.parametrize('renderer', [MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER])
+def testWarmUpDoesNotRender(renderer):
+    camera = createTestCamera(renderer)
+    camera.warmUp(compilePreview = True)
+    assert startupTimes['compile'] > 0
+    assert camera.accumulation.frameCountField[None] == 0 and camera.pathStatistics.pathCountField[None] == 0
+    camera.render()
+    assert camera.accumulation.frameCountField[None] == 1
+
+def testManySamplesPerPixelCompileQuickly():
+    camera = Camera(vec3(0, 0, 1), 16, 90, vec3(0, 0, -1), 1, 0.001, 1e10, 64, 8)
+    camera.addHittable(sphere3(vec3(0, 0, -1), 0.5, lambertianMaterial(vec3(0.1, 0.2, 0.5))))
+    camera.warmUp()
+    assert startupTimes['compile'] < 60 #Unrolling all 64 samples into the kernel took minutes to compile
+
+def testWarmUpNeedsCheckedTaichi(monkeypatch):
+    monkeypatch.setattr('Utils.Runtime.TAICHI_INTERNALS_VERSION', (1, 0, 0))
+    with pytest.raises(RuntimeError):
+        createTestCamera(MEGAKERNEL_RENDERER).warmUp()
+
+@pytest.mark.parametrize('renderer', [MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER])
+def testPerformanceCounters(renderer):
+    camera = createTestCamera(renderer, countTraversal = True)
+    for _ in range(2):
+        camera.render()
+    counters = camera.performanceCounters()
+    assert counters['frames'] == 2 and counters['raysPerFrame'] >= camera.imageWidth * camera.imageHeight * camera.samplesPerPixel 
+    assert counters['boxTestsPerRay'] >= 1 and 0 < counters['objectTestsPerRay'] <= camera.numSpheres 
+    assert camera.traversalStatistics.rayCountField[None] == camera.pathStatistics.rayCountField[None]
+    camera.resetCounters()
+    assert camera.performanceCounters()['frames'] == 0 and camera.traversalStatistics.rayCountField[None] == 0
+
+@pytest.mark.parametrize('renderer', [MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER])
+def testPathCountersOff(renderer):
+    camera = createTestCamera(renderer)
+    camera.render()
+    assert camera.pathStatistics.pathCountField[None] == 0 and camera.pathStatistics.rayCountField[None] == 0
+    assert camera.performanceCounters() == {'frames': 1}
+
+def testCostHeatmap():
+    camera = createTestCamera(MEGAKERNEL_RENDERER)
+    maxCost = camera.renderCostHeatmap()
+    costs, heatmap = camera.costField.to_numpy(), camera.pixelField.to_numpy()
+    assert maxCost == costs.max() and costs.min() >= 1
+    assert heatmap.min() >= 0 and heatmap.max() <= 1
+    assert np.allclose(heatmap[costs == maxCost], [1, 0, 0])
+    assert camera.accumulation.frameCountField[None] == 0
@@ -0,0 +1,28 @@
+from Utils.Camera import *
+from Tests.test_Camera import createTestCamera
+import numpy as np
+import pytest
+
+def rootMeanSquareError(image, reference):
+    return np.sqrt(((image - reference) ** 2).mean())
+
+@pytest.fixture(scope = 'module')
+def convergedCamera():
+    camera = createTestCamera(MEGAKERNEL_RENDERER, denoise = True, sampler = RANDOM_SAMPLER) #Random samples so the reference doesn't share the first pass's samples with the images it's compared to
+    for _ in range(64):
+        camera.render()
+    return camera
+
+def testDenoisingLowersError(convergedCamera):
+    reference = np.sqrt(convergedCamera.linearImage())
+    camera = createTestCamera(MEGAKERNEL_RENDERER, denoise = True)
+    camera.render()
+    assert rootMeanSquareError(camera.pixelField.to_numpy(), reference) < 0.75 * rootMeanSquareError(np.sqrt(camera.linearImage()), reference)
+
+def testDenoisingKeepsConvergedImage(convergedCamera):
+    assert rootMeanSquareError(convergedCamera.pixelField.to_numpy(), np.sqrt(convergedCamera.linearImage())) < 0.01 #The edges between objects are kept
+
+def testFeatureBuffers(convergedCamera):
+    albedo, normals = convergedCamera.denoiser.albedoField.to_numpy(), convergedCamera.denoiser.normalField.to_numpy()
+    assert np.allclose(albedo[:, -1], 1) and np.allclose(normals[:, -1], 0) #The top row only sees the sky
+    assert np.allclose(albedo[convergedCamera.imageWidth // 2, convergedCamera.imageHeight // 2], [0.1, 0.2, 0.5]) and normals[convergedCamera.imageWidth // 2, convergedCamera.imageHeight // 2, 2] > 0.9
@@ -0,0 +1,95 @@
+from Utils.World import *
+from Tests.test_BoundTree import closestHits
+import pytest
+
+@ti.kernel
+def gridHits(world: ti.template(), hits: ti.template()): #type: ignore
+    '''
+    Shoot a grid of tilted rays down at the scene and record the distance and normal of every ray's closest hit
+    '''
+    for i in hits:
+        ray = ray3(vec3(i % 60 / 10 - 3, i // 60 / 10 - 3, 10), vec3(0.1, 0.05, -1))
+        rayHitRecord = world.walkTree(ray, initDefaultHitRecord(interval(0.001, 1e10)))
+        hits[i] = ti.Vector([rayHitRecord.t(), rayHitRecord.normalVector[0], rayHitRecord.normalVector[1], rayHitRecord.normalVector[2]])
+
+def randomTransforms(rng, numInstances: int, uniformScale: bool):
+    '''
+    Return random object to world transforms (4 x 4) made of a rotation around the y axis, a scale, and a translation
+    '''
+    angles, transforms = rng.uniform(0, 2 * np.pi, numInstances), np.tile(np.eye(4), (numInstances, 1, 1))
+    transforms[:, 0, 0], transforms[:, 0, 2], transforms[:, 2, 0], transforms[:, 2, 2] = np.cos(angles), np.sin(angles), -np.sin(angles), np.cos(angles)
+    scales = rng.uniform(0.5, 1.5, (numInstances, 1, 1)) if uniformScale else rng.uniform(0.5, 1.5, (numInstances, 1, 3))
+    transforms[:, :3, :3] *= scales
+    transforms[:, :3, 3] = rng.uniform(-3, 3, (numInstances, 3))
+    return transforms
+
+def compareWithCopies(instanced, copies):
+    instanced.compileTree()
+    copies.compileTree()
+    instancedHits, copyHits = ti.Vector.field(4, float, shape = (3600,)), ti.Vector.field(4, float, shape = (3600,))
+    gridHits(instanced, instancedHits)
+    gridHits(copies, copyHits)
+    instancedHits, copyHits = instancedHits.to_numpy(), copyHits.to_numpy()
+    assert (instancedHits[:, 0] < 1e10).mean() > 0.1
+    assert np.allclose(instancedHits[:, 0], copyHits[:, 0], rtol = 0, atol = 5e-3) #The float32 sphere test loses precision on far away small spheres
+    hit = copyHits[:, 0] < 1e10
+    assert (np.abs(instancedHits[hit, 1:] - copyHits[hit, 1:]).max(axis = 1) < 1e-2).mean() > 0.99
+
+@pytest.mark.parametrize('treeBuilder', [LBVH_BUILDER, SAH_BUILDER])
+def testInstancedSpheresMatchCopies(treeBuilder):
+    rng = np.random.default_rng(5)
+    centers, radii = rng.uniform(-0.5, 0.5, (30, 3)), rng.uniform(0.05, 0.2, 30)
+    transforms = randomTransforms(rng, 40, uniformScale = True)
+
+    instanced, copies = World(treeBuilder = treeBuilder), World(treeBuilder = treeBuilder)
+    for world in (instanced, copies):
+        world.addSpheres([[0, -1000, 0]], [997], [world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))])
+    group = instanced.createGroup()
+    group.addSpheres(centers, radii, np.zeros(30))
+    instanced.addInstances(group, transforms)
+    for transform in transforms:
+        copies.addSpheres(centers @ transform[:3, :3].T + transform[:3, 3], radii * np.cbrt(np.linalg.det(transform[:3, :3])), np.zeros(30))
+    compareWithCopies(instanced, copies)
+    assert instanced.numLeaves[None] == 41
+
+def testInstancedMeshMatchesCopies():
+    rng = np.random.default_rng(6)
+    corners = rng.uniform(-0.5, 0.5, (20, 3))
+    vertices, triangles = np.concatenate([corners, corners + rng.uniform(-0.2, 0.2, (20, 3)), corners + rng.uniform(-0.2, 0.2, (20, 3))]), np.arange(60).reshape(3, 20).T
+    transforms = randomTransforms(rng, 40, uniformScale = False) #Triangles stay triangles under any affine transform
+
+    instanced, copies = World(), World()
+    for world in (instanced, copies):
+        world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))
+    groups = [instanced.createGroup() for _ in range(2)] #Two groups so that the second group's offsets are used
+    groups[0].addSpheres([[0, 0, 0]], [0.1], [0])
+    groups[1].addMesh(vertices, triangles, 0)
+    instanced.addInstance(groups[0], np.diag([1, 1, 1, 1]) + np.eye(4, k = 3) * 20) #Far away from the grid
+    instanced.addInstances(groups[1], transforms)
+    copies.addSpheres([[20, 0, 0]], [0.1], [0])
+    for transform in transforms:
+        copies.addMesh(vertices @ transform[:3, :3].T + transform[:3, 3], triangles, 0)
+    compareWithCopies(instanced, copies)
+
+def testInstancesInAllObjectsCheck():
+    rng = np.random.default_rng(7)
+    world = World()
+    group = world.createGroup()
+    group.addSpheres(rng.uniform(-0.5, 0.5, (10, 3)), rng.uniform(0.05, 0.2, 10), np.full(10, world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))))
+    world.addInstances(group, randomTransforms(rng, 30, uniformScale = False))
+    world.compileTree()
+
+    tTree, tAll = ti.field(float, shape = (2000,)), ti.field(float, shape = (2000,))
+    closestHits(world, tTree, tAll)
+    assert np.allclose(tTree.to_numpy(), tAll.to_numpy())
+
+def testRejectsBadInstances():
+    world, otherWorld = World(), World()
+    group = world.createGroup()
+    with pytest.raises(ValueError):
+        world.addInstance(group, np.zeros((4, 4)))
+    with pytest.raises(ValueError):
+        otherWorld.addInstance(group)
+    world.addInstance(group) #Groups without objects can't be built
+    with pytest.raises(ValueError):
+        world.compileTree()
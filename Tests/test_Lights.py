@@ -0,0 +1,86 @@
+from Utils.Camera import *
+import pytest
+
+def createLampRoom(renderer, **cameraOptions):
+    '''
+    A closed box lit only by a small emissive sphere and a small emissive triangle, with the camera inside of it
+    '''
+    camera = Camera(vec3(0, 0, 0.9), 32, 90, vec3(0, 0, -1), 1, 0.001, 1e10, 4, 4, renderer = renderer, **cameraOptions)
+    wall, lamp = camera.addMaterial(lambertianMaterial(vec3(0.7, 0.7, 0.7))), camera.addMaterial(emissiveMaterial(vec3(40, 40, 30)))
+    corners = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], np.float32)
+    faces = [[0, 1, 3, 2], [4, 6, 7, 5], [0, 4, 5, 1], [2, 3, 7, 6], [0, 2, 6, 4], [1, 5, 7, 3]]
+    camera.addMesh(corners, [[a, b, c] for a, b, c, d in faces] + [[a, c, d] for a, b, c, d in faces], wall)
+    camera.addSpheres([[0.3, 0.8, -0.4], [-0.4, -0.6, -0.2]], [0.05, 0.3], [lamp, wall])
+    camera.addMesh([[-0.9, 0.5, -0.95], [-0.7, 0.5, -0.95], [-0.8, 0.7, -0.95]], [[0, 1, 2]], lamp)
+    return camera
+
+def renderPasses(camera, numPasses: int):
+    '''
+    Return the linear image of every pass on its own (the difference between the accumulated color sums, since each pass continues the pixels' sample sequences)
+    '''
+    colorSums = [np.zeros((camera.imageWidth, camera.imageHeight, 3), np.float32)]
+    for _ in range(numPasses):
+        camera.render()
+        colorSums.append(camera.accumulation.colorSumField.to_numpy())
+    return np.diff(np.array(colorSums), axis = 0)
+
+@ti.kernel
+def sampledLightPdfs(world: ti.template(), sceneVersion: ti.template(), pdfs: ti.template()): #type: ignore
+    '''
+    Sample a light from random points in the room and record the density that sampleLight gave with the density lightPdf gives for the point the direction hits
+    '''
+    for i in range(pdfs.shape[0]):
+        point = randVectorRange(-0.5, 0.5)
+        objectIndex, direction, pdf = world.sampleLight(point, randomSample2D())
+        rayHitRecord = world.hitLeaf(objectIndex, ray3(point, direction), initDefaultHitRecord(interval(0.001, 1e10)))
+        pdfs[i] = ti.Vector([pdf, world.lightPdf(objectIndex, point, rayHitRecord.pointHit), rayHitRecord.hitAnything])
+
+@ti.kernel
+def ceilingLight(world: ti.template(), sceneVersion: ti.template(), point: vec3, samples: ti.template()): #type: ignore
+    '''
+    Estimate the light reflected by the ceiling at the point with next event estimation and material sampling, weighted with multiple importance sampling
+    '''
+    for i in samples:
+        rayHitRecord = world.hitObjects(ray3(point - vec3(0, 0.01, 0), vec3(0, 1, 0)), initDefaultHitRecord(interval(0.001, 1e10)))
+        light = world.directLight(rayHitRecord, interval(0.001, 1e10), randomSample2D())
+        _, rayScatter, rayColor = world.scatter(rayHitRecord, randomSample2D(), ti.random())
+        scatterHitRecord = world.hitObjects(rayScatter, initDefaultHitRecord(interval(0.001, 1e10)))
+        if scatterHitRecord.hitAnything:
+            light += rayColor * world.emittedLight(scatterHitRecord, rayScatter.origin, world.materials[rayHitRecord.materialIndex].scatterPdf(rayHitRecord, rayScatter.direction))
+        samples[i] = light[0]
+
+@pytest.mark.parametrize('point', [(0.3, 1, -0.4), (0.9, 1, -0.1)])
+def testLightSamplingMatchesIrradiance(point):
+    world = World()
+    world.addSpheres([[0.3, 0.6, -0.4]], [0.25], [world.addMaterial(emissiveMaterial(vec3(1, 1, 1)))])
+    world.addMesh([[-5, 1, -5], [5, 1, -5], [0, 1, 5]], [[0, 1, 2]], world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5))))
+    world.updateScene()
+    samples = ti.field(float, shape = (100000,))
+    ceilingLight(world, world.sceneVersion, vec3(*point), samples)
+    toCenter = np.array([0.3, 0.6, -0.4]) - point
+    sinSquared = 0.25 ** 2 / np.dot(toCenter, toCenter)
+    assert abs(samples.to_numpy().mean() / (0.5 * sinSquared * -toCenter[1] / np.linalg.norm(toCenter)) - 1) < 0.02 #A Lambertian surface lit by a sphere that's fully above its horizon reflects color * radiance * sin^2 * cos
+
+def testLightList():
+    camera = createLampRoom(MEGAKERNEL_RENDERER)
+    camera.updateScene()
+    assert sorted(camera.lightList.lights.to_numpy()[:camera.lightList.numLightsField[None]]) == [0, 14]
+    camera.setMaterial(1, lambertianMaterial(vec3(1, 1, 1)))
+    camera.updateScene()
+    assert camera.lightList.numLightsField[None] == 0
+
+def testLightPdfsMatchSampling():
+    camera = createLampRoom(MEGAKERNEL_RENDERER)
+    camera.updateScene()
+    pdfs = ti.Vector.field(3, float, shape = (1000,))
+    sampledLightPdfs(camera, camera.sceneVersion, pdfs)
+    pdfs = pdfs.to_numpy()
+    assert pdfs[:, 2].all()
+    assert np.allclose(pdfs[:, 0], pdfs[:, 1], rtol = 1e-2)
+
+@pytest.mark.parametrize('renderer', [MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER])
+def testLightSamplingLowersVariance(renderer):
+    sampled, unsampled = renderPasses(createLampRoom(renderer), 16), renderPasses(createLampRoom(renderer, lightSampling = False), 32)
+    assert np.isfinite(sampled).all()
+    litIndirectly = sampled.mean(axis = (0, 3)) < 1 #Pixels that see a lamp directly are as noisy either way
+    assert sampled.var(axis = 0)[litIndirectly].mean() < 0.1 * unsampled.var(axis = 0)[litIndirectly].mean()
@@ -0,0 +1,33 @@
+from Utils.World import *
+import pytest 
+
+@pytest.mark.parametrize('material, materialType', [
+    (lambertianMaterial(vec3(0.1, 0.2, 0.3)), LAMBERTIAN),
+    (reflectiveMaterial(vec3(0.8, 0.6, 0.2), 0.5), REFLECTIVE),
+    (dielectricMaterial(1.5), DIELECTRIC)
+])
+def testGetMaterialType(material, materialType):
+    assert getMaterialType(material) == materialType 
+
+def testMaterialTable():
+    materialTable = createMaterialTable([lambertianMaterial(vec3(0.1, 0.2, 0.3)), reflectiveMaterial(vec3(0.8, 0.6, 0.2), 0.5), dielectricMaterial(1.5)])
+    assert list(materialTable['materialType']) == [LAMBERTIAN, REFLECTIVE, DIELECTRIC]
+    assert np.allclose(materialTable['color'][0], [0.1, 0.2, 0.3])
+    assert np.isclose(materialTable['fuzz'][1], 0.5)
+    assert np.isclose(materialTable['refractionIndex'][2], 1.5)
+
+def testSetMaterialKeepsKernels():
+    world = World()
+    materialIndex = world.addMaterial(lambertianMaterial(vec3(0.1, 0.2, 0.3)))
+    world.addHittable(sphere3(vec3(0, 0, 0), 1.0, lambertianMaterial(vec3(0.5, 0.5, 0.5))))
+    world.updateScene()
+    sceneVersion = world.sceneVersion 
+
+    world.setMaterial(materialIndex, dielectricMaterial(1.5))
+    assert world.updateScene()
+    assert world.sceneVersion == sceneVersion 
+    assert world.materials[materialIndex].materialType == DIELECTRIC 
+
+def testAddMaterialRejectsOtherValues():
+    with pytest.raises(TypeError):
+        World().addMaterial(interval(0.0, 1.0))
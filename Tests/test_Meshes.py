@@ -0,0 +1,75 @@
+from Utils.Camera import *
+from Tests.test_BoundTree import closestHits
+from Tests.test_Camera import createTestCamera
+import numpy as np
+import pytest
+
+def testLoadOBJ(tmp_path):
+    path = tmp_path / 'quad.obj'
+    path.write_text('# quad\nv 0 0 0\nv 1 0 0 1.0\nvt 0 0\nv 1 1 0\nv 0 1 0\nf 1/1 2/1/1 3//1 4\nf -4 -3 -2\n')
+    vertices, triangles = loadOBJ(str(path))
+    assert vertices.shape == (4, 3) and vertices.dtype == np.float32
+    assert triangles.tolist() == [[0, 1, 2], [0, 2, 3], [0, 1, 2]]
+
+def testLoadOBJTriangles(tmp_path):
+    path = tmp_path / 'quad.obj'
+    path.write_text('v 0 0 0\nv 1 0 0 1.0\nvn 0 0 1\nv 1 1 0\nv 0 1 0\n\nf 1 2 3\ng quad\nf 1 3 4\n')
+    vertices, triangles = loadOBJ(str(path))
+    assert np.array_equal(vertices, [[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]])
+    assert triangles.dtype == np.int32 and triangles.tolist() == [[0, 1, 2], [0, 2, 3]]
+
+@pytest.mark.parametrize('fileFormat', ['ascii', 'binary_little_endian', 'binary_big_endian'])
+@pytest.mark.parametrize('polygons', [False, True]) #Polygons are read row by row
+def testLoadPLY(tmp_path, fileFormat, polygons):
+    vertices = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], np.float32)
+    faces = [[0, 1, 2], [0, 2, 3, 1]] if polygons else [[0, 1, 2], [0, 2, 3]]
+    header = f'ply\nformat {fileFormat} 1.0\ncomment test\nelement vertex 4\nproperty float x\nproperty float y\nproperty float z\nproperty uchar red\nelement face 2\nproperty list uchar int vertex_indices\nend_header\n'
+    if fileFormat == 'ascii':
+        body = ''.join(f'{x} {y} {z} 255\n' for x, y, z in vertices) + ''.join(f'{len(face)} ' + ' '.join(map(str, face)) + '\n' for face in faces)
+        data = (header + body).encode()
+    else:
+        byteOrder = '<' if fileFormat == 'binary_little_endian' else '>'
+        vertexRows = np.zeros(4, [('position', byteOrder + 'f4', 3), ('red', 'u1')])
+        vertexRows['position'] = vertices
+        data = header.encode() + vertexRows.tobytes() + b''.join(np.uint8(len(face)).tobytes() + np.array(face, byteOrder + 'i4').tobytes() for face in faces)
+    path = tmp_path / 'quad.ply'
+    path.write_bytes(data)
+
+    loadedVertices, triangles = loadMesh(str(path))
+    assert np.allclose(loadedVertices, vertices)
+    assert triangles.tolist() == [[0, 1, 2], [0, 2, 3]] + ([[0, 3, 1]] if polygons else [])
+
+def testFitVertices():
+    vertices = fitVertices(np.array([[0, 0, 0], [4, 2, 1]], np.float32), (1, 1, 1), 2)
+    assert np.allclose(vertices, [[0, 0.5, 0.75], [2, 1.5, 1.25]])
+
+def testAddMeshRejectsBadIndices():
+    world = World()
+    with pytest.raises(ValueError):
+        world.addMesh(np.zeros((3, 3)), [[0, 1, 3]], world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5))))
+
+@pytest.mark.parametrize('treeBuilder', [LBVH_BUILDER, SAH_BUILDER])
+def testWalkTreeFindsClosestTriangle(treeBuilder):
+    rng = np.random.default_rng(3)
+    world = World(treeBuilder = treeBuilder)
+    material = world.addMaterial(lambertianMaterial(vec3(0.5, 0.5, 0.5)))
+    world.addSpheres(rng.uniform(-2, 2, (50, 3)), rng.uniform(0.01, 0.3, 50), np.full(50, material))
+    for _ in range(2): #Two meshes so that the second mesh's vertex indices are offset
+        corners = rng.uniform(-2, 2, (300, 3))
+        world.addMesh(np.concatenate([corners, corners + rng.uniform(-0.3, 0.3, (300, 3)), corners + rng.uniform(-0.3, 0.3, (300, 3))]), np.arange(900).reshape(3, 300).T, material)
+    world.addMesh([[-3, -3, 0], [3, -3, 0], [-3, 3, 0], [3, 3, 0]], [[0, 1, 2], [1, 3, 2]], material) #Triangles in an axis aligned plane have flat bounding boxes
+    world.compileTree()
+    assert world.numLeaves[None] == 652
+
+    tTree, tAll = ti.field(float, shape = (2000,)), ti.field(float, shape = (2000,))
+    closestHits(world, tTree, tAll)
+    assert np.allclose(tTree.to_numpy(), tAll.to_numpy())
+    assert (tTree.to_numpy() < 1e10).any()
+
+def testRenderMesh():
+    camera = createTestCamera(MEGAKERNEL_RENDERER)
+    camera.addMesh([[-0.5, -0.5, -0.8], [0.5, -0.5, -0.8], [0, 0.5, -0.8]], [[0, 1, 2]], camera.addMaterial(reflectiveMaterial(vec3(0.8, 0.8, 0.8), 0.0)))
+    camera.render()
+    image = camera.linearImage()
+    assert np.isfinite(image).all()
+    assert camera.numTriangles == 1 and camera.numLeaves[None] == 5
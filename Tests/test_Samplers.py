@@ -0,0 +1,54 @@
+from Utils.Camera import *
+import numpy as np
+import pytest
+
+@ti.kernel
+def streamPoints(samplerType: int, points: ti.template()): #type: ignore
+    '''
+    Fill points[pixel, dimension, sample] with the stream's point for the sample in the dimension, for pixels along a diagonal
+    '''
+    for pixel, dimension, sample in ti.ndrange(*points.shape):
+        points[pixel, dimension, sample] = pixelSampleStream(samplerType, pixel, 3 * pixel + 1, sample).get2D(dimension)
+
+@ti.kernel
+def mappedDirections(normal: vec3, spheres: ti.template(), hemispheres: ti.template()): #type: ignore
+    for i in spheres:
+        spheres[i], hemispheres[i] = uniformSphere(randomSample2D()), cosineHemisphere(normal, randomSample2D())
+
+def sobolPoints(shape):
+    points = ti.Vector.field(2, float, shape = shape)
+    streamPoints(SOBOL_SAMPLER_TYPE, points)
+    return points.to_numpy()
+
+def testSobolPointsAreStratified():
+    points = sobolPoints((4, 8, 16))
+    assert ((points >= 0) & (points < 1)).all()
+    for pixel, dimension in np.ndindex(4, 8):
+        cells = (4 * points[pixel, dimension]).astype(int)
+        assert len(set(map(tuple, cells))) == 16 #One point in every cell of a 4 x 4 grid
+        for axis in range(2):
+            assert len(set((16 * points[pixel, dimension, :, axis]).astype(int))) == 16
+
+def testStreamsAreDeterministic():
+    points = sobolPoints((4, 8, 16))
+    assert np.array_equal(points, sobolPoints((4, 8, 16)))
+    assert not np.allclose(points[0], points[1]) #Pixels are scrambled differently
+    assert not np.allclose(points[:, 0], points[:, 1]) #So are dimensions
+
+    randomPoints = ti.Vector.field(2, float, shape = (4, 8, 16))
+    streamPoints(RANDOM_SAMPLER_TYPE, randomPoints)
+    assert ((randomPoints.to_numpy() >= 0) & (randomPoints.to_numpy() < 1)).all()
+
+def testDirectionMappings():
+    normal = np.array([0.6, 0.0, 0.8])
+    spheres, hemispheres = ti.Vector.field(3, float, shape = (100000,)), ti.Vector.field(3, float, shape = (100000,))
+    mappedDirections(vec3(*normal), spheres, hemispheres)
+    spheres, hemispheres = spheres.to_numpy(), hemispheres.to_numpy()
+    assert np.allclose(np.linalg.norm(spheres, axis = 1), 1, atol = 1e-4) and np.allclose(np.linalg.norm(hemispheres, axis = 1), 1, atol = 1e-4)
+    assert np.allclose(spheres.mean(axis = 0), 0, atol = 0.01) and np.allclose((spheres ** 2).mean(axis = 0), 1 / 3, atol = 0.01)
+    cosines = hemispheres @ normal
+    assert cosines.min() >= 0 and abs(cosines.mean() - 2 / 3) < 0.01 #The mean cosine of a cos / pi density
+
+def testUnknownSampler():
+    with pytest.raises(ValueError):
+        Camera(vec3(0, 0, 1), 16, 90, vec3(0, 0, -1), 1, 0.001, 1e10, 1, 4, sampler = 'halton')
@@ -0,0 +1,45 @@
+from Utils.SceneFiles import *
+import json
+import pytest
+
+def createSceneWorld():
+    rng = np.random.default_rng(4)
+    world = World()
+    materials = [world.addMaterial(lambertianMaterial(vec3(0.1, 0.2, 0.5))), world.addMaterial(reflectiveMaterial(vec3(0.8, 0.6, 0.2), 0.3)), world.addMaterial(dielectricMaterial(1.5))]
+    world.addSpheres(rng.uniform(-2, 2, (200, 3)), rng.uniform(0.01, 0.3, 200), rng.choice(materials, 200))
+    world.addMesh([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]], [[0, 1, 2], [1, 3, 2]], materials[1])
+    return world
+
+def testSceneFileRoundTrip(tmp_path):
+    world, path = createSceneWorld(), str(tmp_path / 'scene.json')
+    saveScene(world, path, (0, 1, 2), (0, 0, -1))
+    header = readSceneHeader(path)
+    assert header['view'] == {'cameraPos': [0, 1, 2], 'lookAt': [0, 0, -1]}
+    assert header['materials'][1] == {'type': 'reflective', 'color': [0.8, 0.6, 0.2], 'fuzz': 0.3}
+    assert all(layout['offset'] % SCENE_ALIGNMENT == 0 for layout in header['layout'].values())
+
+    loaded = World()
+    loaded.addMaterial(lambertianMaterial(vec3(1, 1, 1))) #The scene's material indices move past materials that are already there
+    loadScene(loaded, path)
+    for original, copy in zip(world.joinSphereChunks() + world.joinMeshChunks(), loaded.joinSphereChunks() + loaded.joinMeshChunks()):
+        assert np.array_equal(original, copy - 1) if copy.dtype == np.int32 and copy.ndim == 1 else np.array_equal(original, copy)
+    assert [getMaterialType(material) for material in loaded.materialList] == [LAMBERTIAN, LAMBERTIAN, REFLECTIVE, DIELECTRIC]
+
+    loaded.compileTree()
+    assert loaded.numLeaves[None] == 202
+    assert np.array_equal(loaded.spheres.materialIndex.to_numpy()[:200], world.joinSphereChunks()[2] + 1)
+
+def testLoadSceneWithoutMeshes(tmp_path):
+    world, path = World(), str(tmp_path / 'spheres.json')
+    world.addHittable(sphere3(vec3(0, 0, -1), 0.5, lambertianMaterial(vec3(0.5, 0.5, 0.5))))
+    saveScene(world, path)
+    loaded = World()
+    assert 'view' not in loadScene(loaded, path)
+    loaded.compileTree()
+    assert loaded.numSpheres == 1 and loaded.numTriangles == 0
+
+def testRejectsOtherVersions(tmp_path):
+    path = tmp_path / 'scene.json'
+    path.write_text(json.dumps({'version': SCENE_FILE_VERSION + 1}))
+    with pytest.raises(ValueError):
+        readSceneHeader(str(path))
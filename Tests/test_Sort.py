@@ -0,0 +1,24 @@
+from Utils.Sort import *
+import numpy as np 
+import pytest 
+
+@pytest.mark.parametrize('numKeys, capacity', [
+    (1, 1),
+    (7, 10),
+    (1000, 1000),
+    (5000, 6000)
+])
+def testRadixSort(numKeys, capacity):
+    rng = np.random.default_rng(numKeys)
+    keys, values = ti.field(int, shape = (capacity,)), ti.field(int, shape = (capacity,))
+    keyArray = rng.integers(0, 1 << 30, capacity, dtype = np.int32)
+    keyArray[:numKeys // 2] = keyArray[numKeys // 2:numKeys // 2 * 2] #Make sure there are duplicate keys to check stability
+    keys.from_numpy(keyArray)
+    values.from_numpy(np.arange(capacity, dtype = np.int32))
+
+    radixSorter(capacity).sort(keys, values, numKeys)
+
+    order = np.argsort(keyArray[:numKeys], kind = 'stable')
+    assert (keys.to_numpy()[:numKeys] == keyArray[order]).all()
+    assert (values.to_numpy()[:numKeys] == order).all()
+    assert (keys.to_numpy()[numKeys:] == keyArray[numKeys:]).all()
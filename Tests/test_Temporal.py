@@ -0,0 +1,69 @@
+from Utils.Camera import *
+from Tests.test_Camera import createTestCamera
+import numpy as np
+import pytest
+
+@ti.kernel
+def visibleBefore(camera: ti.template(), sceneVersion: ti.template(), visible: ti.template()): #type: ignore
+    '''
+    Record whether the first hit of every pixel in the current view could be seen from the previous camera position (-1 for pixels that see the sky or were out of view)
+    '''
+    current = camera.temporal.current
+    oldCameraPos = camera.temporal.viewField[1 - current, 0]
+    for i, j in visible:
+        visible[i, j] = -1
+        if camera.temporal.firstHits[current, i, j].depth > 0:
+            point = camera.temporal.firstHits[current, i, j].position
+            pixel, inFront = camera.temporal.projectToPixel(1 - current, point - oldCameraPos)
+            if inFront and 0 <= pixel[0] <= camera.imageWidth - 1 and 0 <= pixel[1] <= camera.imageHeight - 1:
+                rayHitRecord = camera.hitObjects(ray3(oldCameraPos, point - oldCameraPos), initDefaultHitRecord(camera.tInterval))
+                visible[i, j] = tm.distance(rayHitRecord.pointHit, point) < 1e-3 * tm.distance(point, oldCameraPos)
+
+def moveCamera(camera, numSteps: int):
+    camera.setMovementX(1)
+    for _ in range(numSteps):
+        camera.setCamera()
+    camera.setMovementX(0)
+
+def visiblePixels(camera):
+    visible = ti.field(int, shape = (camera.imageWidth, camera.imageHeight))
+    visibleBefore(camera, camera.sceneVersion, visible)
+    return visible.to_numpy()
+
+def testReprojectionKeepsVisibleSamples():
+    reference = createTestCamera(MEGAKERNEL_RENDERER)
+    moveCamera(reference, 1)
+    for _ in range(64):
+        reference.render()
+    errors = []
+    for temporal in (True, False):
+        camera = createTestCamera(MEGAKERNEL_RENDERER, temporal = temporal)
+        for _ in range(16):
+            camera.render()
+        moveCamera(camera, 1)
+        if temporal:
+            keptPixels = camera.accumulation.passCountField.to_numpy() > 0
+            assert keptPixels[visiblePixels(camera) == 1].mean() > 0.95
+            assert keptPixels[:, -1].all() #The top row only sees the sky
+        camera.render()
+        errors.append(np.sqrt(((np.sqrt(camera.linearImage()) - np.sqrt(reference.linearImage())) ** 2).mean()))
+    assert errors[0] < 0.5 * errors[1]
+
+def testReprojectionRejectsDisocclusions():
+    camera = Camera(vec3(0, 0, 1), 64, 90, vec3(0, 0, -1), 1, 0.001, 1e10, 1, 4, temporal = True)
+    camera.addHittable(sphere3(vec3(0, 0, -0.5), 0.5, lambertianMaterial(vec3(0.1, 0.2, 0.5))))
+    camera.addMesh([[-20, -20, -3], [20, -20, -3], [0, 20, -3]], [[0, 1, 2]], camera.addMaterial(lambertianMaterial(vec3(0.8, 0.8, 0.8))))
+    for _ in range(4):
+        camera.render()
+    moveCamera(camera, 3)
+    visible, keptPixels = visiblePixels(camera), camera.accumulation.passCountField.to_numpy() > 0
+    assert (visible == 0).sum() > 20 #The wall next to the sphere that it used to hide
+    assert keptPixels[visible == 0].mean() < 0.1 and keptPixels[visible == 1].mean() > 0.9
+
+def testSceneChangeDropsHistory():
+    camera = createTestCamera(MEGAKERNEL_RENDERER, temporal = True)
+    for _ in range(4):
+        camera.render()
+    camera.addHittable(sphere3(vec3(0, 1, -1), 0.3, lambertianMaterial(vec3(0.5, 0.5, 0.5))))
+    moveCamera(camera, 1)
+    assert (camera.accumulation.passCountField.to_numpy() == 0).all()
@@ -0,0 +1,48 @@
+from Utils.World import *
+from Tests.test_BoundTree import closestHits
+import os
+
+def createCachedWorld(treeCache, seed = 0, treeBuilder = LBVH_BUILDER, color = vec3(0.5, 0.5, 0.5)):
+    rng = np.random.default_rng(seed)
+    world = World(treeBuilder = treeBuilder, treeCache = treeCache)
+    world.addSpheres(rng.uniform(-2, 2, (300, 3)), rng.uniform(0.01, 0.3, 300), np.full(300, world.addMaterial(lambertianMaterial(color))))
+    world.addMesh([[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 1, 2]], 0)
+    return world
+
+def testLoadsCachedTree(tmp_path):
+    treeCache = bvhCache(str(tmp_path))
+    built = createCachedWorld(treeCache)
+    built.compileTree()
+    assert (treeCache.hits, treeCache.misses) == (0, 1)
+
+    loaded = createCachedWorld(treeCache, color = vec3(0.9, 0.1, 0.1)) #Materials aren't part of the key
+    loaded.compileTree()
+    assert (treeCache.hits, treeCache.misses) == (1, 1)
+    for builtArray, loadedArray in zip(built.treeArrays(), loaded.treeArrays()):
+        assert np.array_equal(builtArray, loadedArray)
+    assert loaded.builtSAHCost == built.builtSAHCost
+
+    tTree, tAll = ti.field(float, shape = (2000,)), ti.field(float, shape = (2000,))
+    closestHits(loaded, tTree, tAll)
+    assert np.allclose(tTree.to_numpy(), tAll.to_numpy())
+
+def testKeyDependsOnGeometryAndBuilder(tmp_path):
+    treeCache = bvhCache(str(tmp_path))
+    keys = {treeCache.treeKey(createCachedWorld(treeCache, seed, treeBuilder)) for seed, treeBuilder in ((0, LBVH_BUILDER), (1, LBVH_BUILDER), (0, SAH_BUILDER))}
+    assert len(keys) == 3
+    assert treeCache.treeKey(createCachedWorld(treeCache, color = vec3(1, 0, 0))) in keys
+
+def testEvictsLeastRecentlyUsed(tmp_path):
+    treeCache = bvhCache(str(tmp_path))
+    worlds = [createCachedWorld(treeCache, seed) for seed in range(3)]
+    keys = [treeCache.treeKey(world) for world in worlds]
+    for world in worlds[:2]:
+        world.compileTree()
+    for lastUsed, key in zip((100, 200), keys):
+        for part in TREE_CACHE_PARTS:
+            os.utime(treeCache.partPath(key, part), (lastUsed, lastUsed))
+
+    treeCache.maxBytes = sum(size for _, size, _ in treeCache.entries()) #Room for two trees
+    assert treeCache.load(createCachedWorld(None), keys[0]) #Loading the older tree makes it the most recently used
+    worlds[2].compileTree()
+    assert sorted(key for _, _, key in treeCache.entries()) == sorted([keys[0], keys[2]])
@@ -1,4 +1,5 @@
 from Utils.Vectors import *
+import numpy as np
 import pytest 
 
 @pytest.mark.parametrize('bool1, bool2, answer', [
@@ -16,4 +17,24 @@ def createTestRandomVector() -> vec3: #type: ignore
 
 def testUnitCircle():
     for _ in range(250):
-        assert abs(magnitude(createTestRandomVector()) - 1) < 1e2
\ No newline at end of file
+        assert abs(magnitude(createTestRandomVector()) - 1) < 1e2
+
+@ti.kernel 
+def fillRandomVectors(vectors: ti.template()): #type: ignore
+    for i in vectors:
+        vectors[i] = randomVectorOnUnitSphere()
+
+def testRandomVectorsAreUniform():
+    vectors = ti.Vector.field(3, float, shape = (100000,))
+    fillRandomVectors(vectors)
+    vectors = vectors.to_numpy()
+    assert np.allclose(vectors.mean(axis = 0), 0, atol = 0.01)
+    assert np.allclose((vectors ** 2).mean(axis = 0), 1 / 3, atol = 0.01) #Each axis gets a third of the length on average
+
+@ti.kernel 
+def isNearZero(v: vec3) -> bool: #type: ignore
+    return nearZero(v)
+
+def testNearZero():
+    assert isNearZero(vec3(1e-6, -1e-6, 0))
+    assert not isNearZero(vec3(-1, -1, -1))
@@ -0,0 +1,152 @@
+from .Camera import *
+from taichi.lang.field import ScalarField
+from taichi.lang.matrix import MatrixField
+from taichi.lang.struct import StructField
+from taichi.aot.utils import produce_injected_args_from_template
+import json
+import os
+
+AOT_MANIFEST, AOT_SCENE = 'renderModule.json', 'scene.npz'
+
+@ti.kernel
+def loadSpheres(camera: ti.template(), centers: ti.types.ndarray(dtype = ti.f32, ndim = 2), radii: ti.types.ndarray(dtype = ti.f32, ndim = 1), materialIndices: ti.types.ndarray(dtype = ti.i32, ndim = 1), numSpheres: int): #type: ignore
+    '''
+    Copy the spheres into the sphere fields (the arrays come from the loader since fields can't be written from outside of kernels in a loaded module)
+    '''
+    camera.numSpheresField[None] = numSpheres
+    for i in range(numSpheres):
+        camera.spheres[i].center = vec3(centers[i, 0], centers[i, 1], centers[i, 2])
+        camera.spheres[i].radius, camera.spheres[i].materialIndex = radii[i], materialIndices[i]
+
+@ti.kernel
+def loadMaterials(camera: ti.template(), materialTypes: ti.types.ndarray(dtype = ti.i32, ndim = 1), colors: ti.types.ndarray(dtype = ti.f32, ndim = 2), fuzz: ti.types.ndarray(dtype = ti.f32, ndim = 1), refractionIndices: ti.types.ndarray(dtype = ti.f32, ndim = 1), numMaterials: int): #type: ignore
+    for i in range(numMaterials):
+        camera.materials[i].materialType, camera.materials[i].color = materialTypes[i], vec3(colors[i, 0], colors[i, 1], colors[i, 2])
+        camera.materials[i].fuzz, camera.materials[i].refractionIndex = fuzz[i], refractionIndices[i]
+
+@ti.kernel
+def loadLights(camera: ti.template(), objectIndices: ti.types.ndarray(dtype = ti.i32, ndim = 1), numLights: int): #type: ignore
+    '''
+    Fill the light list with the object indices of the emissive spheres
+    '''
+    camera.lightList.numLightsField[None] = numLights
+    for i in range(numLights):
+        camera.lightList.lights[i] = objectIndices[i]
+
+@ti.kernel
+def loadView(camera: ti.template(), view: ti.types.ndarray(dtype = ti.f32, ndim = 2)): #type: ignore
+    '''
+    Place the camera at view[0] looking at view[1] with the mouse centered and no movement
+    '''
+    cameraPos, lookAt = vec3(view[0, 0], view[0, 1], view[0, 2]), vec3(view[1, 0], view[1, 1], view[1, 2])
+    camera.movement.positionField[0], camera.movement.positionField[1], camera.movement.lookAtField[None] = cameraPos, lookAt, lookAt
+    for i in ti.static(range(3)):
+        camera.movement.movementField[i] = 0
+    for i in ti.static(range(2)):
+        camera.mousePositions.mousePositionField[i] = 0.5
+
+@ti.kernel
+def readImage(camera: ti.template(), image: ti.types.ndarray(dtype = ti.f32, ndim = 3)): #type: ignore
+    '''
+    Copy the accumulated linear image out of the module
+    '''
+    for i, j in camera.pixelField:
+        color = camera.accumulation.colorSumField[i, j] / ti.max(camera.accumulation.passCountField[i, j], 1)
+        for c in ti.static(range(3)):
+            image[i, j, c] = color[c]
+
+def moduleFields(owner, prefix = '', seen = None):
+    '''
+    Yield the name and field of every scalar and matrix field held by a data oriented object and the objects inside of it (struct fields are split into their members). A loaded module only allocates the fields that were added to it
+    '''
+    seen = set() if seen is None else seen
+    if id(owner) in seen:
+        return
+    seen.add(id(owner))
+    for name, value in vars(owner).items():
+        if isinstance(value, (ScalarField, MatrixField, StructField)):
+            yield from memberFields(prefix + name, value)
+        elif getattr(type(value), '_data_oriented', False):
+            yield from moduleFields(value, f'{prefix}{name}.', seen)
+
+def memberFields(name, field):
+    if isinstance(field, StructField):
+        for key in field.keys:
+            yield from memberFields(f'{name}.{key}', field.get_member_field(key))
+    else:
+        yield name, field
+
+def exportRenderModule(camera, moduleDir: str):
+    '''
+    Save the camera's render, BVH build, and camera update kernels as a Taichi AOT module (along with the camera's scene and view) that AOTRenderer.py runs without Taichi tracing any Python. The fields are compiled into the kernels, so the module renders scenes of up to the camera's current sphere, leaf, and material capacities (reserve more before exporting for bigger scenes) at the camera's resolution, samples per pixel, and depth. Only the megakernel renderer, the LBVH builder, and spheres are exported (the loader fills the light list with the emissive spheres)
+    '''
+    checkTaichiInternals('Exporting a render module')
+    if camera.treeBuilder != LBVH_BUILDER or camera.wavefront is not None:
+        raise ValueError('Only cameras with the LBVH builder and the megakernel renderer can be exported')
+    camera.updateScene()
+    if camera.numTriangles > 0 or camera.numInstances > 0:
+        raise ValueError('Scenes with meshes or instances can\'t be exported yet (the loader only loads spheres)')
+    camera.reserveLeaves(camera.sphereCapacity)
+    if camera.lightList.reserveLights(camera.sphereCapacity): #Every loaded sphere can be a light
+        camera.sceneVersion += 1
+        camera.uploadLights()
+    camera.treeOutdated = True #The tree is built again for the bigger leaf fields the next time the camera renders
+
+    fields = list(moduleFields(camera))
+    treeIds = {field.snode.ptr.get_snode_tree_id() for _, field in fields}
+    if treeIds != set(range(len(treeIds))):
+        raise ValueError('A loaded module allocates the field trees by their IDs from 0, so the camera has to hold every field in the process (export it from a new process)')
+    module = ti.aot.Module()
+    for name, field in fields:
+        module.add_field(name, field)
+
+    kernels, sorter = [], camera.leafSorter
+    def addKernel(name, kernel, **templateArgs):
+        key = kernel._primal.ensure_compiled(*produce_injected_args_from_template(kernel._primal, templateArgs))
+        kernel._primal.kernel_cpp = kernel._primal.compiled_kernels[key] #add_kernel saves the instance that was compiled last, which isn't this one when the kernel was already compiled for other template arguments (like the sort kernels for both directions)
+        module.add_kernel(kernel, template_args = templateArgs, name = name)
+        kernels.append(name)
+
+    addKernel('loadSpheres', loadSpheres, camera = camera, centers = ti.ndarray(ti.f32, (1, 3)), radii = ti.ndarray(ti.f32, (1,)), materialIndices = ti.ndarray(ti.i32, (1,)))
+    addKernel('loadMaterials', loadMaterials, camera = camera, materialTypes = ti.ndarray(ti.i32, (1,)), colors = ti.ndarray(ti.f32, (1, 3)), fuzz = ti.ndarray(ti.f32, (1,)), refractionIndices = ti.ndarray(ti.f32, (1,)))
+    addKernel('loadLights', loadLights, camera = camera, objectIndices = ti.ndarray(ti.i32, (1,)))
+    addKernel('loadView', loadView, camera = camera, view = ti.ndarray(ti.f32, (2, 3)))
+    addKernel('readImage', readImage, camera = camera, image = ti.ndarray(ti.f32, (1, 1, 3)))
+    addKernel('initLeaves', camera.initLeaves, self = camera, sceneVersion = camera.sceneVersion)
+    addKernel('encodeLeaves', camera.encodeLeaves, self = camera, sceneVersion = camera.sceneVersion)
+    addKernel('countDigitsLeaves', sorter.countDigits, self = sorter, keys = camera.leaves.mortonCode)
+    addKernel('countDigitsBuffer', sorter.countDigits, self = sorter, keys = sorter.keyBuffer)
+    addKernel('scanDigitCounts', sorter.scanDigitCounts, self = sorter)
+    addKernel('scatterLeaves', sorter.scatter, self = sorter, keys = camera.leaves.mortonCode, values = camera.leaves.objectIndex, sortedKeys = sorter.keyBuffer, sortedValues = sorter.valueBuffer)
+    addKernel('scatterBuffer', sorter.scatter, self = sorter, keys = sorter.keyBuffer, values = sorter.valueBuffer, sortedKeys = camera.leaves.mortonCode, sortedValues = camera.leaves.objectIndex)
+    addKernel('copyBack', sorter.copyBack, self = sorter, keys = camera.leaves.mortonCode, values = camera.leaves.objectIndex)
+    addKernel('gatherBoundingBoxes', camera.gatherBoundingBoxes, self = camera, sceneVersion = camera.sceneVersion)
+    addKernel('buildNodes', camera.buildNodes, self = camera, sceneVersion = camera.sceneVersion)
+    addKernel('updateCamera', camera.updateCamera, self = camera)
+    addKernel('resetAccumulation', camera.accumulation.reset, self = camera.accumulation)
+    addKernel('renderPixels', camera.renderPixels, self = camera, sceneVersion = camera.sceneVersion)
+    for name in ('setMovementX', 'setMovementY', 'setMovementZ'):
+        addKernel(name, getattr(camera, name), self = camera)
+    for name in ('setMouseX', 'setMouseY'):
+        addKernel(name, getattr(camera.mousePositions, name), self = camera.mousePositions)
+
+    os.makedirs(moduleDir, exist_ok = True)
+    module.save(moduleDir)
+    manifest = {
+        'arch': str(ti.lang.impl.current_cfg().arch).split('.')[-1],
+        'imageWidth': camera.imageWidth,
+        'imageHeight': camera.imageHeight,
+        'samplesPerPixel': camera.samplesPerPixel,
+        'maxDepth': camera.maxDepth,
+        'sphereCapacity': camera.sphereCapacity,
+        'materialCapacity': camera.materialCapacity,
+        'emissiveMaterialType': EMISSIVE,
+        'sortBlockSize': SORT_BLOCK_SIZE,
+        'sortShifts': list(range(0, sorter.keyBits, RADIX_BITS)),
+        'kernels': kernels
+    }
+    with open(os.path.join(moduleDir, AOT_MANIFEST), 'w') as file:
+        json.dump(manifest, file, indent = 2)
+    centers, radii, materialIndices = camera.joinSphereChunks()
+    np.savez(os.path.join(moduleDir, AOT_SCENE), centers = centers, radii = radii, materialIndices = materialIndices, cameraPos = camera.movement.positionField[0].to_numpy(), lookAt = camera.movement.positionField[1].to_numpy(), **createMaterialTable(camera.materialList)) #The scene to render when the loader isn't given one
+    return manifest
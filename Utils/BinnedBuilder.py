@@ -0,0 +1,146 @@
+from .BoundBox import *
+
+SAH_BINS = 16
+
+@ti.data_oriented 
+class binnedSAHBuilder:
+    '''
+    Top down BVH builder that splits every node where the surface area heuristic (SAH) says it's cheapest to trace, using binned centroids along the node's longest axis. Every level of the tree is built in parallel with one thread for each node that still has to be split. It builds the same layout as the LBVH: leaves are reordered in place, node 0 is the root, and children that are nodes are offset by the number of leaves
+    '''
+    def __init__(self, capacity: int):
+        self.capacity = capacity 
+        self.tasks = ti.Struct.field({
+            'nodeIndex': int, 
+            'firstIndex': int, 
+            'lastIndex': int 
+        }, shape = (2, max(capacity, 1))) #Nodes that have to be split on the current level and the next level
+        self.taskCounts, self.nodeCount = ti.field(int, shape = (2,)), ti.field(int, shape = ())
+
+    @ti.kernel 
+    def initRoot(self, numLeaves: int):
+        self.tasks[0, 0].nodeIndex, self.tasks[0, 0].firstIndex, self.tasks[0, 0].lastIndex = 0, 0, numLeaves - 1
+        self.taskCounts[0], self.taskCounts[1], self.nodeCount[None] = 1, 0, 1
+
+    @ti.func 
+    def binIndex(self, centroid, minCentroid, binScale):
+        return ti.min(int((centroid - minCentroid) * binScale), SAH_BINS - 1)
+    
+    @ti.func 
+    def boxArea(self, minPoint, maxPoint):
+        extent = ti.max(maxPoint - minPoint, 0.0)
+        return 2 * (extent[0] * extent[1] + extent[0] * extent[2] + extent[1] * extent[2])
+
+    @ti.func 
+    def findBestBin(self, leaves: ti.template(), firstIndex, lastIndex, axis, minCentroid, binScale): #type: ignore
+        '''
+        Bin the leaves' centroids and return the last bin of the left child for the split with the lowest SAH cost (the number of leaves on each side times the area of their bounding box)
+        '''
+        binCounts = ti.Vector.zero(int, SAH_BINS)
+        binMin, binMax = ti.Matrix.zero(float, SAH_BINS, 3), ti.Matrix.zero(float, SAH_BINS, 3)
+        for b in range(SAH_BINS):
+            for k in ti.static(range(3)):
+                binMin[b, k], binMax[b, k] = tm.inf, -tm.inf 
+        
+        for i in range(firstIndex, lastIndex + 1):
+            boundingBox = leaves[i].boundingBox
+            b = self.binIndex(boundingBox.centroid()[axis], minCentroid, binScale)
+            binCounts[b] += 1
+            for k in ti.static(range(3)):
+                binMin[b, k] = ti.min(binMin[b, k], boundingBox.getIntervalWithIndex(k).minValue)
+                binMax[b, k] = ti.max(binMax[b, k], boundingBox.getIntervalWithIndex(k).maxValue)
+        
+        rightCosts = ti.Vector.zero(float, SAH_BINS) #Cost of the right child when it starts at each bin
+        rightMin, rightMax, rightCount = vec3(tm.inf, tm.inf, tm.inf), vec3(-tm.inf, -tm.inf, -tm.inf), 0
+        for reverseBin in range(SAH_BINS - 1):
+            b = SAH_BINS - 1 - reverseBin 
+            rightCount += binCounts[b]
+            if binCounts[b] > 0:
+                rightMin, rightMax = ti.min(rightMin, vec3(binMin[b, 0], binMin[b, 1], binMin[b, 2])), ti.max(rightMax, vec3(binMax[b, 0], binMax[b, 1], binMax[b, 2]))
+            rightCosts[b] = rightCount * self.boxArea(rightMin, rightMax)
+
+        bestBin, bestCost = -1, tm.inf
+        leftMin, leftMax, leftCount = vec3(tm.inf, tm.inf, tm.inf), vec3(-tm.inf, -tm.inf, -tm.inf), 0
+        for b in range(SAH_BINS - 1):
+            leftCount += binCounts[b]
+            if binCounts[b] > 0:
+                leftMin, leftMax = ti.min(leftMin, vec3(binMin[b, 0], binMin[b, 1], binMin[b, 2])), ti.max(leftMax, vec3(binMax[b, 0], binMax[b, 1], binMax[b, 2]))
+            if leftCount > 0 and leftCount < lastIndex - firstIndex + 1:
+                cost = leftCount * self.boxArea(leftMin, leftMax) + rightCosts[b + 1]
+                if cost < bestCost:
+                    bestBin, bestCost = b, cost 
+        return bestBin 
+
+    @ti.func 
+    def partition(self, leaves: ti.template(), firstIndex, lastIndex, axis, minCentroid, binScale, bestBin): #type: ignore
+        '''
+        Move the leaves in the bins up to bestBin in front of the others and return the index of the last one
+        '''
+        i, j = firstIndex, lastIndex 
+        while i <= j:
+            if self.binIndex(leaves[i].boundingBox.centroid()[axis], minCentroid, binScale) <= bestBin:
+                i += 1
+            else: 
+                leaves[i], leaves[j] = leaves[j], leaves[i]
+                j -= 1
+        return i - 1
+    
+    @ti.func 
+    def addChild(self, nodes: ti.template(), numLeaves, firstIndex, lastIndex, nextQueue): #type: ignore
+        '''
+        Return the child index for the leaves in [firstIndex, lastIndex], creating a node and adding it to the next level when there's more than one leaf
+        '''
+        childIndex = firstIndex 
+        if lastIndex > firstIndex:
+            nodeIndex = ti.atomic_add(self.nodeCount[None], 1)
+            task = ti.atomic_add(self.taskCounts[nextQueue], 1)
+            self.tasks[nextQueue, task].nodeIndex, self.tasks[nextQueue, task].firstIndex, self.tasks[nextQueue, task].lastIndex = nodeIndex, firstIndex, lastIndex 
+            childIndex = nodeIndex + numLeaves 
+        return childIndex 
+
+    @ti.kernel 
+    def splitNodes(self, leaves: ti.template(), nodes: ti.template(), numLeaves: int, queue: int): #type: ignore
+        '''
+        Split every node on the current level and add the children that need splitting to the next level
+        '''
+        nextQueue = 1 - queue 
+        for task in range(self.taskCounts[queue]):
+            nodeIndex, firstIndex, lastIndex = self.tasks[queue, task].nodeIndex, self.tasks[queue, task].firstIndex, self.tasks[queue, task].lastIndex 
+
+            boundingBox = leaves[firstIndex].boundingBox.returnCopy()
+            minCentroid, maxCentroid = boundingBox.centroid(), boundingBox.centroid()
+            for i in range(firstIndex + 1, lastIndex + 1):
+                boundingBox.addBoundingBox(leaves[i].boundingBox)
+                minCentroid, maxCentroid = ti.min(minCentroid, leaves[i].boundingBox.centroid()), ti.max(maxCentroid, leaves[i].boundingBox.centroid())
+            nodes[nodeIndex].boundingBox = boundingBox 
+
+            extent = maxCentroid - minCentroid 
+            axis = 0
+            if extent[1] > extent[axis]:
+                axis = 1
+            if extent[2] > extent[axis]:
+                axis = 2
+
+            split = -1
+            if extent[axis] > 1e-12:
+                binScale = SAH_BINS / extent[axis]
+                bestBin = self.findBestBin(leaves, firstIndex, lastIndex, axis, minCentroid[axis], binScale)
+                if bestBin >= 0:
+                    split = self.partition(leaves, firstIndex, lastIndex, axis, minCentroid[axis], binScale, bestBin)
+            if split < firstIndex or split >= lastIndex: #Every centroid is in the same place so just split the leaves in half
+                split = (firstIndex + lastIndex) >> 1
+
+            nodes[nodeIndex].leftChild = self.addChild(nodes, numLeaves, firstIndex, split, nextQueue)
+            nodes[nodeIndex].rightChild = self.addChild(nodes, numLeaves, split + 1, lastIndex, nextQueue)
+        self.taskCounts[queue] = 0
+
+    def build(self, leaves, nodes, numLeaves: int):
+        '''
+        Build the nodes over the first numLeaves leaves (which get reordered)
+        '''
+        if numLeaves < 2:
+            return 
+        self.initRoot(numLeaves)
+        queue = 0 
+        while self.taskCounts[queue] > 0:
+            self.splitNodes(leaves, nodes, numLeaves, queue)
+            queue = 1 - queue 
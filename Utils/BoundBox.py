@@ -1,6 +1,5 @@
-from Rays import * 
-from Interval import *
-from taichi.algorithms import parallel_sort 
+from .Rays import * 
+from .Interval import *
 
 @ti.dataclass
 class aabb:
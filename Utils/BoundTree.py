@@ -1,13 +1,132 @@
-from Objects import * 
-from Morton import *
-from Sort import *
-import time 
+from .Objects import * 
+from .Morton import *
+from .Sort import *
+from .BinnedBuilder import *
 
+import numpy as np
 import warnings
 warnings.filterwarnings("ignore") #Taichi throws warnings because list methods are used (and Taichi doesn't handle these but Python does). We want to ignore these warnings (the classes are specifically designed to allow taichi to work)
 
+BVH_STACK_SIZE = 64 #Each visited node adds at most one entry to the stack so this has to be larger than the depth of the tree (checkTreeDepth rejects deeper trees)
+LBVH_BUILDER, SAH_BUILDER = 'lbvh', 'sah' #The LBVH builds quickly from sorted Morton codes while the binned SAH builds slower trees that are faster to trace
+TREE_ARRAY_DTYPE = np.dtype([('indices', np.int32, 3), ('boundingBox', np.float32, 6)]) #One leaf or node of a tree copied out of the fields (the bounding box is the x, y, and z intervals)
+
+@ti.data_oriented 
+class traversalStatistics:
+    '''
+    Count the rays intersected with the scene and the box tests, object tests, and nodes visited for them. Every ray adds its counts at once when it's done so that the counters aren't contended on every test
+    '''
+    def __init__(self):
+        self.rayCountField, self.costFields = ti.field(ti.i64, shape = ()), ti.field(ti.i64, shape = (3,)) #Box tests, object tests, and nodes visited
+
+    @ti.func 
+    def addRay(self, cost):
+        self.rayCountField[None] += 1
+        for i in ti.static(range(3)):
+            self.costFields[i] += cost[i]
+
+    def perRay(self):
+        '''
+        Return the average number of box tests, object tests, and nodes visited for every ray since the counters were reset
+        '''
+        costs, numRays = self.costFields.to_numpy(), max(self.rayCountField[None], 1)
+        return {'boxTestsPerRay': costs[0] / numRays, 'objectTestsPerRay': costs[1] / numRays, 'nodesVisitedPerRay': costs[2] / numRays}
+
+    def reset(self):
+        self.rayCountField.fill(0)
+        self.costFields.fill(0)
+
+@ti.func 
+def traverseBVH(tree: ti.template(), treeIndex, ray, rayHitRecord, countCost: ti.template()): #type: ignore
+    '''
+    Walk a BVH tree with a fixed size stack to find the closest object that the ray hits. When both children are hit the farther child is pushed first so that the closer child gets visited first, and anything that the ray enters after the closest hit so far is skipped. The tree says how to walk it: treeLeafCount(treeIndex) gives its number of leaves, treeChild(treeIndex, childIndex) whether a child is a leaf with its index and bounding box, treeNodeChildren(treeIndex, index) a node's children, and hitTreeLeaf(treeIndex, index, ray, rayHitRecord) checks a leaf's object (treeIndex picks one of the trees stored in the tree's fields, like a group's tree). Children that are nodes are offset by the number of leaves. With countCost, the number of box tests, object tests, and nodes visited is returned with the hit record (otherwise it stays zero and the counting is compiled out)
+    '''
+    childStack, entryStack = ti.Vector.zero(int, BVH_STACK_SIZE), ti.Vector.zero(float, BVH_STACK_SIZE)
+    stackSize, cost, numLeaves = 0, ti.Vector.zero(int, 3), tree.treeLeafCount(treeIndex)
+
+    if numLeaves > 0:
+        root = 0 #A tree with one leaf has no nodes so the root is the leaf
+        if numLeaves > 1:
+            root = numLeaves 
+        rootHitRecord = tree.treeChild(treeIndex, root)[2].hit(ray, initDefaultHitRecord(rayHitRecord.tInterval))
+        if ti.static(countCost):
+            cost[0] += 1
+        if rootHitRecord.hitAnything:
+            childStack[0], entryStack[0] = root, rootHitRecord.tInterval.minValue
+            stackSize = 1
+
+    while stackSize > 0:
+        stackSize -= 1
+        if entryStack[stackSize] < rayHitRecord.t():
+            isLeaf, index = tree.treeChild(treeIndex, childStack[stackSize])[:2]
+            if isLeaf: 
+                rayHitRecord = tree.hitTreeLeaf(treeIndex, index, ray, rayHitRecord)
+                if ti.static(countCost):
+                    cost[1] += 1
+            else: 
+                nearChild, farChild = tree.treeNodeChildren(treeIndex, index)
+                nearBox, farBox = tree.treeChild(treeIndex, nearChild)[2], tree.treeChild(treeIndex, farChild)[2]
+                nearHitRecord, farHitRecord = nearBox.hit(ray, initDefaultHitRecord(rayHitRecord.tInterval)), farBox.hit(ray, initDefaultHitRecord(rayHitRecord.tInterval))
+                if ti.static(countCost):
+                    cost[0] += 2
+                    cost[2] += 1
+                if farHitRecord.hitAnything and (not nearHitRecord.hitAnything or farHitRecord.tInterval.minValue < nearHitRecord.tInterval.minValue):
+                    nearChild, farChild = farChild, nearChild 
+                    nearHitRecord, farHitRecord = farHitRecord, nearHitRecord 
+
+                if farHitRecord.hitAnything:
+                    childStack[stackSize], entryStack[stackSize] = farChild, farHitRecord.tInterval.minValue
+                    stackSize += 1
+                if nearHitRecord.hitAnything:
+                    childStack[stackSize], entryStack[stackSize] = nearChild, nearHitRecord.tInterval.minValue
+                    stackSize += 1
+                
+    return rayHitRecord, cost
+
 @ti.data_oriented 
 class BVHTree:
+
+    def __init__(self, treeBuilder = LBVH_BUILDER, countTraversal = False):
+        if treeBuilder not in (LBVH_BUILDER, SAH_BUILDER):
+            raise ValueError(f'Unknown tree builder {treeBuilder}')
+        self.treeBuilder, self.sahBuilder = treeBuilder, None 
+        self.countTraversal, self.traversalStatistics = countTraversal, traversalStatistics() #The counting is compiled out of the kernels unless countTraversal is set
+        self.numLeaves, self.treeDepthField = ti.field(int, shape = ()), ti.field(int, shape = ())
+        self.divisor, self.centroidScale = ti.Vector.field(3, float, shape = ()), ti.Vector.field(3, float, shape = (2,))
+        self.leafCapacity, self.sceneVersion, self.treeFields = 0, 0, None
+
+    def reserveLeaves(self, numLeaves: int):
+        '''
+        Make sure that the tree has room for numLeaves leaves and numLeaves - 1 nodes. When it doesn't, the fields are reallocated with at least double the capacity so that a growing scene only reallocates a logarithmic number of times. Taichi compiles the fields into the kernels, so kernels that use the tree take the scene version as a template argument to be compiled again after a reallocation
+        '''
+        if numLeaves <= self.leafCapacity:
+            return 
+        
+        self.leafCapacity = max(numLeaves, 2 * self.leafCapacity)
+        if self.treeFields is not None:
+            self.treeFields.destroy()
+
+        self.leaves = ti.Struct.field({
+            'objectIndex': int, 
+            'mortonCode': int, 
+            'boundingBox': aabb, 
+            'parent': int 
+        })
+        self.nodes = ti.Struct.field({
+            'boundingBox': aabb, 
+            'leftChild': int, 
+            'rightChild': int, 
+            'parent': int, 
+            'refitVisits': int 
+        }) #Keep track of nodes in the tree through keeping track of their children (children that are nodes are offset by the number of leaves)
+        self.boundingBoxBuffer = aabb.field()
+
+        fieldsBuilder = ti.FieldsBuilder()
+        fieldsBuilder.dense(ti.i, self.leafCapacity).place(self.leaves, self.boundingBoxBuffer)
+        fieldsBuilder.dense(ti.i, max(self.leafCapacity - 1, 1)).place(self.nodes)
+        self.treeFields = fieldsBuilder.finalize()
+        self.leafSorter = radixSorter(self.leafCapacity)
+        self.sceneVersion += 1
         
     @ti.func 
     def valueNearZero(self, x):
@@ -29,145 +148,124 @@ class BVHTree:
         self.divisor[None] = 1 / divisor
     
     @ti.func 
-    def createMorton(self, hittable): #type: ignore
+    def createMorton(self, boundingBox): #type: ignore
         '''
         Create and return a morton code for the BVH leaf
         '''
-        return mortonEncode(self.scaleCentroid(hittable))
+        return mortonEncode(self.scaleCentroid(boundingBox.centroid()))
 
     @ti.func 
-    def scaleCentroid(self, hittable) -> vec3: #type: ignore
+    def scaleCentroid(self, centroid) -> vec3: #type: ignore
         '''
         Scale the bounding box centroid vector to [0, 1] for determining morton codes
         '''
-        return (hittable.center - self.centroidScale[0]) * self.divisor[None]
+        return (centroid - self.centroidScale[0]) * self.divisor[None]
+
+    @ti.func 
+    def compileMinAndMaxCentroid(self): #type: ignore
+        '''
+        Find the minimum and maximum values for all of the leaves' bounding box centroids in order to rescale the centroids to [0, 1]
+        '''
+        self.centroidScale[0], self.centroidScale[1] = vec3(tm.inf, tm.inf, tm.inf), vec3(-tm.inf, -tm.inf, -tm.inf)
+        for i in ti.ndrange(self.numLeaves[None]):
+            centroid = self.leaves[i].boundingBox.centroid()
+            ti.atomic_min(self.centroidScale[0], centroid)
+            ti.atomic_max(self.centroidScale[1], centroid)
     
     @ti.func 
     def fillLeaves(self): #type: ignore
         '''
-        Fill the structure containing the leaves
+        Fill the leaves' Morton codes
         '''
         self.createDivisor()
         for i in ti.ndrange(self.numLeaves[None]):
-            self.leaves[i].mortonCode = self.createMorton(self.hittableList[i])
+            self.leaves[i].mortonCode = self.createMorton(self.leaves[i].boundingBox)
+
+    @ti.kernel 
+    def encodeLeaves(self, sceneVersion: ti.template()): #type: ignore
+        self.compileMinAndMaxCentroid()
+        self.fillLeaves()
 
     @ti.func 
     def countLeadingZeros(self, num):
         '''
-        Count the number of leading zeros in an unsigned binary representation of a number. I should get no credit for this (I was really clueless on how to do this until I found: https://github.com/archibate/ptina/blob/master/ptina/tree/lbvh.py [it has really really really awful naming conventions though good luck reading through it])
+        Count the number of leading zeros in the 32 bit representation of a number
+        '''
+        return ti.math.clz(num)
+
+    @ti.func 
+    def commonPrefix(self, i, j):
+        '''
+        Return the number of leading bits that the sorted Morton codes at i and j share, or -1 if j is outside of the leaves. Identical Morton codes compare their indices instead so that every leaf acts like it has a unique code (otherwise duplicate codes create nodes with overlapping ranges)
         '''
-        count = 0 
-        while True: 
-            leftBit = num >> (31 - count) #Assumption being that we're using a 32 bit unsigned integer, and we're finding the leftmost bit by shifting it over and incrementing count. Note that the leftover values from the left of the bitwise shift left don't matter because the algorithm checks if they're 0 anyway (what a genius algorithm that person on Github came up with)
-            if leftBit == 1 or count == 31:
-                count += 1
-                break 
-            count += 1
-        return count 
+        prefix = -1
+        if 0 <= j and j < self.numLeaves[None]:
+            codeI, codeJ = self.leaves.mortonCode[i], self.leaves.mortonCode[j]
+            if codeI != codeJ:
+                prefix = self.countLeadingZeros(codeI ^ codeJ)
+            else: 
+                prefix = 32 + self.countLeadingZeros(i ^ j)
+        return prefix 
 
     @ti.func 
     def findSplit(self, firstIndex, lastIndex):
         '''
         Find the split for the LBVH. Thanks to https://developer.nvidia.com/blog/thinking-parallel-part-iii-tree-construction-gpu/ (lifesaver). I translated the code over to Taichi Python
         '''
-        firstCode, lastCode = self.leaves.mortonCode[firstIndex], self.leaves.mortonCode[lastIndex]
-        splitIndex = 0 
-
-        if firstCode == lastCode: 
-            splitIndex = int(firstIndex + lastIndex) >> 1 #If the code at the first sorted morton code is equal to the code at the last sorted morton code, just take the midpoint (bitwise shift right by 1 for efficiency sake [fancy? :)]). Use the casting to int to avoid Taichi throwing a losing precision warning
-        else: 
-            commonPrefix = self.countLeadingZeros(firstCode ^ lastCode) #This is the number of bits that the first Morton code and the last Morton code share 
+        commonPrefix = self.commonPrefix(firstIndex, lastIndex) #This is the number of bits that the first Morton code and the last Morton code share 
 
-            # We now perform binary search to find where the next bit differs and we return the split index that splits this difference
-            splitIndex = firstIndex #Start the split at the first possible index
-            step = lastIndex - firstIndex #Init the step 
+        # We now perform binary search to find where the next bit differs and we return the split index that splits this difference
+        splitIndex = firstIndex #Start the split at the first possible index
+        step = lastIndex - firstIndex #Init the step 
 
-            while step > 1: 
-                step = (step + 1) >> 1 #This is the step for binary search
-                newSplit = splitIndex + step 
-                
-                if newSplit < lastIndex: #Check whether the split is a valid split
-                    splitCode = self.leaves.mortonCode[newSplit]
-                    splitPrefix = self.countLeadingZeros(firstCode ^ splitCode)
-                    if splitPrefix > commonPrefix:
-                        splitIndex = newSplit 
+        while step > 1: 
+            step = (step + 1) >> 1 #This is the step for binary search
+            newSplit = splitIndex + step 
+            
+            if newSplit < lastIndex and self.commonPrefix(firstIndex, newSplit) > commonPrefix: #Check whether the split is a valid split that shares more bits with the first code
+                splitIndex = newSplit 
         
         return splitIndex
     
     @ti.func
     def determineRange(self, i):
         '''
-        Determine the range for firstIndex and lastIndex. PLEASE NOTE that I should get absolutely no credit for this. I could not (for the life of me) understand the algorithm so I copy pasted https://github.com/archibate/ptina/blob/master/ptina/tree/lbvh.py.
-        '''
-        l, r = 0, self.numLeaves[None] - 1
-
-        if i != 0:
-            ic = self.leaves.mortonCode[i]
-            lc = self.leaves.mortonCode[i - 1]
-            rc = self.leaves.mortonCode[i + 1]
-
-            if lc == ic == rc:
-                l = i
-                while i < self.numLeaves[None] - 1:
-                    i += 1
-                    if i >= self.numLeaves[None] - 1:
-                        break
-                    if self.leaves.mortonCode[i] != self.leaves.mortonCode[i + 1]:
-                        break
-                r = i
-
-            else:
-                ld = self.countLeadingZeros(ic ^ lc)
-                rd = self.countLeadingZeros(ic ^ rc)
-
-                d = -1
-                if rd > ld:
-                    d = 1
-                delta_min = ti.min(ld, rd)
-                lmax = 2
-                delta = -1
-                itmp = i + d * lmax
-                if 0 <= itmp < self.numLeaves[None]:
-                    delta = self.countLeadingZeros(ic ^ self.leaves.mortonCode[itmp])
-                while delta > delta_min:
-                    lmax <<= 1
-                    itmp = i + d * lmax
-                    delta = -1
-                    if 0 <= itmp < self.numLeaves[None]:
-                        delta = self.countLeadingZeros(ic ^ self.leaves.mortonCode[itmp])
-                s = 0
-                t = lmax >> 1
-                while t > 0:
-                    itmp = i + (s + t) * d
-                    delta = -1
-                    if 0 <= itmp < self.numLeaves[None]:
-                        delta = self.countLeadingZeros(ic ^ self.leaves.mortonCode[itmp])
-                    if delta > delta_min:
-                        s += t
-                    t >>= 1
-
-                l, r = i, i + s * d
-                if d < 0:
-                    l, r = r, l
-
-        return l, r
+        Determine the range of leaves [firstIndex, lastIndex] covered by node i. This follows "Maximizing Parallelism in the Construction of BVHs, Octrees, and k-d Trees" (Karras 2012): the direction of the range is towards the neighbor sharing more bits, and the other end is found by growing and then binary searching the range while it shares more bits than the other neighbor
+        '''
+        direction = 1
+        if self.commonPrefix(i, i + 1) < self.commonPrefix(i, i - 1):
+            direction = -1
+        minPrefix = self.commonPrefix(i, i - direction)
 
-    @ti.func 
-    def generateBoundingBox(self, leftIndex, rightIndex):
+        maxLength = 2
+        while self.commonPrefix(i, i + maxLength * direction) > minPrefix:
+            maxLength <<= 1
+
+        length, step = 0, maxLength >> 1
+        while step > 0:
+            if self.commonPrefix(i, i + (length + step) * direction) > minPrefix:
+                length += step 
+            step >>= 1
+
+        otherEnd = i + length * direction 
+        return ti.min(i, otherEnd), ti.max(i, otherEnd)
+
+    @ti.kernel 
+    def gatherBoundingBoxes(self, sceneVersion: ti.template()): #type: ignore
         '''
-        Generate a bounding box given the hittable list start index and end index (needed for transversal of the BVH Tree)
+        Move the bounding boxes to the sorted order of the leaves. Before sorting a leaf's object index is its position, so after sorting the object index says where the leaf's bounding box came from
         '''
-        boundingBox = self.leaves[leftIndex].boundingBox.returnCopy()
-        for i in ti.ndrange((leftIndex + 1, rightIndex + 1)):
-            boundingBox.addBoundingBox(self.leaves[i].boundingBox)
-        return boundingBox
+        for i in ti.ndrange(self.numLeaves[None]):
+            self.boundingBoxBuffer[i] = self.leaves[self.leaves[i].objectIndex].boundingBox
+        for i in ti.ndrange(self.numLeaves[None]):
+            self.leaves[i].boundingBox = self.boundingBoxBuffer[i]
 
-    @ti.func 
     def sortLeaves(self):
         '''
-        Sort the leaves in ascending order based on their Morton codes
+        Sort the leaves in ascending order based on their Morton codes with a parallel radix sort that carries the object indices along with the codes
         '''
-        selectionSort(self.leaves)
+        self.leafSorter.sort(self.leaves.mortonCode, self.leaves.objectIndex, self.numLeaves[None])
+        self.gatherBoundingBoxes(self.sceneVersion)
 
     @ti.func 
     def generateNodes(self):
@@ -176,199 +274,236 @@ class BVHTree:
         '''
 
         for i in ti.ndrange(self.numLeaves[None] - 1):
-            print('HERE', self.numLeaves)
             firstIndex, lastIndex = self.determineRange(i)
             split = self.findSplit(firstIndex, lastIndex)
-            print(f'First, Last Index, and Split: {firstIndex}, {lastIndex}, {split}')
 
             leftSplit = split 
             if leftSplit != firstIndex:
                 leftSplit += self.numLeaves[None] #Add the number of leaves to make the split out of index of the Morton Codes to indicate that the child is another node
-            else:
-                print(self.leaves[leftSplit].objectIndex)
             
             rightSplit = split + 1
             if rightSplit != lastIndex:
                 rightSplit += self.numLeaves[None] #Add the number of leaves to make the split out of index of the Morton Codes to indicate that the child is another node
-            else: 
-                print(self.leaves[rightSplit].objectIndex)
             
-            self.nodes[i].boundingBox = self.generateBoundingBox(firstIndex, lastIndex)
-            print('Bounding Box:', self.nodes[i].boundingBox.x.minValue, self.nodes[i].boundingBox.x.maxValue, self.nodes[i].boundingBox.y.minValue, self.nodes[i].boundingBox.y.maxValue, self.nodes[i].boundingBox.z.minValue, self.nodes[i].boundingBox.z.maxValue)
             self.nodes[i].leftChild = leftSplit 
             self.nodes[i].rightChild = rightSplit 
-    
-    @ti.func 
-    def convertChildIndex(self, childIndex):
-        '''
-        Take care of the case that the child is a node 
-        '''
-        isLeaf = False  
-        if childIndex >= self.numLeaves[None]:
-            isLeaf = True 
-            childIndex -= self.numLeaves[None]
-        return isLeaf, childIndex
 
     @ti.func 
-    def checkChild(self, isLeaf, childIndex, ray, rayHitRecord):
+    def linkParents(self):
         '''
-        Check if the child is hit and return the resulting hit record
+        Store every leaf's and node's parent so that the bounding boxes can be refit from the bottom up (the root's parent is -1)
         '''
-        boundingBox = self.boundingBoxes.boundingBox[childIndex]
-        if not isLeaf:
-            boundingBox = self.nodes.boundingBox[childIndex]
-        return boundingBox.hit(ray, initDefaultHitRecord(rayHitRecord.tInterval))
-    
+        for i in ti.ndrange(self.numLeaves[None]):
+            self.leaves[i].parent = -1
+        self.nodes[0].parent = -1
+        for i in ti.ndrange(self.numLeaves[None] - 1):
+            self.setParent(self.nodes[i].leftChild, i)
+            self.setParent(self.nodes[i].rightChild, i)
+
     @ti.func 
-    def sortWithBothChildrenHit(self, leftIsLeaf, rightIsLeaf, leftNodeIndex, rightNodeIndex, rayHitRecord, leftChildHitRecord, rightChildHitRecord):
-        '''
-        Sort with both children being hit by the ray. Adding rayHitRecord as a parameter is required for Taichi to not throw an error because it has to be defined before the if statements 
-        '''
-        isLeaf, nodeIndex = False, leftNodeIndex
-        if leftChildHitRecord.t() <= rightChildHitRecord.t():
-            rayHitRecord = copyHitRecord(leftChildHitRecord)
-            if leftIsLeaf: 
-                isLeaf = True 
+    def setParent(self, childIndex, parent):
+        isLeaf, index = self.convertChildIndex(childIndex)
+        if isLeaf:
+            self.leaves[index].parent = parent 
         else: 
-            rayHitRecord, nodeIndex = copyHitRecord(rightChildHitRecord), rightNodeIndex
-            if rightIsLeaf:
-                isLeaf = True 
-        return isLeaf, nodeIndex, rayHitRecord
+            self.nodes[index].parent = parent 
 
     @ti.func 
-    def walkTree(self, ray, rayHitRecord):
+    def childBoundingBox(self, childIndex):
+        isLeaf, index = self.convertChildIndex(childIndex)
+        boundingBox = self.leaves[index].boundingBox.returnCopy()
+        if not isLeaf:
+            boundingBox = self.nodes[index].boundingBox.returnCopy()
+        return boundingBox 
+
+    @ti.func 
+    def refitNodes(self):
         '''
-        Walk the tree to determine if the ray hit any bounding box
-        '''
-        nodeIndex, isLeaf = 0, False
-        while True: 
-            if nodeIndex == 0:
-                boundingBox = self.nodes[nodeIndex].boundingBox 
-                rayHitRecord = boundingBox.hit(ray, rayHitRecord)
-            if rayHitRecord.hitAnything: 
-                leftIsLeaf, leftChild = self.convertChildIndex(self.nodes[nodeIndex].leftChild)
-                rightIsLeaf, rightChild = self.convertChildIndex(self.nodes[nodeIndex].rightChild)
-
-                print(leftIsLeaf, rightIsLeaf, leftChild, rightChild)
-                leftChildHitRecord = self.checkChild(leftIsLeaf, leftChild, ray, rayHitRecord)
-                rightChildHitRecord = self.checkChild(rightIsLeaf, rightChild, ray, rayHitRecord)
-
-                if leftChildHitRecord.hitAnything and rightChildHitRecord.hitAnything: #If ray hits both children, sort by which tInterval is lesser 
-                    isLeaf, nodeIndex, rayHitRecord = self.sortWithBothChildrenHit(leftIsLeaf, rightIsLeaf, leftChild, rightChild, rayHitRecord, leftChildHitRecord, rightChildHitRecord)
-                    print(isLeaf, nodeIndex, leftChild)
-                elif leftChildHitRecord.hitAnything: 
-                    isLeaf, nodeIndex, rayHitRecord = leftIsLeaf, leftChild, leftChildHitRecord 
-                elif rightChildHitRecord.hitAnything:
-                    isLeaf, nodeIndex, rayHitRecord = rightIsLeaf, rightChild, rightChildHitRecord 
-                else: 
+        Recalculate every node's bounding box from its children in parallel. Every leaf walks up towards the root, and the first child to reach a node stops there so that the second one (which knows both children are done) calculates the node's bounding box and keeps going
+        '''
+        for i in ti.ndrange(self.numLeaves[None] - 1):
+            self.nodes[i].refitVisits = 0
+        for i in ti.ndrange(self.numLeaves[None]):
+            parent = self.leaves[i].parent 
+            while parent >= 0:
+                if ti.atomic_add(self.nodes[parent].refitVisits, 1) == 0:
                     break 
-                
-                if isLeaf: 
-                    break
-                    
-        return nodeIndex, rayHitRecord
+                boundingBox = self.childBoundingBox(self.nodes[parent].leftChild)
+                boundingBox.addBoundingBox(self.childBoundingBox(self.nodes[parent].rightChild))
+                self.nodes[parent].boundingBox = boundingBox 
+                parent = self.nodes[parent].parent 
 
-@ti.data_oriented 
-class World(BVHTree): 
-    '''
-    Sets the world scene for all hittable objects
-    '''
-    def __init__(self):
-        self.hittableList = []
-        self.divisor, self.centroidScale = ti.Vector.field(3, float, shape = ()), ti.Vector.field(3, float, shape = (2,))
-        self.numLeaves = ti.field(int, shape = ())
-        self.leaves = ti.Struct.field({
-            'objectIndex': int, 
-            'mortonCode': int, 
-            'boundingBox': aabb 
-        }, shape = (100,))
-        self.nodes = ti.Struct.field({
-            'boundingBox': aabb, 
-            'leftChild': int, 
-            'rightChild': int 
-        }, shape = (100,)) #Keep track of nodes in the tree through keeping track of their child ranges and children split (note that if child split is greater than)
-        
-    def addHittable(self, hittableObject): #type: ignore
+    @ti.kernel 
+    def buildNodes(self, sceneVersion: ti.template()): #type: ignore
+        self.generateNodes()
+        self.linkParents()
+        self.refitNodes()
+
+    @ti.kernel 
+    def linkSAHParents(self, sceneVersion: ti.template()): #type: ignore
+        self.linkParents()
+
+    @ti.kernel 
+    def refitBoundingBoxes(self, sceneVersion: ti.template()): #type: ignore
+        self.refitNodes()
+
+    def refit(self):
         '''
-        Add a hittable object and its classification 
+        Refit the nodes' bounding boxes around the leaves' bounding boxes without changing the structure of the tree (for when the objects move)
         '''
-        self.hittableList.append(hittableObject)
-        
-    @ti.func 
-    def initLeaves(self):
+        self.refitBoundingBoxes(self.sceneVersion)
+
+    def buildTree(self):
         '''
-        Fill the leaves field with the bounding boxes and object indicies for compiling the BVH Tree 
+        Build the tree over the leaves once their object indices and bounding boxes are filled in
         '''
+        if self.treeBuilder == SAH_BUILDER:
+            if self.sahBuilder is None or self.sahBuilder.capacity < self.leafCapacity:
+                self.sahBuilder = binnedSAHBuilder(self.leafCapacity)
+            self.sahBuilder.build(self.leaves, self.nodes, self.numLeaves[None])
+            self.linkSAHParents(self.sceneVersion)
+        else: 
+            self.encodeLeaves(self.sceneVersion)
+            self.sortLeaves()
+            self.buildNodes(self.sceneVersion)
+
+    @ti.kernel 
+    def calculateTreeDepth(self, sceneVersion: ti.template()) -> int: #type: ignore
+        self.treeDepthField[None] = 0
         for i in ti.ndrange(self.numLeaves[None]):
-            self.leaves[i].objectIndex = i 
-            self.leaves[i].boundingBox = self.hittableList[i].boundingBox
+            depth, parent = 0, self.leaves[i].parent 
+            while parent >= 0:
+                depth += 1
+                parent = self.nodes[parent].parent 
+            ti.atomic_max(self.treeDepthField[None], depth)
+        return self.treeDepthField[None]
 
-    @ti.func 
-    def compileMinAndMaxCentroid(self): #type: ignore
+    def checkTreeDepth(self):
         '''
-        Return the minimum and maximum values for all the centers of all the objects in order to rescale the centers to [0, 1]
+        Make sure that the traversal stack can hold the tree (a node at depth d is popped with at most d entries left on the stack and pushes two, so the stack needs one more entry than the depth). Raises a ValueError for deeper trees instead of letting rays miss the objects that don't fit, which can happen with heavily clustered objects
         '''
-        centroids = [self.hittableList[i].center for i in ti.static(range(len(self.hittableList)))]
-        self.centroidScale[0], self.centroidScale[1] = ti.min(*centroids), ti.max(*centroids)
+        depth = self.calculateTreeDepth(self.sceneVersion)
+        if depth >= BVH_STACK_SIZE:
+            raise ValueError(f'The BVH tree is {depth} levels deep but its traversal stack only holds {BVH_STACK_SIZE} entries')
+        return depth 
 
     @ti.func 
-    def initNumLeaves(self):
-        self.numLeaves[None] = len(self.hittableList)
+    def boxToArray(self, boundingBox, boxes: ti.template(), i): #type: ignore
+        for axis in ti.static(range(3)):
+            axisInterval = boundingBox.getIntervalWithIndex(axis)
+            boxes[i, 2 * axis], boxes[i, 2 * axis + 1] = axisInterval.minValue, axisInterval.maxValue
 
     @ti.func 
-    def compileTree(self):
+    def boxFromArray(self, boxes: ti.template(), i): #type: ignore
+        return aabb(interval(boxes[i, 0], boxes[i, 1]), interval(boxes[i, 2], boxes[i, 3]), interval(boxes[i, 4], boxes[i, 5]))
+
+    @ti.kernel 
+    def readTree(self, sceneVersion: ti.template(), leafIndices: ti.types.ndarray(dtype = ti.i32, ndim = 2), leafBoxes: ti.types.ndarray(dtype = ti.f32, ndim = 2), nodeIndices: ti.types.ndarray(dtype = ti.i32, ndim = 2), nodeBoxes: ti.types.ndarray(dtype = ti.f32, ndim = 2)): #type: ignore
+        for i in ti.ndrange(self.numLeaves[None]):
+            leafIndices[i, 0], leafIndices[i, 1], leafIndices[i, 2] = self.leaves[i].objectIndex, self.leaves[i].mortonCode, self.leaves[i].parent 
+            self.boxToArray(self.leaves[i].boundingBox, leafBoxes, i)
+        for i in ti.ndrange(self.numLeaves[None] - 1):
+            nodeIndices[i, 0], nodeIndices[i, 1], nodeIndices[i, 2] = self.nodes[i].leftChild, self.nodes[i].rightChild, self.nodes[i].parent 
+            self.boxToArray(self.nodes[i].boundingBox, nodeBoxes, i)
+
+    @ti.kernel 
+    def writeTree(self, sceneVersion: ti.template(), numLeaves: int, leafIndices: ti.types.ndarray(dtype = ti.i32, ndim = 2), leafBoxes: ti.types.ndarray(dtype = ti.f32, ndim = 2), nodeIndices: ti.types.ndarray(dtype = ti.i32, ndim = 2), nodeBoxes: ti.types.ndarray(dtype = ti.f32, ndim = 2)): #type: ignore
+        self.numLeaves[None] = numLeaves 
+        for i in ti.ndrange(numLeaves):
+            self.leaves[i].objectIndex, self.leaves[i].mortonCode, self.leaves[i].parent = leafIndices[i, 0], leafIndices[i, 1], leafIndices[i, 2]
+            self.leaves[i].boundingBox = self.boxFromArray(leafBoxes, i)
+        for i in ti.ndrange(numLeaves - 1):
+            self.nodes[i].leftChild, self.nodes[i].rightChild, self.nodes[i].parent = nodeIndices[i, 0], nodeIndices[i, 1], nodeIndices[i, 2]
+            self.nodes[i].boundingBox = self.boxFromArray(nodeBoxes, i)
+
+    def treeArrays(self):
+        '''
+        Copy the built tree out as structured arrays of leaves and nodes (TREE_ARRAY_DTYPE) in one kernel launch. A leaf's indices are its object index, Morton code, and parent, and a node's are its left child, right child, and parent
+        '''
+        numLeaves = self.numLeaves[None]
+        leafIndices, leafBoxes = np.zeros((numLeaves, 3), np.int32), np.zeros((numLeaves, 6), np.float32)
+        nodeIndices, nodeBoxes = np.zeros((max(numLeaves - 1, 1), 3), np.int32), np.zeros((max(numLeaves - 1, 1), 6), np.float32) #Kernels can't take empty arrays
+        self.readTree(self.sceneVersion, leafIndices, leafBoxes, nodeIndices, nodeBoxes)
+
+        leaves, nodes = np.empty(numLeaves, TREE_ARRAY_DTYPE), np.empty(numLeaves - 1, TREE_ARRAY_DTYPE)
+        leaves['indices'], leaves['boundingBox'] = leafIndices, leafBoxes 
+        nodes['indices'], nodes['boundingBox'] = nodeIndices[:numLeaves - 1], nodeBoxes[:numLeaves - 1]
+        return leaves, nodes 
+
+    def setTreeArrays(self, leaves, nodes):
+        '''
+        Copy a tree from treeArrays into the tree fields (reserving room for it first) in one kernel launch instead of building it
+        '''
+        numLeaves = len(leaves)
+        self.reserveLeaves(max(numLeaves, 1))
+        if len(nodes) == 0:
+            nodes = np.zeros(1, TREE_ARRAY_DTYPE)
+        self.writeTree(self.sceneVersion, numLeaves, *[np.ascontiguousarray(array[member]) for array in (leaves, nodes) for member in ('indices', 'boundingBox')])
+
+    @ti.kernel
+    def calculateSAHCost(self, sceneVersion: ti.template()) -> float: #type: ignore
+        cost, rootArea = 0.0, self.leaves[0].boundingBox.area()
+        if self.numLeaves[None] > 1:
+            rootArea = self.nodes[0].boundingBox.area()
+        for i in ti.ndrange(self.numLeaves[None] - 1):
+            cost += self.nodes[i].boundingBox.area()
+        for i in ti.ndrange(self.numLeaves[None]):
+            cost += self.leaves[i].boundingBox.area()
+        return cost / rootArea 
+
+    def sahCost(self):
         '''
-        Compile the BVH Tree for the world
+        Return the surface area heuristic cost of the tree: the expected number of box and object tests for a ray that hits the root, with every node and leaf weighted by the chance that the ray hits it (its area relative to the root's area)
         '''
-        self.initNumLeaves()
-        self.initLeaves()
-        self.compileMinAndMaxCentroid()
-        self.fillLeaves()
-        self.sortLeaves()
-        self.generateNodes()
+        return self.calculateSAHCost(self.sceneVersion)
     
-    @ti.func
-    def hitObjects(self, ray, rayHitRecord):
+    @ti.func 
+    def convertChildIndex(self, childIndex):
         '''
-        Iterate through the hittable objects list and check the smallest t that it intersects with to get the closest possible object
+        Take care of the case that the child is a node (children that are nodes are offset by the number of leaves)
         '''
-        for i in ti.ndrange(self.numLeaves[None]):
-            tempHitRecord = self.hittableList[i].hit(ray, initDefaultHitRecord(rayHitRecord.tInterval))
-            if tempHitRecord.hitAnything:
-                rayHitRecord = copyHitRecord(tempHitRecord)
-
-        return rayHitRecord
-
-camera = World()
-materialGround = lambertianMaterial(vec3(0.8, 0.8, 0.0))
-materialCenter = lambertianMaterial(vec3(0.1, 0.2, 0.5))
-materialLeft = dielectricMaterial(1.0 / 1.3)
-materialRight = reflectiveMaterial(vec3(0.8, 0.6, 0.2), 0.5)
-materialFront = reflectiveMaterial(vec3(0.8, 0.8, 0.8), 0.2)
-
-camera.addHittable(sphere3(vec3(0, 0, -1), 0.5, materialCenter))
-camera.addHittable(sphere3(vec3(0, -100.5, -1), 100, materialGround))
+        isLeaf = True  
+        if childIndex >= self.numLeaves[None]:
+            isLeaf = False 
+            childIndex -= self.numLeaves[None]
+        return isLeaf, childIndex
 
-@ti.kernel 
-def testCompile():
-    camera.compileTree()
+    @ti.func 
+    def treeLeafCount(self, treeIndex):
+        return self.numLeaves[None]
 
-start = time.perf_counter()
-testCompile()
-end = time.perf_counter()
-print('Compile 1', end - start)
+    @ti.func 
+    def treeChild(self, treeIndex, childIndex):
+        '''
+        Return whether the child is a leaf, its index in the leaf or node field, and its bounding box
+        '''
+        isLeaf, index = self.convertChildIndex(childIndex)
+        boundingBox = self.leaves.boundingBox[index]
+        if not isLeaf:
+            boundingBox = self.nodes.boundingBox[index]
+        return isLeaf, index, boundingBox 
 
-camera.addHittable(sphere3(vec3(-1, 0, -1), 0.5, materialLeft))
-camera.addHittable(sphere3(vec3(1, 0, -1), 0.5, materialRight))
-camera.addHittable(sphere3(vec3(0, 0, 0), 0.5, materialFront))
-start = time.perf_counter()
-testCompile()
-end = time.perf_counter()
-print('Compile 2', end - start)
+    @ti.func 
+    def treeNodeChildren(self, treeIndex, index):
+        return self.nodes[index].leftChild, self.nodes[index].rightChild
 
+    @ti.func 
+    def hitTreeLeaf(self, treeIndex, index, ray, rayHitRecord):
+        return self.hitLeaf(self.leaves[index].objectIndex, ray, rayHitRecord)
 
-@ti.kernel 
-def testTreeWalk():
-    nodeIndex, nodeHitRecord = camera.walkTree(ray3(vec3(0, 0, -2), vec3(0, 0, -1)), initDefaultHitRecord(interval(0.001, 1e10)))
-    print(nodeIndex)
+    @ti.func 
+    def walkTree(self, ray, rayHitRecord):
+        '''
+        Return the hit record for the closest object that the ray hits by walking the tree (and add the ray's traversal cost to the statistics when they're counted)
+        '''
+        rayHitRecord, cost = self.traverseTree(ray, rayHitRecord, self.countTraversal)
+        if ti.static(self.countTraversal):
+            self.traversalStatistics.addRay(cost)
+        return rayHitRecord
 
+    @ti.func 
+    def traverseTree(self, ray, rayHitRecord, countCost: ti.template()): #type: ignore
+        '''
+        Walk the tree to find the closest object that the ray hits (see traverseBVH)
+        '''
+        return traverseBVH(self, 0, ray, rayHitRecord, countCost)
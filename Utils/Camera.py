@@ -1,13 +1,21 @@
-from Vectors import *
-from Rays import *
-from Objects import *
-from World import *
-from Interval import *
-from Hittable import * 
-
+from .Vectors import *
+from .Rays import *
+from .Objects import *
+from .World import *
+from .Interval import *
+from .Hittable import * 
+from .Wavefront import *
+from .Denoiser import *
+from .Temporal import *
+from .Runtime import *
+
+import numpy as np 
+import time 
 import warnings
 warnings.filterwarnings("ignore") #Taichi throws warnings because list methods are used (and Taichi doesn't handle these but Python does). We want to ignore these warnings (the classes are specifically designed to allow taichi to work)
 
+ADAPTIVE_PASS_LIMIT = 8 #The most passes a pixel takes in one frame with adaptive sampling, so that a few noisy pixels don't hold up the frame
+
 def cameraKeyMovement(camera, window):
     '''
     Allow the camera to be moved using keys
@@ -41,6 +49,25 @@ def cameraMouseMovement(camera, window):
     camera.mousePositions.setMouseX(mouseX)
     camera.mousePositions.setMouseY(mouseY)
 
+class resolutionScaler:
+    '''
+    Pick the render scale for the interactive viewer from measured frame times. While the camera moves the scale is adjusted so that frames take about targetFrameTime seconds (the time to render grows with the number of pixels, so with the square of the scale), and while it's still the scene is rendered at full resolution
+    '''
+    def __init__(self, targetFrameTime: float, minScale = 0.25):
+        self.targetFrameTime, self.minScale, self.movingScale = targetFrameTime, minScale, 1.0
+
+    def renderScale(self, cameraMoving: bool):
+        return self.movingScale if cameraMoving else 1.0
+
+    def addFrameTime(self, frameTime: float):
+        '''
+        Adjust the scale used while moving given how long the last moving frame took to render at that scale
+        '''
+        if frameTime <= 0:
+            return 
+        idealScale = self.movingScale * (self.targetFrameTime / frameTime) ** 0.5
+        self.movingScale = min(max(0.5 * (self.movingScale + idealScale), self.minScale), 1.0) #Average with the last scale so that noisy timings don't make it jump around
+
 @ti.kernel
 def calculateImageHeight(imageWidth: int, aspectRatio: float) -> int:
     '''
@@ -244,13 +271,118 @@ class cameraRenderValues:
         viewportBottomLeftPos = movement.cameraPos() - intermediateValues.focalLength() * unitVectors.k() - (intermediateValues.viewportWidthVector() + intermediateValues.viewportHeightVector()) / 2
         self.pixelField[2] = viewportBottomLeftPos + (self.pixelDX() + self.pixelDY()) / 2
 
+@ti.data_oriented 
+class cameraAccumulation:
+    '''
+    Store the running linear-space sum of samples for every pixel so that a camera that doesn't move converges over multiple frames. The running mean and variance (Welford's algorithm) of each pixel's luminance over the passes is kept too, so adaptive sampling can tell which pixels have converged
+    '''
+    def __init__(self, imageWidth, imageHeight):
+        self.colorSumField, self.frameCountField = ti.Vector.field(3, float, shape = (imageWidth, imageHeight)), ti.field(int, shape = ())
+        self.passCountField, self.luminanceMeanField, self.luminanceM2Field = ti.field(int, shape = (imageWidth, imageHeight)), ti.field(float, shape = (imageWidth, imageHeight)), ti.field(float, shape = (imageWidth, imageHeight))
+        self.previousViewField = ti.Vector.field(3, float, shape = (5,)) #Camera position, look at, and the i, j, k unit vectors from the last time the camera was set
+
+    @ti.func 
+    def frameCount(self):
+        return self.frameCountField[None]
+
+    @ti.func 
+    def luminance(self, pixelColor):
+        return tm.dot(pixelColor, vec3(0.2126, 0.7152, 0.0722))
+
+    @ti.func 
+    def addSample(self, i, j, pixelColor):
+        '''
+        Add a pass's linear pixel color to the running sum and the luminance statistics, and return the average over every pass accumulated for the pixel
+        '''
+        self.colorSumField[i, j] += pixelColor 
+        self.passCountField[i, j] += 1
+        delta = self.luminance(pixelColor) - self.luminanceMeanField[i, j]
+        self.luminanceMeanField[i, j] += delta / self.passCountField[i, j]
+        self.luminanceM2Field[i, j] += delta * (self.luminance(pixelColor) - self.luminanceMeanField[i, j])
+        return self.colorSumField[i, j] / self.passCountField[i, j]
+
+    @ti.func 
+    def noiseRatio(self, i, j, threshold):
+        '''
+        Return the 95% confidence interval of the pixel's mean luminance divided by threshold times the mean (the pixel has converged once it's at most 1). The pixel needs at least 2 passes
+        '''
+        passCount = self.passCountField[i, j]
+        standardError = tm.sqrt(self.luminanceM2Field[i, j] / (passCount - 1) / passCount)
+        return 1.96 * standardError / (threshold * (self.luminanceMeanField[i, j] + 1e-3))
+
+    @ti.func 
+    def converged(self, i, j, threshold, minPasses):
+        '''
+        Check whether the 95% confidence interval of the pixel's mean luminance is narrower than threshold times the mean (after at least minPasses passes)
+        '''
+        isConverged = False 
+        if self.passCountField[i, j] >= ti.max(minPasses, 2):
+            isConverged = self.noiseRatio(i, j, threshold) <= 1
+        return isConverged 
+
+    @ti.func 
+    def remainingPasses(self, i, j, threshold, minPasses):
+        '''
+        Estimate how many more passes the pixel needs to converge (0 before minPasses passes, when there's no estimate yet). The confidence interval narrows with the square root of the number of passes
+        '''
+        passCount, remaining = self.passCountField[i, j], 0.0
+        if passCount >= ti.max(minPasses, 2):
+            remaining = passCount * ti.max(self.noiseRatio(i, j, threshold) ** 2 - 1, 0.0)
+        return remaining 
+
+    @ti.func 
+    def updateView(self, index, value):
+        '''
+        Store the value for part of the camera's view and return whether it changed since the last time it was stored
+        '''
+        changed = (self.previousViewField[index] != value).any()
+        self.previousViewField[index] = value 
+        return changed
+
+    @ti.kernel 
+    def reset(self):
+        '''
+        Throw away all of the accumulated samples
+        '''
+        self.frameCountField[None] = 0
+        for i, j in self.colorSumField:
+            self.colorSumField[i, j], self.passCountField[i, j], self.luminanceMeanField[i, j], self.luminanceM2Field[i, j] = vec3(0, 0, 0), 0, 0.0, 0.0
+
+@ti.data_oriented 
+class cameraPathStatistics:
+    '''
+    Count the paths traced by the camera and the rays along them to report the average path length
+    '''
+    def __init__(self):
+        self.pathCountField, self.rayCountField = ti.field(ti.i64, shape = ()), ti.field(ti.i64, shape = ())
+
+    @ti.func 
+    def addPath(self, pathLength):
+        self.pathCountField[None] += 1
+        self.rayCountField[None] += pathLength 
+
+    def averagePathLength(self):
+        '''
+        Return the average number of rays traced for each path since the statistics were reset
+        '''
+        return self.rayCountField[None] / max(self.pathCountField[None], 1)
+
+    def reset(self):
+        self.pathCountField.fill(0)
+        self.rayCountField.fill(0)
+
 @ti.data_oriented 
 class Camera(World): 
     '''
     Class for a camera with render capabilities. Add on the world list to the camera for ease of use (Taichi kernels don't accept classes as arguments)
     '''
-    def __init__(self, cameraPos: vec3, imageWidth: int, fov: float, lookAt: vec3, aspectRatio: float, tMin: float, tMax: float, samplesPerPixel: int, maxDepth: int, vectorUp = vec3(0, 1, 0), cameraSpeed = 0.1): #type: ignore
-        super().__init__()
+    def __init__(self, cameraPos: vec3, imageWidth: int, fov: float, lookAt: vec3, aspectRatio: float, tMin: float, tMax: float, samplesPerPixel: int, maxDepth: int, vectorUp = vec3(0, 1, 0), cameraSpeed = 0.1, treeBuilder = LBVH_BUILDER, renderer = MEGAKERNEL_RENDERER, rouletteDepth = 3, adaptiveThreshold = None, minPasses = 4, countTraversal = False, treeCache = None, lightSampling = True, denoise = False, temporal = False, sampler = SOBOL_SAMPLER, countPaths = False): #type: ignore
+        if renderer not in (MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER):
+            raise ValueError(f'Unknown renderer {renderer}')
+        if sampler not in SAMPLER_TYPES:
+            raise ValueError(f'Unknown sampler {sampler}')
+        super().__init__(treeBuilder = treeBuilder, countTraversal = countTraversal, treeCache = treeCache)
+        self.lightSampling, self.samplerType = lightSampling, SAMPLER_TYPES.index(sampler) #The sampler gives the random numbers for every sample of a pixel
         self.cameraSpeed, self.fov, self.vectorUp = cameraSpeed, fov, vectorUp
         self.createCameraMovement(cameraPos, lookAt)
         self.createCameraMousePositions()
@@ -259,8 +391,17 @@ class Camera(World):
         self.renderValues = cameraRenderValues()
 
         self.imageWidth, self.imageHeight = imageWidth, calculateImageHeight(imageWidth, aspectRatio)
-        self.tInterval, self.samplesPerPixel, self.maxDepth = interval(tMin, tMax), samplesPerPixel, maxDepth
-        self.pixelField = ti.Vector.field(3, float, shape = (self.imageWidth, self.imageHeight))
+        self.tInterval, self.samplesPerPixel, self.maxDepth, self.rouletteDepth = interval(tMin, tMax), samplesPerPixel, maxDepth, rouletteDepth #Paths are only ended by Russian roulette after rouletteDepth bounces
+        self.adaptiveSampling, self.adaptiveThreshold, self.minPasses = adaptiveThreshold is not None, adaptiveThreshold, minPasses #With an adaptive threshold, pixels stop being sampled once their confidence interval is narrower than the threshold times their mean, and the passes they would have taken go to the pixels that are still noisy
+        self.pixelPassesField, self.maxPixelPassesField = ti.field(int, shape = (self.imageWidth, self.imageHeight)), ti.field(int, shape = ()) #The number of passes every pixel takes in the current frame with adaptive sampling
+        self.pixelField, self.previewField = ti.Vector.field(3, float, shape = (self.imageWidth, self.imageHeight)), ti.Vector.field(3, float, shape = (self.imageWidth, self.imageHeight))
+        self.accumulation = cameraAccumulation(self.imageWidth, self.imageHeight)
+        self.pathStatistics, self.framesRendered = cameraPathStatistics(), 0
+        self.countPaths = countPaths or countTraversal #The path and ray counters are compiled out of the kernels unless countPaths (or countTraversal, which reports them along with its own counters) is set
+        self.costField, self.maxCostField = ti.field(int, shape = (self.imageWidth, self.imageHeight)), ti.field(int, shape = ())
+        self.wavefront = wavefrontRenderer(self.imageWidth, self.imageHeight) if renderer == WAVEFRONT_RENDERER else None 
+        self.denoiser = atrousDenoiser(self.imageWidth, self.imageHeight) if denoise else None #Filters the accumulated image into the pixel field after every full resolution frame
+        self.temporal = temporalReprojection(self.imageWidth, self.imageHeight) if temporal else None #Reprojects the accumulated samples when the view changes instead of throwing them away
 
         self.setCamera()
 
@@ -292,15 +433,12 @@ class Camera(World):
     def setMovementZ(self, value: int):
         self.movement.movementField[2] = value
 
-    @ti.kernel 
-    def calculateUnitVectors(self, isPostRotation: bool):
+    @ti.func 
+    def calculateUnitVectors(self, lookAt): #type: ignore
         '''
-        Calculate the camera's unit vectors pre and post rotation
+        Calculate the camera's unit vectors for it looking at lookAt (before or after the rotation from the mouse)
         '''
-        if isPostRotation: 
-            self.unitVectors.calculateK(self.movement, self.movement.lookAtPostRotation())
-        else: 
-            self.unitVectors.calculateK(self.movement, self.movement.lookAtPreRotation())
+        self.unitVectors.calculateK(self.movement, lookAt)
         self.unitVectors.calculateI(self.vectorUp)
         self.unitVectors.calculateJ()
 
@@ -327,7 +465,7 @@ class Camera(World):
         tanTheta = ti.tan(tm.radians(self.fov) / 2)
         return ti.abs(2 * tanTheta * self.intermediateValues.focalLength()) 
 
-    @ti.kernel 
+    @ti.func 
     def calculateRender(self):
         '''
         Calculate the render values necessary for the camera, including the intermediate ones necessary for the calculation.
@@ -339,60 +477,115 @@ class Camera(World):
         self.calculateRenderValues()
 
     @ti.kernel 
-    def moveCamera(self):
+    def updateCamera(self):
+        '''
+        Move the camera, rotate what it's looking at with the mouse, and calculate its unit vectors and render values in one launch
+        '''
         self.movement.moveCamera(self.cameraSpeed, self.unitVectors)
+        self.calculateUnitVectors(self.movement.lookAtPreRotation())
+        self.movement.calculateLookAt(self.unitVectors, self.mousePositions)
+        self.calculateUnitVectors(self.movement.lookAtPostRotation())
+        self.calculateRender()
 
     def setCamera(self): #type: ignore
         '''
-        Reset the camera's specific values that depend upon its position and what it's looking at
+        Reset the camera's specific values that depend upon its position and what it's looking at (reprojecting the accumulated samples to the new view with temporal reprojection). Returns whether the view changed
         '''
-        self.moveCamera()
-        self.calculateUnitVectors(False)
-        self.calculateLookAt()
-        self.calculateUnitVectors(True)
-        self.calculateRender()
+        self.updateCamera()
+        viewChanged = self.viewChanged()
+        if viewChanged and self.temporal is not None:
+            self.temporal.reproject(self)
+        elif viewChanged:
+            self.accumulation.reset()
+        return viewChanged 
 
     @ti.kernel 
-    def calculateLookAt(self):
-        self.movement.calculateLookAt(self.unitVectors, self.mousePositions)
+    def viewChanged(self) -> bool:
+        '''
+        Check whether the camera's position, what it's looking at, or its unit vectors changed since the last time the camera was set. Every value is updated (no short circuiting) so that the stored view is always the current one
+        '''
+        changed = self.accumulation.updateView(0, self.movement.cameraPos())
+        changed = self.accumulation.updateView(1, self.movement.lookAtPostRotation()) or changed
+        changed = self.accumulation.updateView(2, self.unitVectors.i()) or changed
+        changed = self.accumulation.updateView(3, self.unitVectors.j()) or changed
+        changed = self.accumulation.updateView(4, self.unitVectors.k()) or changed
+        return changed
 
     @ti.func 
-    def getRayColor(self, ray): 
+    def getRayColor(self, ray, stream): 
         '''
-        Get ray color with support for recursion for bouncing light off of objects. Taichi doesn't support return in if statements so I have to use separate solution. 
+        Get ray color with support for recursion for bouncing light off of objects. Taichi doesn't support return in if statements so I have to use separate solution. Every bounce takes its random numbers from its own dimensions of the sample stream
         '''
 
-        lightColor, throughput = vec3(0.0, 0.0, 0.0), vec3(1.0, 1.0, 1.0)
-        for _ in range(self.maxDepth):
-            rayHitRecord = self.hitObjects(ray, initDefaultHitRecord(self.tInterval))
+        lightColor, throughput, pathLength, scatterPdf = vec3(0.0, 0.0, 0.0), vec3(1.0, 1.0, 1.0), 0, 0.0 #The scatter density stays 0 for camera rays and rays scattered by materials without light sampling
+        for depth in range(self.maxDepth):
+            pathLength += 1
+            rayHitRecord, choice = self.hitObjects(ray, initDefaultHitRecord(self.tInterval)), stream.get2D(bounceDimension(depth, CHOICE_DIMENSION))
+            if rayHitRecord.hitAnything:
+                lightColor += throughput * self.emittedLight(rayHitRecord, ray.origin, scatterPdf)
+                rayHitRecord.didRayScatter, rayHitRecord.rayScatter, rayHitRecord.rayColor = self.scatter(rayHitRecord, stream.get2D(bounceDimension(depth, SCATTER_DIMENSION)), choice[0])
     
             if rayHitRecord.hitAnything and rayHitRecord.didRayScatter:
+                if depth + 1 < self.maxDepth: #Shadow rays count as a bounce, so paths don't get longer than maxDepth with light sampling
+                    lightColor += throughput * self.directLight(rayHitRecord, self.tInterval, stream.get2D(bounceDimension(depth, LIGHT_DIMENSION)))
+                scatterPdf = self.materials[rayHitRecord.materialIndex].scatterPdf(rayHitRecord, rayHitRecord.rayScatter.direction)
                 ray = rayHitRecord.rayScatter
-                throughput *= rayHitRecord.rayColor
+                survives, throughput = self.russianRoulette(depth, throughput * rayHitRecord.rayColor, choice[1])
+                if not survives:
+                    break
             elif rayHitRecord.hitAnything and not rayHitRecord.didRayScatter:
                 break
             else:
-                rayDirY = getY(tm.normalize(ray.direction))
-                a = 0.5 * (rayDirY + 1)
-                lightColor = (1 - a) * vec3(1, 1, 1) + a * vec3(0.5, 0.7, 1.0)
+                lightColor += throughput * self.skyColor(ray)
                 break
 
-        return lightColor * throughput
+        if ti.static(self.countPaths):
+            self.pathStatistics.addPath(pathLength)
+        return lightColor
+
+    @ti.func 
+    def russianRoulette(self, depth, throughput, u):
+        '''
+        Randomly end paths after rouletteDepth bounces (using the number u in [0, 1)) with a probability that grows as their throughput drops. Surviving paths are divided by their survival probability so that the image stays unbiased. Returns whether the path survives and its new throughput
+        '''
+        survives = True 
+        if depth + 1 >= self.rouletteDepth:
+            survivalProbability = ti.min(throughput.max(), 1.0)
+            survives = u < survivalProbability
+            if survives:
+                throughput /= survivalProbability
+        return survives, throughput
+
+    @ti.func 
+    def skyColor(self, ray):
+        '''
+        Return the color of the sky that a ray sees when it doesn't hit anything
+        '''
+        rayDirY = getY(tm.normalize(ray.direction))
+        a = 0.5 * (rayDirY + 1)
+        return (1 - a) * vec3(1, 1, 1) + a * vec3(0.5, 0.7, 1.0)
     
     @ti.func 
-    def samplePixel(self):
+    def samplePixel(self, u):
         '''
-        Returns a random vector with x and y ranging from [-0.5, 0.5] in order to get rays to sample random positions in the viewport for antialiasing
+        Returns the offset with x and y ranging from [-0.5, 0.5) for the point u in the unit square in order to get rays to sample different positions in the viewport for antialiasing
         '''
-        return vec3(ti.random() - 0.5, ti.random() - 0.5, 0)
+        return u - 0.5
 
     @ti.func 
-    def constructRay(self, i, j):
+    def pixelStream(self, i, j, sample):
         '''
-        Construct the ray from the camera to the viewport
+        Return the sample stream for the sample'th of the samplesPerPixel samples the pixel takes this pass. Samples are numbered across the pixel's passes, so each pass continues the pixel's sequence
         '''
-        pixelOffset = self.samplePixel()
-        rayDir = self.renderValues.initPixelPos() + (i + pixelOffset) * self.renderValues.pixelDX() + (j + pixelOffset) * self.renderValues.pixelDY() - self.movement.cameraPos()
+        return pixelSampleStream(self.samplerType, i, j, self.accumulation.passCountField[i, j] * self.samplesPerPixel + sample)
+
+    @ti.func 
+    def constructRay(self, i, j, u):
+        '''
+        Construct the ray from the camera to the viewport through the position in the pixel picked by the point u in the unit square
+        '''
+        pixelOffset = self.samplePixel(u)
+        rayDir = self.renderValues.initPixelPos() + (i + pixelOffset[0]) * self.renderValues.pixelDX() + (j + pixelOffset[1]) * self.renderValues.pixelDY() - self.movement.cameraPos()
         return ray3(self.movement.cameraPos(), rayDir)
     
     @ti.func 
@@ -405,18 +598,230 @@ class Camera(World):
     @ti.func 
     def antialiasing(self, i, j):
         '''
-        Implmement basic antialiasing for pixels
+        Implmement basic antialiasing for pixels. Returns the linear pixel color (gamma correction happens after accumulation)
         '''
         pixelColor = vec3(0, 0, 0)
-        for _ in ti.static(range(self.samplesPerPixel)):
-            pixelColor += self.getRayColor(self.constructRay(i, j))
-        return self.linearToGamma(pixelColor / self.samplesPerPixel)
+        for sample in range(self.samplesPerPixel): #A loop instead of unrolling every sample keeps the kernel small enough to compile quickly
+            stream = self.pixelStream(i, j, sample)
+            pixelColor += self.getRayColor(self.constructRay(i, j, stream.get2D(PIXEL_DIMENSION)), stream)
+        return pixelColor / self.samplesPerPixel
+
+    def linearImage(self):
+        '''
+        Return the accumulated linear (not gamma corrected) image as a NumPy array
+        '''
+        return self.accumulation.colorSumField.to_numpy() / np.maximum(self.accumulation.passCountField.to_numpy(), 1)[:, :, None]
+
+    def sampleCounts(self):
+        '''
+        Return the number of samples taken for every pixel as a NumPy array
+        '''
+        return self.accumulation.passCountField.to_numpy() * self.samplesPerPixel 
+    
+    def sampleHeatmap(self):
+        '''
+        Return an RGB image of the number of samples taken for every pixel going from blue (fewest) to red (most)
+        '''
+        sampleCounts = self.sampleCounts().astype(np.float32)
+        heat = (sampleCounts - sampleCounts.min()) / max(sampleCounts.max() - sampleCounts.min(), 1)
+        return np.stack([heat, 1 - np.abs(2 * heat - 1), 1 - heat], axis = -1)
+
+    def performanceCounters(self):
+        '''
+        Return the frames rendered since the counters were reset, along with the rays traced per frame and the bounces per path when the camera counts its paths and the box tests, object tests, and BVH nodes visited per ray when it counts its traversals
+        '''
+        counters = {'frames': self.framesRendered}
+        if self.countPaths:
+            counters.update({'raysPerFrame': int(self.pathStatistics.rayCountField[None]) / max(self.framesRendered, 1), 'bouncesPerPath': self.pathStatistics.averagePathLength()})
+        if self.countTraversal:
+            counters.update(self.traversalStatistics.perRay())
+        return counters 
+
+    def resetCounters(self):
+        self.framesRendered = 0
+        self.pathStatistics.reset()
+        self.traversalStatistics.reset()
+
+    def renderCostHeatmap(self):
+        '''
+        Debug render mode: write how many box and object tests every pixel's camera ray takes to find its closest hit into the pixel field as a heatmap going from blue (cheapest) to red (most expensive). Returns the most tests taken by a pixel
+        '''
+        self.updateScene()
+        self.calculateTraversalCosts(self.sceneVersion)
+        maxCost = self.maxCostField[None]
+        self.drawCostHeatmap(max(maxCost, 1))
+        return maxCost 
+
+    @ti.kernel 
+    def calculateTraversalCosts(self, sceneVersion: ti.template()): #type: ignore
+        self.maxCostField[None] = 0
+        for i, j in self.costField:
+            cost = self.traversalCost(self.constructRay(i, j, randomSample2D()), initDefaultHitRecord(self.tInterval))
+            self.costField[i, j] = cost[0] + cost[1]
+            ti.atomic_max(self.maxCostField[None], cost[0] + cost[1])
+
+    @ti.kernel 
+    def drawCostHeatmap(self, maxCost: int):
+        for i, j in self.costField:
+            heat = self.costField[i, j] / maxCost 
+            self.pixelField[i, j] = vec3(heat, 1 - ti.abs(2 * heat - 1), 1 - heat)
+
+    def warmUp(self, compilePreview = False):
+        '''
+        Build the scene and compile every kernel used to render a frame (and the preview kernels for a scaled down render if compilePreview is set) so that the first frame doesn't stop to compile them. The times are added to the startup report
+        '''
+        start = time.perf_counter()
+        self.updateScene()
+        self.setCamera()
+        ti.sync()
+        sceneTime = time.perf_counter()
+
+        for kernel in (self.setMovementX, self.setMovementY, self.setMovementZ, self.mousePositions.setMouseX, self.mousePositions.setMouseY):
+            compileKernel(kernel, 0)
+        if self.wavefront is None:
+            compileKernel(self.renderPixels, self.sceneVersion)
+        else: 
+            self.wavefront.compileKernels(self)
+            compileKernel(self.addSampleColors, self.wavefront.sampleColorField, 0)
+            if self.adaptiveSampling:
+                compileKernel(self.planPixelPasses)
+        if self.denoiser is not None:
+            self.denoiser.compileKernels(self)
+        if self.temporal is not None:
+            self.temporal.compileKernels(self)
+        if self.adaptiveSampling:
+            compileKernel(self.countActivePixels)
+        if compilePreview:
+            compileKernel(self.renderPreview, self.sceneVersion, 1, 1)
+            compileKernel(self.upscalePreview, 1, 1)
+        
+        startupTimes['scene'], startupTimes['compile'] = sceneTime - start, time.perf_counter() - sceneTime
+
+    def render(self, renderScale = 1.0):
+        '''
+        Render the camera's scene to a matrix that can be displayed. New samples are added to the accumulated samples of previous frames so that a still camera converges to a clean image. With a render scale below 1 a preview is rendered at that fraction of the resolution and upscaled to the display instead (without accumulating). With a denoiser the full resolution frames are denoised before they're displayed, and with temporal reprojection they keep the first hits the next view is reprojected from
+        '''
+        if self.updateScene(): #The accumulated samples are from an older scene
+            self.accumulation.reset()
+            if self.temporal is not None:
+                self.temporal.firstHitsValid = False 
+        self.framesRendered += 1
+        if renderScale < 1:
+            renderWidth, renderHeight = max(round(self.imageWidth * renderScale), 1), max(round(self.imageHeight * renderScale), 1)
+            self.renderPreview(self.sceneVersion, renderWidth, renderHeight)
+            self.upscalePreview(renderWidth, renderHeight)
+            self.accumulation.reset()
+        elif self.wavefront is None:
+            self.renderPixels(self.sceneVersion)
+        else: 
+            for passIndex in range(self.planPixelPasses() if self.adaptiveSampling else 1):
+                self.addSampleColors(self.wavefront.render(self, passIndex), passIndex)
+        if renderScale >= 1 and self.temporal is not None:
+            self.temporal.storeFirstHits(self)
+        if renderScale >= 1 and self.denoiser is not None:
+            self.denoiser.denoise(self)
+
+    @ti.kernel 
+    def renderPreview(self, sceneVersion: ti.template(), renderWidth: int, renderHeight: int): #type: ignore
+        '''
+        Render one sample for each pixel of a renderWidth x renderHeight image covering the same view into the corner of the preview field
+        '''
+        for i, j in ti.ndrange(renderWidth, renderHeight):
+            stream = randomStream() #Previews aren't accumulated, so they don't follow the pixels' sequences
+            self.previewField[i, j] = self.getRayColor(self.constructRay((i + 0.5) * self.imageWidth / renderWidth - 0.5, (j + 0.5) * self.imageHeight / renderHeight - 0.5, stream.get2D(PIXEL_DIMENSION)), stream)
+
+    @ti.kernel 
+    def upscalePreview(self, renderWidth: int, renderHeight: int):
+        '''
+        Bilinearly upscale the preview to every pixel of the display
+        '''
+        for i, j in self.pixelField:
+            x, y = ti.max((i + 0.5) * renderWidth / self.imageWidth - 0.5, 0.0), ti.max((j + 0.5) * renderHeight / self.imageHeight - 0.5, 0.0)
+            x0, y0 = ti.min(int(x), renderWidth - 1), ti.min(int(y), renderHeight - 1)
+            x1, y1 = ti.min(x0 + 1, renderWidth - 1), ti.min(y0 + 1, renderHeight - 1)
+            tx, ty = x - x0, y - y0
+            bottom = (1 - tx) * self.previewField[x0, y0] + tx * self.previewField[x1, y0]
+            top = (1 - tx) * self.previewField[x0, y1] + tx * self.previewField[x1, y1]
+            self.pixelField[i, j] = self.linearToGamma((1 - ty) * bottom + ty * top)
 
     @ti.kernel
-    def render(self): 
+    def renderPixels(self, sceneVersion: ti.template()): #type: ignore
+        if ti.static(self.adaptiveSampling):
+            self.planPasses()
+        for i, j in self.pixelField:
+            for _ in range(self.pixelPasses(i, j)):
+                self.pixelField[i, j] = self.linearToGamma(self.accumulation.addSample(i, j, self.antialiasing(i, j)))
+        self.accumulation.frameCountField[None] += 1
+
+    @ti.func 
+    def pixelActive(self, i, j):
+        '''
+        Check whether the pixel still needs samples (every pixel does unless adaptive sampling is on)
+        '''
+        isActive = True 
+        if ti.static(self.adaptiveSampling):
+            isActive = not self.accumulation.converged(i, j, self.adaptiveThreshold, self.minPasses)
+        return isActive 
+
+    @ti.func 
+    def planPasses(self):
+        '''
+        Give every pixel that still needs samples one pass, and share the passes that the converged pixels free up between them by how many more passes each one needs to converge. A pixel never takes more passes than it needs or than ADAPTIVE_PASS_LIMIT in a frame, so frames take at most the passes of sampling every pixel once
+        '''
+        numFreed, totalRemaining = 0, 0.0
+        self.maxPixelPassesField[None] = 0
+        for i, j in self.pixelPassesField:
+            if self.pixelActive(i, j):
+                totalRemaining += self.accumulation.remainingPasses(i, j, self.adaptiveThreshold, self.minPasses)
+            else:
+                numFreed += 1
+        for i, j in self.pixelPassesField:
+            passes = 0
+            if self.pixelActive(i, j):
+                remaining = self.accumulation.remainingPasses(i, j, self.adaptiveThreshold, self.minPasses)
+                extraPasses = 0
+                if totalRemaining > 0:
+                    extraPasses = ti.min(int(numFreed * remaining / totalRemaining), int(tm.ceil(remaining)), ADAPTIVE_PASS_LIMIT - 1)
+                passes = 1 + extraPasses
+            self.pixelPassesField[i, j] = passes 
+            ti.atomic_max(self.maxPixelPassesField[None], passes)
+
+    @ti.kernel 
+    def planPixelPasses(self) -> int:
+        '''
+        Plan the passes of every pixel for the frame (see planPasses) and return the most passes any pixel takes
+        '''
+        self.planPasses()
+        return self.maxPixelPassesField[None]
+
+    @ti.func 
+    def pixelPasses(self, i, j):
+        '''
+        Return the number of passes the pixel takes in the current frame (always 1 unless adaptive sampling is on)
+        '''
+        passes = 1
+        if ti.static(self.adaptiveSampling):
+            passes = self.pixelPassesField[i, j]
+        return passes 
+
+    @ti.kernel 
+    def countActivePixels(self) -> int:
+        '''
+        Return the number of pixels that still need samples
+        '''
+        numActive = 0
+        for i, j in self.pixelField:
+            if self.pixelActive(i, j):
+                numActive += 1
+        return numActive 
+
+    @ti.kernel 
+    def addSampleColors(self, sampleColors: ti.template(), passIndex: int): #type: ignore
         '''
-        Render the camera's scene to a matrix that can be displayed
+        Add the summed sample colors of the frame's passIndex'th pass from the wavefront renderer to the accumulated image
         '''
         for i, j in self.pixelField:
-            self.pixelField[i, j] = self.antialiasing(i, j)
-        
\ No newline at end of file
+            if passIndex < self.pixelPasses(i, j):
+                self.pixelField[i, j] = self.linearToGamma(self.accumulation.addSample(i, j, sampleColors[i, j] / self.samplesPerPixel))
+        if passIndex == 0: #Frames with adaptive sampling can take several passes
+            self.accumulation.frameCountField[None] += 1
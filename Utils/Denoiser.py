@@ -0,0 +1,138 @@
+from .Materials import *
+from .Runtime import *
+
+ATROUS_WEIGHTS, BLUR_WEIGHTS = (3 / 8, 1 / 4, 1 / 16), (1 / 2, 1 / 4) #The 5 tap B3 spline and a 3 tap Gaussian from the center out
+DARK_ALBEDO, TEMPORAL_VARIANCE_PASSES = 0.05, 4 #Albedo channels below DARK_ALBEDO aren't divided out of the lighting, and pixels with fewer than TEMPORAL_VARIANCE_PASSES passes estimate their variance from their neighbors
+
+@ti.data_oriented
+class atrousDenoiser:
+    '''
+    Edge-avoiding à-trous wavelet filter (Dammertz et al. 2010) for the camera's accumulated image, with the lighting weights scaled by each pixel's noise like SVGF (Schied et al. 2017). The camera's first hits give an albedo and a normal buffer (averaged over the frames like the image). The image is divided by the albedo so that only the lighting gets blurred, filtered numLevels times with a 5 x 5 kernel whose taps spread out by twice as many pixels every level, and multiplied by the albedo again. Taps are weighted down where the normal or albedo differ from the center pixel, or where the lighting differs by more than colorSigma standard deviations of the center pixel's noise, so edges stay sharp and converged pixels (which have no noise left) aren't blurred
+    '''
+    def __init__(self, imageWidth: int, imageHeight: int, numLevels = 5, colorSigma = 4.0, normalSigma = 0.3, albedoSigma = 0.1):
+        self.imageWidth, self.imageHeight, self.numLevels = imageWidth, imageHeight, numLevels
+        self.colorSigma, self.normalSigma, self.albedoSigma = colorSigma, normalSigma, albedoSigma
+        self.albedoField, self.normalField = ti.Vector.field(3, float, shape = (imageWidth, imageHeight)), ti.Vector.field(3, float, shape = (imageWidth, imageHeight))
+        self.lightingField, self.varianceField = ti.Vector.field(3, float, shape = (2, imageWidth, imageHeight)), ti.field(float, shape = (2, imageWidth, imageHeight)) #The filter reads one buffer and writes the other every level
+
+    @ti.kernel
+    def addFeatures(self, camera: ti.template(), sceneVersion: ti.template()): #type: ignore
+        '''
+        Trace samplesPerPixel camera rays through every pixel (at the same positions in the pixel as the samples of the pass that was just added) and add the average albedo and normal of what they hit to the running averages (the averages restart with the camera's accumulation), so pixels on the edge of an object get the same mix of features as of colors. Rays that miss give a white albedo and a zero normal
+        '''
+        frameWeight = 1.0 / ti.max(camera.accumulation.frameCount(), 1)
+        for i, j in self.albedoField:
+            albedoSum, normalSum = vec3(0.0, 0.0, 0.0), vec3(0.0, 0.0, 0.0)
+            for sample in range(camera.samplesPerPixel):
+                stream = camera.pixelStream(i, j, sample - camera.samplesPerPixel)
+                rayHitRecord = camera.hitObjects(camera.constructRay(i, j, stream.get2D(PIXEL_DIMENSION)), initDefaultHitRecord(camera.tInterval))
+                if rayHitRecord.hitAnything:
+                    albedoSum += camera.materials[rayHitRecord.materialIndex].albedo()
+                    normalSum += rayHitRecord.normalVector
+                else:
+                    albedoSum += vec3(1.0, 1.0, 1.0)
+            self.albedoField[i, j] += frameWeight * (albedoSum / camera.samplesPerPixel - self.albedoField[i, j])
+            self.normalField[i, j] += frameWeight * (normalSum / camera.samplesPerPixel - self.normalField[i, j])
+
+    @ti.func
+    def featureWeight(self, i, j, x, y):
+        '''
+        Weight for how alike the normals and albedos of two pixels are
+        '''
+        normalDistance, albedoDistance = self.normalField[i, j] - self.normalField[x, y], self.albedoField[i, j] - self.albedoField[x, y]
+        return tm.exp(-tm.dot(normalDistance, normalDistance) / self.normalSigma ** 2 - tm.dot(albedoDistance, albedoDistance) / self.albedoSigma ** 2)
+
+    @ti.func
+    def demodulationAlbedo(self, i, j):
+        '''
+        Return the pixel's albedo with dark channels replaced by 1. The lighting isn't divided by those channels since they'd blow up the noise of any light that reaches them (like sky seen through part of the pixel)
+        '''
+        albedo = self.albedoField[i, j]
+        return ti.select(albedo < DARK_ALBEDO, 1.0, albedo)
+
+    @ti.kernel
+    def demodulate(self, camera: ti.template()): #type: ignore
+        '''
+        Divide the camera's accumulated image by the albedo into the first lighting buffer, along with the variance of each pixel's mean luminance from its passes
+        '''
+        for i, j in self.albedoField:
+            passCount, albedo = camera.accumulation.passCountField[i, j], self.demodulationAlbedo(i, j)
+            self.lightingField[0, i, j] = camera.accumulation.colorSumField[i, j] / ti.max(passCount, 1) / albedo
+            self.varianceField[0, i, j] = camera.accumulation.luminanceM2Field[i, j] / ti.max((passCount - 1) * passCount, 1) / camera.accumulation.luminance(albedo) ** 2
+
+    @ti.kernel
+    def estimateVariance(self, camera: ti.template()): #type: ignore
+        '''
+        Replace the variance of pixels with too few passes for their own estimate with the luminance variance of their 3 x 3 neighborhood (weighted by how alike the neighbors are)
+        '''
+        for i, j in self.albedoField:
+            if camera.accumulation.passCountField[i, j] < TEMPORAL_VARIANCE_PASSES:
+                luminanceSum, luminanceSquaredSum, weightSum = 0.0, 0.0, 0.0
+                for dx, dy in ti.static(ti.ndrange((-1, 2), (-1, 2))):
+                    x, y = i + dx, j + dy
+                    if 0 <= x < self.imageWidth and 0 <= y < self.imageHeight:
+                        weight, luminance = self.featureWeight(i, j, x, y), camera.accumulation.luminance(self.lightingField[0, x, y])
+                        luminanceSum += weight * luminance
+                        luminanceSquaredSum += weight * luminance ** 2
+                        weightSum += weight
+                self.varianceField[1, i, j] = ti.max(luminanceSquaredSum / weightSum - (luminanceSum / weightSum) ** 2, 0.0)
+            else:
+                self.varianceField[1, i, j] = self.varianceField[0, i, j]
+        for i, j in self.albedoField:
+            self.varianceField[0, i, j] = self.varianceField[1, i, j]
+
+    @ti.kernel
+    def filterLevel(self, camera: ti.template(), source: int, stepWidth: int): #type: ignore
+        '''
+        Run one level of the filter from the source lighting and variance buffers into the other ones with the taps stepWidth pixels apart
+        '''
+        for i, j in self.albedoField:
+            blurredVariance = 0.0 #The center pixel's variance is blurred a little since one pixel's estimate is noisy
+            for dx, dy in ti.static(ti.ndrange((-1, 2), (-1, 2))):
+                x, y = ti.min(ti.max(i + dx, 0), self.imageWidth - 1), ti.min(ti.max(j + dy, 0), self.imageHeight - 1)
+                blurredVariance += BLUR_WEIGHTS[abs(dx)] * BLUR_WEIGHTS[abs(dy)] * self.varianceField[source, x, y]
+            centerLuminance, luminanceScale = camera.accumulation.luminance(self.lightingField[source, i, j]), self.colorSigma * tm.sqrt(blurredVariance) + 1e-6
+
+            lightingSum, varianceSum, weightSum = vec3(0.0, 0.0, 0.0), 0.0, 0.0
+            for dx, dy in ti.static(ti.ndrange((-2, 3), (-2, 3))):
+                x, y = i + dx * stepWidth, j + dy * stepWidth
+                if 0 <= x < self.imageWidth and 0 <= y < self.imageHeight:
+                    lighting = self.lightingField[source, x, y]
+                    weight = ATROUS_WEIGHTS[abs(dx)] * ATROUS_WEIGHTS[abs(dy)] * self.featureWeight(i, j, x, y) * tm.exp(-ti.abs(centerLuminance - camera.accumulation.luminance(lighting)) / luminanceScale)
+                    lightingSum += weight * lighting
+                    varianceSum += weight ** 2 * self.varianceField[source, x, y]
+                    weightSum += weight
+            self.lightingField[1 - source, i, j], self.varianceField[1 - source, i, j] = lightingSum / weightSum, varianceSum / weightSum ** 2 #The center tap always has a weight of 9 / 64
+
+    @ti.kernel
+    def remodulate(self, camera: ti.template(), source: int): #type: ignore
+        '''
+        Multiply the filtered lighting by the albedo again and display it
+        '''
+        for i, j in self.albedoField:
+            self.lightingField[source, i, j] *= self.demodulationAlbedo(i, j)
+            camera.pixelField[i, j] = camera.linearToGamma(self.lightingField[source, i, j])
+
+    def denoise(self, camera):
+        '''
+        Filter the camera's accumulated image into its pixel field and return the lighting buffer that holds the linear result
+        '''
+        self.addFeatures(camera, camera.sceneVersion)
+        self.demodulate(camera)
+        self.estimateVariance(camera)
+        source = 0
+        for level in range(self.numLevels):
+            self.filterLevel(camera, source, 2 ** level)
+            source = 1 - source
+        self.remodulate(camera, source)
+        return source
+
+    def compileKernels(self, camera):
+        '''
+        Compile every kernel used to denoise without running them
+        '''
+        compileKernel(self.addFeatures, camera, camera.sceneVersion)
+        compileKernel(self.demodulate, camera)
+        compileKernel(self.estimateVariance, camera)
+        compileKernel(self.filterLevel, camera, 0, 1)
+        compileKernel(self.remodulate, camera, 0)
@@ -1,19 +1,19 @@
-from Rays import *
-from Interval import *
+from .Rays import *
+from .Interval import *
 
 @ti.func
 def initDefaultHitRecord(tInterval):
     '''
     Initializes the default state of a hit record with maximal ray distance
     '''
-    return hitRecord(False, defaultVec(), defaultVec(), True, defaultVec(), defaultRay(), defaultVec(), tInterval, True)
+    return hitRecord(False, defaultVec(), defaultVec(), True, defaultVec(), defaultRay(), defaultVec(), tInterval, True, 0, -1)
 
 @ti.func 
 def copyHitRecord(record):
     '''
     Copies over the values of a hitRecord
     '''
-    return hitRecord(record.hitAnything, record.pointHit, record.initRayDir, record.didRayScatter, record.rayColor, record.rayScatter, record.normalVector, record.tInterval, record.frontFace)
+    return hitRecord(record.hitAnything, record.pointHit, record.initRayDir, record.didRayScatter, record.rayColor, record.rayScatter, record.normalVector, record.tInterval, record.frontFace, record.materialIndex, record.objectIndex)
 
 @ti.dataclass 
 class hitRecord: 
@@ -30,6 +30,8 @@ class hitRecord:
     normalVector: vec3 #type: ignore
     tInterval: interval #type: ignore
     frontFace: bool 
+    materialIndex: int 
+    objectIndex: int #The index of the object that was hit in the world (an instance's index for objects inside of instances)
 
     @ti.func
     def isFrontFace(self, ray):
@@ -0,0 +1,223 @@
+from .TreeCache import *
+
+class instanceGroup:
+    '''
+    Group of spheres and triangles that gets placed in the world any number of times with addInstances. The group's objects are stored and get their own BVH tree (the bottom level) once no matter how many instances there are. Material indices come from the world's addMaterial
+    '''
+    def __init__(self, world, groupIndex: int):
+        self.world, self.groupIndex = world, groupIndex
+        self.sphereChunks, self.meshChunks, self.builtGroup = [], [], None #The built group holds the joined objects and the group's tree arrays
+
+    def addSpheres(self, centers, radii, materialIndices):
+        self.sphereChunks.append(validateSpheres(self.world, centers, radii, materialIndices))
+        self.builtGroup = None
+
+    def addHittable(self, hittableObject): #type: ignore
+        self.addSpheres([hittableObject.center], [hittableObject.radius], [self.world.addMaterial(hittableObject.material)])
+
+    def addMesh(self, vertices, triangles, materialIndices):
+        self.meshChunks.append(validateMesh(self.world, vertices, triangles, materialIndices))
+        self.builtGroup = None
+
+def validateSpheres(world, centers, radii, materialIndices):
+    '''
+    Convert the arrays for spheres to add to a world to their types, making sure that they fit together and that the materials were added to the world
+    '''
+    centers = np.asarray(centers, dtype = np.float32).reshape(-1, 3)
+    radii = np.asarray(radii, dtype = np.float32).reshape(-1)
+    materialIndices = np.asarray(materialIndices, dtype = np.int32).reshape(-1)
+    if not (len(centers) == len(radii) == len(materialIndices)):
+        raise ValueError('Every sphere needs a center, a radius, and a material index')
+    if len(materialIndices) > 0 and not (0 <= materialIndices.min() and materialIndices.max() < len(world.materialList)):
+        raise ValueError('Material indices have to come from addMaterial')
+    return centers, radii, materialIndices
+
+def validateMesh(world, vertices, triangles, materialIndices):
+    '''
+    Convert the arrays for a mesh to add to a world to their types, making sure that the triangles index the vertices and that the materials were added to the world
+    '''
+    vertices = np.asarray(vertices, dtype = np.float32).reshape(-1, 3)
+    triangles = np.asarray(triangles, dtype = np.int32).reshape(-1, 3)
+    materialIndices = np.broadcast_to(np.asarray(materialIndices, dtype = np.int32), (len(triangles),))
+    if len(triangles) > 0 and not (0 <= triangles.min() and triangles.max() < len(vertices)):
+        raise ValueError('Triangles have to index the mesh\'s vertices')
+    if len(materialIndices) > 0 and not (0 <= materialIndices.min() and materialIndices.max() < len(world.materialList)):
+        raise ValueError('Material indices have to come from addMaterial')
+    return vertices, triangles, materialIndices
+
+def affineTransforms(transforms):
+    '''
+    Convert object to world transforms (4 x 4 matrices or their top 3 x 4 rows) to the world to object transforms that rays are moved into the groups with, as 3 x 4 matrices
+    '''
+    transforms = np.asarray(transforms, dtype = np.float64)
+    if transforms.shape[-2:] not in ((3, 4), (4, 4)):
+        raise ValueError('Instance transforms have to be 4 x 4 or 3 x 4 affine matrices')
+    transforms = transforms.reshape(-1, *transforms.shape[-2:])[:, :3]
+    linear = transforms[:, :, :3]
+    if (np.abs(np.linalg.det(linear)) < 1e-12).any():
+        raise ValueError('Instance transforms have to be invertible')
+    inverseLinear = np.linalg.inv(linear)
+    return np.concatenate([inverseLinear, -inverseLinear @ transforms[:, :, 3:]], axis = 2).astype(np.float32)
+
+def transformBoundingBoxes(boxes, objectToWorld):
+    '''
+    Return the world bounding boxes (n x 6 as x, y, and z intervals) around group bounding boxes moved by object to world transforms (n x 3 x 4)
+    '''
+    corners = np.stack(np.meshgrid([0, 1], [2, 3], [4, 5], indexing = 'ij'), axis = -1).reshape(8, 3)
+    points = boxes[:, corners] #n x 8 corners x 3 coordinates
+    points = np.einsum('nij,nkj->nki', objectToWorld[:, :, :3], points) + objectToWorld[:, None, :, 3]
+    return np.stack([points.min(axis = 1), points.max(axis = 1)], axis = -1).reshape(-1, 6).astype(np.float32)
+
+@ti.data_oriented
+class instanceStorage:
+    '''
+    Fields for the groups (their objects and bottom level trees, concatenated with an offset per group) and the instances that place them in the world. Rays that reach an instance in the world's tree (the top level) are moved into the group's space with the instance's world to object transform and walk the group's tree, so memory grows with the unique groups instead of the number of copies
+    '''
+    def __init__(self):
+        self.firstInstanceField = ti.field(int, shape = ()) #Objects in the world's tree with an index from this one are instances
+        self.groupCapacities, self.groupFields = None, None
+        self.instanceCapacity, self.instanceFields = 0, None
+
+    def reserveGroups(self, capacities):
+        '''
+        Make sure that the group fields have room for the given number of groups, spheres, vertices, triangles, leaves, and nodes, reallocating them with at least double the capacity if they don't. Return whether they were reallocated
+        '''
+        if self.groupCapacities is not None and all(count <= capacity for count, capacity in zip(capacities, self.groupCapacities)):
+            return False
+        self.groupCapacities = capacities if self.groupCapacities is None else tuple(max(count, 2 * capacity) for count, capacity in zip(capacities, self.groupCapacities))
+        if self.groupFields is not None:
+            self.groupFields.destroy()
+
+        self.groups = ti.Struct.field({'leafOffset': int, 'nodeOffset': int, 'numLeaves': int, 'sphereOffset': int, 'numSpheres': int, 'triangleOffset': int})
+        self.groupSpheres = ti.Struct.field({'center': vec3, 'radius': float, 'materialIndex': int})
+        self.groupVertices = ti.Vector.field(3, float)
+        self.groupTriangles = ti.Struct.field({'vertexIndices': ti.types.vector(3, int), 'materialIndex': int})
+        self.groupLeaves = ti.Struct.field({'objectIndex': int, 'boundingBox': aabb})
+        self.groupNodes = ti.Struct.field({'boundingBox': aabb, 'leftChild': int, 'rightChild': int})
+
+        fieldsBuilder = ti.FieldsBuilder()
+        for field, capacity in zip((self.groups, self.groupSpheres, self.groupVertices, self.groupTriangles, self.groupLeaves, self.groupNodes), self.groupCapacities):
+            fieldsBuilder.dense(ti.i, capacity).place(field)
+        self.groupFields = fieldsBuilder.finalize()
+        return True
+
+    def reserveInstances(self, numInstances: int):
+        '''
+        Make sure that the instance fields have room for numInstances instances like reserveGroups
+        '''
+        if numInstances <= self.instanceCapacity:
+            return False
+        self.instanceCapacity = max(numInstances, 2 * self.instanceCapacity)
+        if self.instanceFields is not None:
+            self.instanceFields.destroy()
+
+        self.instances = ti.Struct.field({'groupIndex': int, 'linear': ti.types.matrix(3, 3, float), 'offset': vec3, 'boundingBox': aabb}) #The world to object transform is the linear part and then the offset
+        fieldsBuilder = ti.FieldsBuilder()
+        for member in (self.instances.groupIndex, self.instances.linear, self.instances.offset, self.instances.boundingBox):
+            fieldsBuilder.dense(ti.i, self.instanceCapacity).place(member)
+        self.instanceFields = fieldsBuilder.finalize()
+        return True
+
+    def uploadGroups(self, builtGroups):
+        '''
+        Copy the built groups (from World.buildGroup) into the group fields at once and return whether the fields were reallocated
+        '''
+        counts = lambda index: np.array([len(builtGroup[index]) for builtGroup in builtGroups], dtype = np.int32)
+        offsets = lambda counts: np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int32)
+        numSpheres, numVertices, numTriangles, numLeaves, numNodes = counts(1), counts(3), counts(4), counts(6), counts(7)
+        reallocated = self.reserveGroups(tuple(max(int(count), 1) for count in (len(builtGroups), numSpheres.sum(), numVertices.sum(), numTriangles.sum(), numLeaves.sum(), numNodes.sum())))
+
+        join = lambda index, emptyShape, dtype: np.concatenate([np.zeros(emptyShape, dtype)] + [builtGroup[index] for builtGroup in builtGroups])
+        pad = lambda values, capacity: np.pad(values, ((0, capacity - len(values)),) + ((0, 0),) * (values.ndim - 1))
+        numGroupsCapacity, sphereCapacity, vertexCapacity, triangleCapacity, leafCapacity, nodeCapacity = self.groupCapacities
+        self.groups.from_numpy({name: pad(values, numGroupsCapacity) for name, values in {'leafOffset': offsets(numLeaves), 'nodeOffset': offsets(numNodes), 'numLeaves': numLeaves, 'sphereOffset': offsets(numSpheres), 'numSpheres': numSpheres, 'triangleOffset': offsets(numTriangles)}.items()})
+        self.groupSpheres.from_numpy({'center': pad(join(0, (0, 3), np.float32), sphereCapacity), 'radius': pad(join(1, 0, np.float32), sphereCapacity), 'materialIndex': pad(join(2, 0, np.int32), sphereCapacity)})
+        self.groupVertices.from_numpy(pad(join(3, (0, 3), np.float32), vertexCapacity))
+        triangles = np.concatenate([np.zeros((0, 3), np.int32)] + [builtGroup[4] + offset for builtGroup, offset in zip(builtGroups, offsets(numVertices))])
+        self.groupTriangles.from_numpy({'vertexIndices': pad(triangles, triangleCapacity), 'materialIndex': pad(join(5, 0, np.int32), triangleCapacity)})
+
+        leaves, nodes = join(6, 0, TREE_ARRAY_DTYPE), join(7, 0, TREE_ARRAY_DTYPE)
+        self.groupLeaves.from_numpy({'objectIndex': pad(leaves['indices'][:, 0], leafCapacity), 'boundingBox': boxMembers(pad(leaves['boundingBox'], leafCapacity))})
+        self.groupNodes.from_numpy({'boundingBox': boxMembers(pad(nodes['boundingBox'], nodeCapacity)), 'leftChild': pad(nodes['indices'][:, 0], nodeCapacity), 'rightChild': pad(nodes['indices'][:, 1], nodeCapacity)})
+        return reallocated
+
+    def uploadInstances(self, firstInstance: int, groupIndices, worldToObject, boundingBoxes):
+        '''
+        Copy the instances into the instance fields at once and return whether the fields were reallocated
+        '''
+        reallocated = self.reserveInstances(max(len(groupIndices), 1))
+        pad = lambda values: np.pad(values, ((0, self.instanceCapacity - len(values)),) + ((0, 0),) * (values.ndim - 1))
+        self.instances.from_numpy({'groupIndex': pad(groupIndices), 'linear': pad(worldToObject[:, :, :3]), 'offset': pad(worldToObject[:, :, 3]), 'boundingBox': boxMembers(pad(boundingBoxes))})
+        self.firstInstanceField[None] = firstInstance
+        return reallocated
+
+    @ti.func
+    def treeLeafCount(self, groupIndex):
+        return self.groups[groupIndex].numLeaves
+
+    @ti.func
+    def treeChild(self, groupIndex, childIndex):
+        '''
+        Return whether a child in a group's tree is a leaf, its index in the group fields, and its bounding box (children that are nodes are offset by the group's number of leaves like in the world's tree)
+        '''
+        numLeaves = self.groups[groupIndex].numLeaves
+        isLeaf, index = childIndex < numLeaves, self.groups[groupIndex].leafOffset + childIndex
+        boundingBox = self.groupLeaves[index].boundingBox.returnCopy()
+        if not isLeaf:
+            index = self.groups[groupIndex].nodeOffset + childIndex - numLeaves
+            boundingBox = self.groupNodes[index].boundingBox.returnCopy()
+        return isLeaf, index, boundingBox
+
+    @ti.func
+    def hitGroupObject(self, groupIndex, objectIndex, ray, rayHitRecord):
+        '''
+        Check whether the ray hits an object of a group (spheres come before triangles) before the closest hit so far
+        '''
+        tempHitRecord, materialIndex, numSpheres = initDefaultHitRecord(rayHitRecord.tInterval), 0, self.groups[groupIndex].numSpheres
+        if objectIndex < numSpheres:
+            sphere = self.groupSpheres[self.groups[groupIndex].sphereOffset + objectIndex]
+            tempHitRecord = hitSphere(sphere.center, sphere.radius, ray, tempHitRecord)
+            materialIndex = sphere.materialIndex
+        else:
+            triangle = self.groupTriangles[self.groups[groupIndex].triangleOffset + objectIndex - numSpheres]
+            tempHitRecord = hitTriangle(self.groupVertices[triangle.vertexIndices[0]], self.groupVertices[triangle.vertexIndices[1]], self.groupVertices[triangle.vertexIndices[2]], ray, tempHitRecord)
+            materialIndex = triangle.materialIndex
+        if tempHitRecord.hitAnything:
+            rayHitRecord = copyHitRecord(tempHitRecord)
+            rayHitRecord.materialIndex = materialIndex
+        return rayHitRecord
+
+    @ti.func
+    def treeNodeChildren(self, groupIndex, index):
+        return self.groupNodes[index].leftChild, self.groupNodes[index].rightChild
+
+    @ti.func
+    def hitTreeLeaf(self, groupIndex, index, ray, rayHitRecord):
+        return self.hitGroupObject(groupIndex, self.groupLeaves[index].objectIndex, ray, rayHitRecord)
+
+    @ti.func
+    def traverseGroup(self, groupIndex, ray, rayHitRecord):
+        '''
+        Walk a group's tree to find the closest object of the group that the ray hits (with the same walk as the world's tree)
+        '''
+        return traverseBVH(self, groupIndex, ray, rayHitRecord, False)[0]
+
+    @ti.func
+    def hitInstance(self, instanceIndex, ray, rayHitRecord):
+        '''
+        Check whether the ray hits the instance's group before the closest hit so far. The ray's direction isn't normalized after being moved into the group's space, so distances along it stay the same in both spaces. The hit point and normal are moved back into the world (normals with the transpose of the world to object transform)
+        '''
+        linear, offset = self.instances[instanceIndex].linear, self.instances[instanceIndex].offset
+        objectRay = ray3(linear @ ray.origin + offset, linear @ ray.direction)
+        tempHitRecord = self.traverseGroup(self.instances[instanceIndex].groupIndex, objectRay, initDefaultHitRecord(rayHitRecord.tInterval))
+        if tempHitRecord.hitAnything:
+            rayHitRecord = copyHitRecord(tempHitRecord)
+            rayHitRecord.pointHit, rayHitRecord.initRayDir = ray.pointOnRay(tempHitRecord.t()), ray.direction
+            rayHitRecord.normalVector = tm.normalize(linear.transpose() @ tempHitRecord.normalVector) #The normal already points against the ray, and moving both into the world keeps the sign of their dot product
+        return rayHitRecord
+
+def boxMembers(boxes):
+    '''
+    Convert bounding boxes stored as n x 6 arrays (x, y, and z intervals) to the members of an aabb field for from_numpy
+    '''
+    return {axis: {'minValue': boxes[:, 2 * i], 'maxValue': boxes[:, 2 * i + 1]} for i, axis in enumerate('xyz')}
@@ -0,0 +1,105 @@
+from .Objects import *
+
+@ti.func
+def powerHeuristic(pdf, otherPdf):
+    '''
+    Return the multiple importance sampling weight of a sample taken with pdf when otherPdf could also have taken it
+    '''
+    return pdf ** 2 / ti.max(pdf ** 2 + otherPdf ** 2, 1e-20)
+
+@ti.func
+def sphereSolidAngle(center, radius, point):
+    '''
+    Return the solid angle of the cone that a sphere covers as seen from a point outside of it (as 1 - cos of the cone's half angle) along with the direction and distance to the sphere's center. The solid angle is 0 for points inside of the sphere
+    '''
+    toCenter = center - point
+    distance = tm.length(toCenter)
+    sinSquared = (radius / ti.max(distance, 1e-20)) ** 2
+    oneMinusCos = 0.0
+    if sinSquared < 1:
+        oneMinusCos = sinSquared / (1 + tm.sqrt(1 - sinSquared)) #Written without 1 - cos so that far away small spheres don't lose all of their precision
+    return oneMinusCos, toCenter / ti.max(distance, 1e-20)
+
+@ti.func
+def sphereLightPdf(center, radius, point):
+    '''
+    Return the solid angle density of sampleSphereLight's directions from the point
+    '''
+    oneMinusCos, _ = sphereSolidAngle(center, radius, point)
+    pdf = 0.0
+    if oneMinusCos > 0:
+        pdf = 1 / (2 * tm.pi * oneMinusCos)
+    return pdf
+
+@ti.func
+def sampleSphereLight(center, radius, point, u):
+    '''
+    Map the point u in the unit square to a direction uniformly inside of the cone of directions from the point that hit the sphere. Returns the direction and its solid angle density (0 when the point is inside of the sphere)
+    '''
+    oneMinusCos, w = sphereSolidAngle(center, radius, point)
+    direction, pdf = w, 0.0
+    if oneMinusCos > 0:
+        tangent, bitangent = orthonormalBasis(w)
+        cosTheta = 1 - u[0] * oneMinusCos
+        sinTheta, phi = tm.sqrt(ti.max(1 - cosTheta ** 2, 0.0)), 2 * tm.pi * u[1]
+        direction = cosTheta * w + sinTheta * (tm.cos(phi) * tangent + tm.sin(phi) * bitangent)
+        pdf = 1 / (2 * tm.pi * oneMinusCos)
+    return direction, pdf
+
+@ti.func
+def triangleLightPdf(vertex0, vertex1, vertex2, point, lightPoint):
+    '''
+    Return the solid angle density of sampleTriangleLight picking the direction from the point to the light point on the triangle
+    '''
+    normal = tm.cross(vertex1 - vertex0, vertex2 - vertex0)
+    area, toLight = 0.5 * tm.length(normal), lightPoint - point
+    distanceSquared = tm.dot(toLight, toLight)
+    cosLight = ti.abs(tm.dot(normal, toLight)) / ti.max(2 * area * tm.sqrt(distanceSquared), 1e-20)
+    pdf = 0.0
+    if cosLight > 0:
+        pdf = distanceSquared / (cosLight * area)
+    return pdf
+
+@ti.func
+def sampleTriangleLight(vertex0, vertex1, vertex2, point, u):
+    '''
+    Map the point u in the unit square to a point uniformly on the triangle's area and return the direction to it from the point with its solid angle density (triangles emit from both sides)
+    '''
+    a, b = u[0], u[1]
+    if a + b > 1: #Fold the square onto the triangle
+        a, b = 1 - a, 1 - b
+    lightPoint = vertex0 + a * (vertex1 - vertex0) + b * (vertex2 - vertex0)
+    return lightPoint - point, triangleLightPdf(vertex0, vertex1, vertex2, point, lightPoint)
+
+@ti.data_oriented
+class lightList:
+    '''
+    Field with the object index of every sphere and triangle that has an emissive material, built when the scene is updated. Lights are picked uniformly to send shadow rays towards them (emissive objects inside of instances aren't in the list, so they're only found by rays that hit them)
+    '''
+    def __init__(self):
+        self.numLightsField, self.lightCapacity, self.lightFields = ti.field(int, shape = ()), 0, None
+
+    def reserveLights(self, numLights: int):
+        '''
+        Make sure that the light field has room for numLights lights, reallocating it with at least double the capacity if it doesn't. Returns whether it was reallocated
+        '''
+        if numLights <= self.lightCapacity:
+            return False
+        self.lightCapacity = max(numLights, 2 * self.lightCapacity)
+        if self.lightFields is not None:
+            self.lightFields.destroy()
+
+        self.lights = ti.field(int)
+        fieldsBuilder = ti.FieldsBuilder()
+        fieldsBuilder.dense(ti.i, self.lightCapacity).place(self.lights)
+        self.lightFields = fieldsBuilder.finalize()
+        return True
+
+    def uploadLights(self, objectIndices):
+        '''
+        Copy the object indices of the lights into the light field and return whether it was reallocated
+        '''
+        reallocated = self.reserveLights(max(len(objectIndices), 1))
+        self.numLightsField[None] = len(objectIndices)
+        self.lights.from_numpy(np.pad(np.asarray(objectIndices, np.int32), (0, self.lightCapacity - len(objectIndices))))
+        return reallocated
@@ -1,5 +1,7 @@
-from Rays import *
-from Hittable import *
+from .Rays import *
+from .Hittable import *
+from .Samplers import *
+import numpy as np 
 
 @ti.dataclass 
 class lambertianMaterial:
@@ -9,15 +11,11 @@ class lambertianMaterial:
     color: vec3 #type: ignore
 
     @ti.func 
-    def scatter(self, rayHitRecord):
+    def scatter(self, rayHitRecord, u, uChoice):
         '''
-        Scatter rays with a lambertian material 
+        Scatter rays with a lambertian material (cosine weighted around the normal, using the point u in the unit square)
         '''
-        scatteredRay = ray3(rayHitRecord.pointHit, rayHitRecord.normalVector + randomVectorOnUnitSphere())
-
-        if nearZero(scatteredRay.direction): #Deal with the possibility of returning a 0 direction vector scattering
-            scatteredRay.direction = rayHitRecord.normalVector
-
+        scatteredRay = ray3(rayHitRecord.pointHit, cosineHemisphere(rayHitRecord.normalVector, u))
         return True, scatteredRay, self.color
     
 @ti.dataclass 
@@ -29,12 +27,12 @@ class reflectiveMaterial:
     fuzz: float #type: ignore
 
     @ti.func 
-    def scatter(self, rayHitRecord):
+    def scatter(self, rayHitRecord, u, uChoice):
         '''
-        Scatter rays with a reflective material
+        Scatter rays with a reflective material (u picks the direction of the fuzz)
         '''
         reflectDir = reflect(rayHitRecord.initRayDir, rayHitRecord.normalVector)
-        reflectDir = tm.normalize(reflectDir) + self.fuzz * randomVectorOnUnitSphere()
+        reflectDir = tm.normalize(reflectDir) + self.fuzz * uniformSphere(u)
         scatteredRay = ray3(rayHitRecord.pointHit, reflectDir)
         return tm.dot(reflectDir, rayHitRecord.normalVector) > 0, scatteredRay, self.color
     
@@ -46,9 +44,9 @@ class dielectricMaterial:
     refractionIndex: float #type: ignore
 
     @ti.func 
-    def scatter(self, rayHitRecord):
+    def scatter(self, rayHitRecord, u, uChoice):
         '''
-        Scatter rays with a dielectric material
+        Scatter rays with a dielectric material (uChoice in [0, 1) picks between reflection and refraction)
         '''
         etaRatio = self.refractionIndex
         if rayHitRecord.frontFace:
@@ -59,7 +57,7 @@ class dielectricMaterial:
         sinTheta = tm.sqrt(1 - cosTheta ** 2)
         
         rayDir = defaultVec()
-        if etaRatio * sinTheta > 1.0 or self.reflectance(cosTheta, etaRatio) > ti.random(): #Dealing with Total Internal Reflection
+        if etaRatio * sinTheta > 1.0 or self.reflectance(cosTheta, etaRatio) > uChoice: #Dealing with Total Internal Reflection
             rayDir = reflect(unitDirection, rayHitRecord.normalVector)
         else:
             rayDir = refract(unitDirection, rayHitRecord.normalVector, etaRatio, cosTheta)
@@ -76,3 +74,97 @@ class dielectricMaterial:
         r0 = r0 ** 2
         return r0 + (1 - r0) * (1 - cosTheta) ** 5
 
+@ti.dataclass 
+class emissiveMaterial:
+    '''
+    Class for materials that give off light (color is the emitted radiance, so it can go above 1 for bright lights). They don't scatter rays
+    '''
+    color: vec3 #type: ignore
+
+    @ti.func 
+    def scatter(self, rayHitRecord, u, uChoice):
+        '''
+        Emissive materials absorb every ray that hits them
+        '''
+        return False, defaultRay(), defaultVec()
+
+LAMBERTIAN, REFLECTIVE, DIELECTRIC, EMISSIVE = 0, 1, 2, 3
+MATERIAL_TYPES = (lambertianMaterial, reflectiveMaterial, dielectricMaterial, emissiveMaterial) #The position of each material class is its type tag
+
+@ti.dataclass 
+class materialProperties:
+    '''
+    Class for one entry of the world's material table. It holds the parameters for every type of material along with a type tag, so one branch on the tag picks how rays scatter (instead of compiling every material into the kernels)
+    '''
+    materialType: int 
+    color: vec3 #type: ignore
+    fuzz: float 
+    refractionIndex: float 
+
+    @ti.func 
+    def scatter(self, rayHitRecord, u, uChoice):
+        '''
+        Scatter rays with the material given by the type tag. u is a point in the unit square for the direction and uChoice is a number in [0, 1) for the material's random choices
+        '''
+        didRayScatter, rayScatter, rayColor = False, defaultRay(), defaultVec()
+        if self.materialType == LAMBERTIAN:
+            didRayScatter, rayScatter, rayColor = lambertianMaterial(self.color).scatter(rayHitRecord, u, uChoice)
+        elif self.materialType == REFLECTIVE:
+            didRayScatter, rayScatter, rayColor = reflectiveMaterial(self.color, self.fuzz).scatter(rayHitRecord, u, uChoice)
+        elif self.materialType == DIELECTRIC:
+            didRayScatter, rayScatter, rayColor = dielectricMaterial(self.refractionIndex).scatter(rayHitRecord, u, uChoice)
+        return didRayScatter, rayScatter, rayColor
+
+    @ti.func 
+    def emitted(self):
+        '''
+        Return the light that the material gives off
+        '''
+        emittedLight = vec3(0.0, 0.0, 0.0)
+        if self.materialType == EMISSIVE:
+            emittedLight = self.color 
+        return emittedLight 
+
+    @ti.func 
+    def albedo(self):
+        '''
+        Return the color that the material multiplies the light it scatters by (white for materials that don't tint it)
+        '''
+        albedo = vec3(1.0, 1.0, 1.0)
+        if self.materialType == LAMBERTIAN or self.materialType == REFLECTIVE:
+            albedo = self.color 
+        return albedo 
+
+    @ti.func 
+    def scatterPdf(self, rayHitRecord, direction):
+        '''
+        Return the solid angle density of scatter picking the direction. Only Lambertian materials are sampled with next event estimation, so the other materials return 0 (the light that their scattered rays hit isn't weighted against light sampling)
+        '''
+        pdf = 0.0
+        if self.materialType == LAMBERTIAN:
+            pdf = ti.max(tm.dot(rayHitRecord.normalVector, tm.normalize(direction)), 0.0) / tm.pi 
+        return pdf 
+
+def getMaterialType(material):
+    '''
+    Return the type tag of a material created with one of the material classes
+    '''
+    for materialType, materialClass in enumerate(MATERIAL_TYPES):
+        if material.methods.get('scatter') is materialClass.methods['scatter']:
+            return materialType 
+    raise TypeError(f'{material} is not a material')
+
+def createMaterialTable(materialList):
+    '''
+    Convert a list of materials to the arrays for each member of the material table
+    '''
+    materialTable = {
+        'materialType': np.array([getMaterialType(material) for material in materialList], dtype = np.int32), 
+        'color': np.ones((len(materialList), 3), dtype = np.float32), 
+        'fuzz': np.zeros(len(materialList), dtype = np.float32), 
+        'refractionIndex': np.ones(len(materialList), dtype = np.float32)
+    }
+    for i, material in enumerate(materialList):
+        for member in material.keys:
+            materialTable[member][i] = np.asarray(getattr(material, member))
+    return materialTable
@@ -0,0 +1,174 @@
+import numpy as np
+import os
+import re
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'
+}
+
+def fanTriangles(polygon):
+    '''
+    Split a convex polygon (a list of vertex indices) into triangles that share its first vertex
+    '''
+    return [(polygon[0], polygon[i], polygon[i + 1]) for i in range(1, len(polygon) - 1)]
+
+def readOBJPolygons(text: str):
+    '''
+    Read the faces of an OBJ file line by line, splitting polygons into triangles and taking the vertex index out of v/vt/vn tokens. Negative indices count back from the last vertex read so far
+    '''
+    numVertices, triangles = 0, []
+    for line in text.splitlines():
+        if line[:2] in ('v ', 'v\t'):
+            numVertices += 1
+        elif line[:2] in ('f ', 'f\t'):
+            polygon = [int(token.split('/', 1)[0]) for token in line.split()[1:]]
+            triangles.extend(fanTriangles([index - 1 if index > 0 else numVertices + index for index in polygon]))
+    return np.array(triangles, dtype = np.int32).reshape(-1, 3)
+
+def loadOBJ(path: str):
+    '''
+    Read the vertices and faces of an OBJ file into a vertex array (n x 3) and a triangle array (m x 3) of vertex indices starting from 0. The vertex and face lines are picked out of the text and parsed by NumPy in bulk, and only files with polygons, v/vt/vn tokens, or negative indices are read line by line. Texture coordinates, normals, groups, and materials are ignored
+    '''
+    with open(path) as file:
+        text = file.read()
+    vertexLines = re.findall(r'^v[ \t]+(\S+[ \t]+\S+[ \t]+\S+)', text, re.MULTILINE) #Only x, y, and z (not w or colors)
+    vertices = np.fromstring(' '.join(vertexLines), dtype = np.float32, sep = ' ').reshape(-1, 3)
+
+    faceLines = re.findall(r'^f[ \t]+(.*\S)', text, re.MULTILINE)
+    faceText = ' '.join(faceLines)
+    if '/' not in faceText and '-' not in faceText:
+        indices = np.fromstring(faceText, dtype = np.int64, sep = ' ')
+        if len(indices) == 3 * len(faceLines): #Every face is a triangle
+            return vertices, (indices - 1).astype(np.int32).reshape(-1, 3)
+    return vertices, readOBJPolygons(text)
+
+def readPLYHeader(file):
+    '''
+    Read a PLY header and return the format and the elements as (name, count, properties) where every property is (name, type) or (name, countType, itemType) for lists
+    '''
+    if file.readline().strip() != b'ply':
+        raise ValueError('Not a PLY file')
+    fileFormat, elements = None, []
+    for line in iter(file.readline, b''):
+        words = line.decode('ascii').split()
+        if not words or words[0] in ('comment', 'obj_info'):
+            continue
+        if words[0] == 'end_header':
+            return fileFormat, elements
+        if words[0] == 'format':
+            fileFormat = words[1]
+        elif words[0] == 'element':
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == 'property' and words[1] == 'list':
+            elements[-1][2].append((words[4], PLY_TYPES[words[2]], PLY_TYPES[words[3]]))
+        elif words[0] == 'property':
+            elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+    raise ValueError('The PLY header never ends')
+
+def plyRowType(properties, byteOrder):
+    '''
+    Return the structured dtype of a PLY element's rows, with every list read as a count and 3 items (a triangle)
+    '''
+    return np.dtype([(name, byteOrder + types[0]) if len(types) == 1 else (name, [('count', byteOrder + types[0]), ('items', byteOrder + types[1], 3)]) for name, *types in properties])
+
+def readBinaryElement(data, offset, count, properties, byteOrder):
+    '''
+    Read count rows of a binary PLY element starting at offset and return the rows as a structured array and the offset after them. Lists are read as 3 items (triangles) when every row's list holds 3 items, and row by row otherwise
+    '''
+    rows = np.frombuffer(data, plyRowType(properties, byteOrder), count, offset)
+    if all(len(types) == 1 or (rows[name]['count'] == 3).all() for name, *types in properties):
+        return rows, offset + rows.nbytes
+
+    rows = []
+    for _ in range(count):
+        row = {}
+        for name, *types in properties:
+            if len(types) == 1:
+                row[name] = np.frombuffer(data, byteOrder + types[0], 1, offset)[0]
+                offset += np.dtype(types[0]).itemsize
+            else:
+                numItems = int(np.frombuffer(data, byteOrder + types[0], 1, offset)[0])
+                offset += np.dtype(types[0]).itemsize
+                row[name] = np.frombuffer(data, byteOrder + types[1], numItems, offset)
+                offset += numItems * np.dtype(types[1]).itemsize
+        rows.append(row)
+    return rows, offset
+
+def readASCIIElement(lines, count, properties):
+    '''
+    Read count rows of an ASCII PLY element and return the rows and the lines after them. The rows are parsed by NumPy in bulk into a structured array like readBinaryElement when every row's list holds 3 items, and row by row otherwise
+    '''
+    rowType = plyRowType(properties, '=')
+    rowLength = sum(1 if len(types) == 1 else 4 for name, *types in properties)
+    values = np.fromstring(' '.join(lines[:count]), dtype = np.float64, sep = ' ')
+    if len(values) == count * rowLength:
+        values, rows, column = values.reshape(count, rowLength), np.zeros(count, rowType), 0
+        for name, *types in properties:
+            if len(types) == 1:
+                rows[name], column = values[:, column], column + 1
+            else:
+                rows[name]['count'], rows[name]['items'], column = values[:, column], values[:, column + 1:column + 4], column + 4
+        if all(len(types) == 1 or (rows[name]['count'] == 3).all() for name, *types in properties):
+            return rows, lines[count:]
+
+    rows = []
+    for line in lines[:count]:
+        values, row = line.split(), {}
+        for name, *types in properties:
+            if len(types) == 1:
+                row[name], values = values[0], values[1:]
+            else:
+                numItems = int(values[0])
+                row[name], values = [int(value) for value in values[1:numItems + 1]], values[numItems + 1:]
+        rows.append(row)
+    return rows, lines[count:]
+
+def loadPLY(path: str):
+    '''
+    Read the vertices and faces of an ASCII or binary PLY file into a vertex array (n x 3) and a triangle array (m x 3) of vertex indices. Files made of triangles are read straight into NumPy without a loop over the rows
+    '''
+    with open(path, 'rb') as file:
+        fileFormat, elements = readPLYHeader(file)
+        data = file.read()
+
+    vertices, triangles = np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int32)
+    if fileFormat == 'ascii':
+        lines = [line for line in data.decode('ascii').splitlines() if line.strip()]
+    offset = 0
+    for name, count, properties in elements:
+        if fileFormat == 'ascii':
+            rows, lines = readASCIIElement(lines, count, properties)
+        else:
+            rows, offset = readBinaryElement(data, offset, count, properties, '<' if fileFormat == 'binary_little_endian' else '>')
+
+        if name == 'vertex':
+            vertices = np.array([[row['x'], row['y'], row['z']] for row in rows] if isinstance(rows, list) else np.stack([rows['x'], rows['y'], rows['z']], axis = -1), dtype = np.float32).reshape(-1, 3)
+        elif name == 'face':
+            listName = next(property[0] for property in properties if len(property) == 3)
+            if isinstance(rows, list):
+                triangles = np.array([triangle for row in rows for triangle in fanTriangles(list(row[listName]))], dtype = np.int32).reshape(-1, 3)
+            else:
+                triangles = rows[listName]['items'].astype(np.int32)
+    return vertices, triangles
+
+def loadMesh(path: str):
+    '''
+    Read an OBJ or PLY mesh (picked by the file extension) into vertex and triangle arrays
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.obj':
+        return loadOBJ(path)
+    if extension == '.ply':
+        return loadPLY(path)
+    raise ValueError(f'Unknown mesh format {extension}')
+
+def fitVertices(vertices, center, size: float):
+    '''
+    Move and scale vertices so that their bounding box is centered on center and its longest side is size
+    '''
+    minPoint, maxPoint = vertices.min(axis = 0), vertices.max(axis = 0)
+    scale = size / max((maxPoint - minPoint).max(), 1e-12)
+    return ((vertices - (minPoint + maxPoint) / 2) * scale + np.asarray(center, dtype = np.float32)).astype(np.float32)
@@ -1,7 +1,7 @@
-from Vectors import * 
-from Materials import *
-from Hittable import * 
-from BoundBox import *
+from .Vectors import * 
+from .Materials import *
+from .Hittable import * 
+from .BoundBox import *
 
 @ti.func 
 def simplifiedDiscriminant(a, c, h):
@@ -36,36 +36,55 @@ def checkSphereIntersection(a, h, discriminant, tInterval):
             t = -1.0
     return t >= 0, t
 
-@ti.data_oriented
-class sphere3: 
+@ti.func
+def hitSphere(center, radius, ray, tempHitRecord): 
     '''
-    Class for a sphere and its ray intersections
+    Check whether a ray intersects with a sphere and record the hit if it does (the hit record's t stays the same if it doesn't)
     '''
-    def __init__(self, center, radius, material):
-        self.center, self.radius, self.material = center, radius, material 
+    
+    rayToSphereCenter = center - ray.origin
+    a, h, c = tm.dot(ray.direction, ray.direction), tm.dot(ray.direction, rayToSphereCenter), tm.dot(rayToSphereCenter, rayToSphereCenter) - radius ** 2
+    discriminant = simplifiedDiscriminant(a, c, h)
 
-        radiusVector = vec3(self.radius, self.radius, self.radius)
-        self.boundingBox = createBoundingBox(self.center - radiusVector, self.center + radiusVector)
+    if discriminant >= 0:
+        hitSphere, t = checkSphereIntersection(a, h, discriminant, tempHitRecord.tInterval)
+        if hitSphere:
+            tempHitRecord.tInterval.maxValue = t 
+            tempHitRecord.hitAnything = True 
+            tempHitRecord.pointHit = ray.pointOnRay(tempHitRecord.t())
+            tempHitRecord.initRayDir = ray.direction
+            tempHitRecord.normalVector = findSphereNormalVector(ray, tempHitRecord.t(), center, radius)
+            tempHitRecord.frontFace = tempHitRecord.isFrontFace(ray)
+    
+    return tempHitRecord
+
+@ti.func 
+def hitTriangle(vertex0, vertex1, vertex2, ray, tempHitRecord):
+    '''
+    Check whether a ray intersects with a triangle with the Möller–Trumbore test and record the hit if it does (the hit record's t stays the same if it doesn't). The normal follows the winding of the vertices before the hit record points it against the ray
+    '''
+    edge1, edge2 = vertex1 - vertex0, vertex2 - vertex0
+    p = tm.cross(ray.direction, edge2)
+    determinant = tm.dot(edge1, p)
+    if determinant != 0: #The ray is parallel to the triangle otherwise
+        inverseDeterminant = 1 / determinant 
+        s = ray.origin - vertex0 
+        q = tm.cross(s, edge1)
+        u, v = tm.dot(s, p) * inverseDeterminant, tm.dot(ray.direction, q) * inverseDeterminant
+        t = tm.dot(edge2, q) * inverseDeterminant
+        if u >= 0 and v >= 0 and u + v <= 1 and tempHitRecord.tInterval.surrounds(t):
+            tempHitRecord.tInterval.maxValue = t 
+            tempHitRecord.hitAnything = True 
+            tempHitRecord.pointHit = ray.pointOnRay(t)
+            tempHitRecord.initRayDir = ray.direction
+            tempHitRecord.normalVector = tm.normalize(tm.cross(edge1, edge2))
+            tempHitRecord.frontFace = tempHitRecord.isFrontFace(ray)
 
-    @ti.func
-    def hit(self, ray, tempHitRecord): 
-        '''
-        Check whether a ray intersects with a sphere and return t = -1.0 if it doesn't
-        '''
-        
-        rayToSphereCenter = self.center - ray.origin
-        a, h, c = tm.dot(ray.direction, ray.direction), tm.dot(ray.direction, rayToSphereCenter), tm.dot(rayToSphereCenter, rayToSphereCenter) - self.radius ** 2
-        discriminant = simplifiedDiscriminant(a, c, h)
+    return tempHitRecord
 
-        hitSphere = False 
-        if discriminant >= 0:
-            hitSphere, tempHitRecord.tInterval.maxValue = checkSphereIntersection(a, h, discriminant, tempHitRecord.tInterval)
-            if hitSphere:
-                tempHitRecord.hitAnything = True 
-                tempHitRecord.pointHit = ray.pointOnRay(tempHitRecord.t())
-                tempHitRecord.initRayDir = ray.direction
-                tempHitRecord.normalVector = findSphereNormalVector(ray, tempHitRecord.t(), self.center, self.radius)
-                tempHitRecord.frontFace = tempHitRecord.isFrontFace(ray)
-                tempHitRecord.didRayScatter, tempHitRecord.rayScatter, tempHitRecord.rayColor = self.material.scatter(tempHitRecord)
-        
-        return tempHitRecord
\ No newline at end of file
+class sphere3: 
+    '''
+    Class describing a sphere to add to the world. The world copies the spheres into its fields, so this only holds the values
+    '''
+    def __init__(self, center, radius, material):
+        self.center, self.radius, self.material = center, radius, material 
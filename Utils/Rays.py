@@ -1,4 +1,4 @@
-from Vectors import *
+from .Vectors import *
 
 @ti.dataclass
 class ray3:
@@ -0,0 +1,57 @@
+import taichi as ti
+import random as rand
+import time
+
+BACKENDS = {
+    'gpu': ti.gpu,
+    'cpu': ti.cpu,
+    'cuda': ti.cuda,
+    'vulkan': ti.vulkan,
+    'metal': ti.metal,
+    'opengl': ti.opengl
+} #ti.gpu and ti.cpu pick the best available backend of that kind
+
+TAICHI_INTERNALS_VERSION = (1, 7, 4) #compileKernel and the AOT export use Taichi's private kernel objects, which were only checked against this version
+
+startupTimes = {} #Seconds spent importing, initializing Taichi, building the scene, and compiling kernels before the first frame
+
+def initRenderer(backend = 'gpu', threads = None, cacheDir = None, randomSeed = None, offlineCache = True):
+    '''
+    Initialize Taichi. This has to be called before any fields are created or kernels are run. threads limits the number of CPU threads, cacheDir is where compiled kernels are cached between runs, and randomSeed makes ti.random repeatable (a random seed is picked when it isn't given)
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend}')
+
+    options = {'offline_cache': offlineCache, 'random_seed': rand.randint(0, 10000) if randomSeed is None else randomSeed}
+    if threads is not None:
+        options['cpu_max_num_threads'] = threads
+    if cacheDir is not None:
+        options['offline_cache_file_path'] = cacheDir
+
+    start = time.perf_counter()
+    ti.init(BACKENDS[backend], **options)
+    startupTimes['init'] = time.perf_counter() - start
+
+def checkTaichiInternals(feature):
+    '''
+    Raise an error when the installed Taichi isn't the version whose private kernel objects the feature uses
+    '''
+    if ti.__version__ != TAICHI_INTERNALS_VERSION:
+        raise RuntimeError(f'{feature} needs Taichi {".".join(map(str, TAICHI_INTERNALS_VERSION))} but Taichi {".".join(map(str, ti.__version__))} is installed')
+
+def compileKernel(kernel, *args):
+    '''
+    Compile a kernel (or a kernel method of a data oriented object) for the given arguments without running it, so that it doesn't have to be compiled when it's first called
+    '''
+    checkTaichiInternals('Compiling kernels ahead of the first frame')
+    if hasattr(kernel, '_kernel_owner'):
+        args = (kernel._kernel_owner,) + args
+    key = kernel._primal.ensure_compiled(*args) #Taichi only builds the kernel's IR here and compiles it to machine code the first time it's launched, so that step is done here too (the result is cached for the launch)
+    program = ti.lang.impl.get_runtime().prog
+    program.compile_kernel(program.config(), program.get_device_caps(), kernel._primal.compiled_kernels[key])
+
+def startupReport():
+    '''
+    Return a line with the time spent on each step of starting up
+    '''
+    return 'Startup: ' + ', '.join(f'{step} {seconds:.3f} s' for step, seconds in startupTimes.items())
@@ -0,0 +1,139 @@
+from .Vectors import *
+
+RANDOM_SAMPLER, SOBOL_SAMPLER = 'random', 'sobol' #Independent ti.random values or an Owen scrambled Sobol sequence for every pixel
+SAMPLER_TYPES = (RANDOM_SAMPLER, SOBOL_SAMPLER) #The position of each sampler is its type tag
+RANDOM_SAMPLER_TYPE, SOBOL_SAMPLER_TYPE = SAMPLER_TYPES.index(RANDOM_SAMPLER), SAMPLER_TYPES.index(SOBOL_SAMPLER)
+PIXEL_DIMENSION, BOUNCE_DIMENSIONS = 0, 3 #The pixel's antialiasing offset comes first, then every bounce takes 3 dimensions starting at 1 + depth * BOUNCE_DIMENSIONS
+SCATTER_DIMENSION, LIGHT_DIMENSION, CHOICE_DIMENSION = 0, 1, 2 #The scatter direction, the light sample, and the material's choice and Russian roulette within a bounce
+
+@ti.func
+def reverseBits(x):
+    '''
+    Reverse the order of the bits of an unsigned 32 bit integer
+    '''
+    x = ((x >> 1) & ti.u32(0x55555555)) | ((x & ti.u32(0x55555555)) << 1)
+    x = ((x >> 2) & ti.u32(0x33333333)) | ((x & ti.u32(0x33333333)) << 2)
+    x = ((x >> 4) & ti.u32(0x0F0F0F0F)) | ((x & ti.u32(0x0F0F0F0F)) << 4)
+    x = ((x >> 8) & ti.u32(0x00FF00FF)) | ((x & ti.u32(0x00FF00FF)) << 8)
+    return (x >> 16) | (x << 16)
+
+@ti.func
+def hashInteger(x):
+    '''
+    PCG hash of an unsigned 32 bit integer (Jarzynski and Olano 2020)
+    '''
+    state = x * ti.u32(747796405) + ti.u32(2891336453)
+    word = ((state >> ((state >> 28) + ti.u32(4))) ^ state) * ti.u32(277803737)
+    return (word >> 22) ^ word
+
+@ti.func
+def hashCombine(seed, value):
+    return hashInteger(seed ^ (ti.cast(value, ti.u32) + ti.u32(0x9e3779b9) + (seed << 6) + (seed >> 2)))
+
+@ti.func
+def nestedUniformScramble(x, seed):
+    '''
+    Owen scramble the bits of x with a hash based permutation (Burley 2020). Every bit is flipped depending on the bits above it, so points keep the stratification of the sequence they came from
+    '''
+    x = reverseBits(x)
+    x ^= x * ti.u32(0x3d20adea)
+    x += seed
+    x *= (seed >> 16) | ti.u32(1)
+    x ^= x * ti.u32(0x05526c56)
+    x ^= x * ti.u32(0x53a22864)
+    return reverseBits(x)
+
+@ti.func
+def sobolPoint(index):
+    '''
+    Return the first two dimensions of the Sobol sequence at the index as unsigned 32 bit fractions. The first is the bit reversed index and the second has the direction numbers of the Pascal matrix
+    '''
+    y, direction = ti.u32(0), ti.u32(0x80000000)
+    bits = index
+    while bits != 0:
+        if bits & ti.u32(1):
+            y ^= direction
+        bits >>= 1
+        direction ^= direction >> 1
+    return reverseBits(index), y
+
+@ti.func
+def unitFloat(x):
+    '''
+    Convert an unsigned 32 bit fraction to a float in [0, 1)
+    '''
+    return ti.cast(x >> 8, float) * (1.0 / 16777216.0)
+
+@ti.func
+def bounceDimension(depth, offset):
+    return 1 + depth * BOUNCE_DIMENSIONS + offset
+
+@ti.dataclass
+class sampleStream:
+    '''
+    The random numbers for one sample of one pixel. Every place along a path that needs random numbers asks for its own 2D dimension, so the sample is a point in many dimensions. With the Sobol sampler, each dimension is the 2D Sobol sequence at the sample index, shuffled and Owen scrambled with a hash of the pixel's seed and the dimension (Burley 2020), so the first 2^k samples of a pixel are stratified in every dimension and the pixels aren't correlated. The random sampler returns independent ti.random values instead
+    '''
+    samplerType: int
+    seed: ti.u32
+    sampleIndex: ti.u32
+
+    @ti.func
+    def get2D(self, dimension):
+        '''
+        Return the sample's point in the dimension with both coordinates in [0, 1)
+        '''
+        point = tm.vec2(0.0, 0.0)
+        if self.samplerType == SOBOL_SAMPLER_TYPE:
+            dimensionSeed = hashCombine(self.seed, dimension)
+            x, y = sobolPoint(nestedUniformScramble(self.sampleIndex, dimensionSeed))
+            point = tm.vec2(unitFloat(nestedUniformScramble(x, hashCombine(dimensionSeed, 1))), unitFloat(nestedUniformScramble(y, hashCombine(dimensionSeed, 2))))
+        else:
+            point = tm.vec2(ti.random(), ti.random())
+        return point
+
+@ti.func
+def pixelSampleStream(samplerType, i, j, sampleIndex):
+    '''
+    Return the stream for a sample of the pixel, seeded only by the pixel and the sample index
+    '''
+    return sampleStream(samplerType, hashCombine(hashInteger(ti.cast(i, ti.u32)), j), ti.cast(sampleIndex, ti.u32))
+
+@ti.func
+def randomStream():
+    '''
+    Return a stream of independent ti.random values (for sampling outside of the camera's passes)
+    '''
+    return sampleStream(RANDOM_SAMPLER_TYPE, ti.u32(0), ti.u32(0))
+
+@ti.func
+def randomSample2D():
+    return tm.vec2(ti.random(), ti.random())
+
+@ti.func
+def orthonormalBasis(w):
+    '''
+    Return two unit vectors that are perpendicular to the unit vector w and to each other
+    '''
+    helper = vec3(1, 0, 0)
+    if ti.abs(getX(w)) > 0.9:
+        helper = vec3(0, 1, 0)
+    u = tm.normalize(tm.cross(helper, w))
+    return u, tm.cross(w, u)
+
+@ti.func
+def uniformSphere(u):
+    '''
+    Map a point in the unit square to a direction uniformly distributed on the unit sphere (the height is uniform by Archimedes' hat-box theorem)
+    '''
+    z, angle = 1 - 2 * u[0], 2 * tm.pi * u[1]
+    r = tm.sqrt(ti.max(1 - z ** 2, 0.0))
+    return vec3(r * tm.cos(angle), r * tm.sin(angle), z)
+
+@ti.func
+def cosineHemisphere(normal, u):
+    '''
+    Map a point in the unit square to a direction in the hemisphere around the unit normal with a density of cos / pi (a uniform point on the disk projected up onto the hemisphere)
+    '''
+    r, angle = tm.sqrt(u[0]), 2 * tm.pi * u[1]
+    tangent, bitangent = orthonormalBasis(normal)
+    return r * tm.cos(angle) * tangent + r * tm.sin(angle) * bitangent + tm.sqrt(ti.max(1 - u[0], 0.0)) * normal
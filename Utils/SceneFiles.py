@@ -0,0 +1,78 @@
+from .World import *
+import json
+import os
+
+SCENE_FILE_VERSION, SCENE_ALIGNMENT = 1, 64
+MATERIAL_NAMES = ('lambertian', 'reflective', 'dielectric', 'emissive') #Named in the order of the material type tags
+SCENE_ARRAYS = ('sphereCenters', 'sphereRadii', 'sphereMaterials', 'vertices', 'triangles', 'triangleMaterials')
+
+def sceneArrayPath(path: str):
+    return os.path.splitext(path)[0] + '.bin'
+
+def materialToJSON(material):
+    description = {'type': MATERIAL_NAMES[getMaterialType(material)]}
+    for member in material.keys:
+        values = [float(str(value)) for value in np.asarray(getattr(material, member), dtype = np.float32).reshape(-1)] #The shortest decimals that give the same 32 bit floats
+        description[member] = values if len(values) > 1 else values[0]
+    return description
+
+def materialFromJSON(description):
+    materialClass = MATERIAL_TYPES[MATERIAL_NAMES.index(description['type'])]
+    return materialClass(**{member: vec3(*value) if isinstance(value, list) else value for member, value in description.items() if member != 'type'})
+
+def saveScene(world, path: str, cameraPos = None, lookAt = None):
+    '''
+    Save the world's materials and objects as a scene file: a JSON header at path with the materials and the layout of the object arrays, and the arrays themselves packed raw next to it (path with a .bin extension) so that they can be memory mapped when loaded. A camera position and look at point can be saved with the scene as its view
+    '''
+    if world.instanceChunks:
+        raise ValueError('Scenes with instances can\'t be saved yet')
+    centers, radii, sphereMaterials = world.joinSphereChunks()
+    vertices, triangles, triangleMaterials = world.joinMeshChunks()
+    arrays = dict(zip(SCENE_ARRAYS, (centers, radii, sphereMaterials, vertices, triangles, triangleMaterials)))
+
+    header = {'version': SCENE_FILE_VERSION, 'arrays': os.path.basename(sceneArrayPath(path)), 'materials': [materialToJSON(material) for material in world.materialList], 'layout': {}}
+    if cameraPos is not None and lookAt is not None:
+        header['view'] = {'cameraPos': list(map(float, cameraPos)), 'lookAt': list(map(float, lookAt))}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+    with open(sceneArrayPath(path), 'wb') as file:
+        for name, values in arrays.items():
+            file.write(bytes(-file.tell() % SCENE_ALIGNMENT))
+            header['layout'][name] = {'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': file.tell()}
+            file.write(np.ascontiguousarray(values).tobytes())
+    with open(path, 'w') as file:
+        json.dump(header, file, indent = 2)
+
+def readSceneHeader(path: str):
+    '''
+    Read a scene file's header (its materials, array layout, and view if it was saved with one)
+    '''
+    with open(path) as file:
+        header = json.load(file)
+    if header.get('version') != SCENE_FILE_VERSION:
+        raise ValueError(f'{path} is not a version {SCENE_FILE_VERSION} scene file')
+    return header
+
+def mapSceneArrays(path: str, header):
+    '''
+    Memory map the object arrays of a scene file without reading them
+    '''
+    arrays, arrayPath = {}, os.path.join(os.path.dirname(path), header['arrays'])
+    for name in SCENE_ARRAYS:
+        layout = header['layout'][name]
+        if np.prod(layout['shape']) == 0:
+            arrays[name] = np.zeros(layout['shape'], layout['dtype']) #Empty arrays can't be mapped
+        else:
+            arrays[name] = np.memmap(arrayPath, layout['dtype'], 'r', layout['offset'], tuple(layout['shape']))
+    return arrays
+
+def loadScene(world, path: str):
+    '''
+    Add the materials and objects of a scene file to the world in bulk (the objects are copied into the object fields and the BVH is built over them the next time the scene is updated) and return the header
+    '''
+    header = readSceneHeader(path)
+    arrays = mapSceneArrays(path, header)
+    materialIndices = np.array([world.addMaterial(materialFromJSON(description)) for description in header['materials']] or [0], dtype = np.int32) #The scene's material indices are moved after the world's materials
+    world.addSpheres(arrays['sphereCenters'], arrays['sphereRadii'], materialIndices[arrays['sphereMaterials']])
+    if len(arrays['triangles']) > 0:
+        world.addMesh(arrays['vertices'], arrays['triangles'], materialIndices[arrays['triangleMaterials']])
+    return header
@@ -1,11 +1,79 @@
-from Vectors import *
-
-@ti.func 
-def selectionSort(leaves: ti.template()): #type: ignore
-    numberLeaves = leaves.shape[0]
-    for i in range(numberLeaves):
-        minIndex = i
-        for j in range(i + 1, numberLeaves):
-            if leaves[j].mortonCode < leaves[minIndex].mortonCode:
-                minIndex = j
-        leaves[i], leaves[minIndex] = leaves[minIndex], leaves[i]
\ No newline at end of file
+from .Vectors import *
+
+RADIX_BITS = 8
+RADIX = 1 << RADIX_BITS
+SORT_BLOCK_SIZE = 512
+
+@ti.data_oriented 
+class radixSorter:
+    '''
+    Stable parallel least significant digit radix sort for non-negative integer keys (like Morton codes) with an integer value carried along with every key. Every pass splits the keys into blocks, counts the digits of each block in parallel, scans the counts, and then scatters each block's keys to their sorted positions in parallel
+    '''
+    def __init__(self, capacity: int, keyBits = 30):
+        self.capacity, self.keyBits = capacity, keyBits
+        self.keyBuffer, self.valueBuffer = ti.field(int, shape = (capacity,)), ti.field(int, shape = (capacity,))
+        self.digitOffsets = ti.field(int, shape = (RADIX, self.numBlocks(capacity))) #Number of keys with each digit in each block, which gets scanned into where each block writes its keys with that digit
+
+    def numBlocks(self, numKeys):
+        return max((numKeys + SORT_BLOCK_SIZE - 1) // SORT_BLOCK_SIZE, 1)
+
+    @ti.func 
+    def digit(self, key, shift):
+        return (key >> shift) & (RADIX - 1)
+
+    @ti.kernel 
+    def countDigits(self, keys: ti.template(), numKeys: int, numBlocks: int, shift: int): #type: ignore
+        '''
+        Count how many keys have each digit in every block
+        '''
+        for block in range(numBlocks):
+            for d in range(RADIX):
+                self.digitOffsets[d, block] = 0
+            for i in range(block * SORT_BLOCK_SIZE, ti.min((block + 1) * SORT_BLOCK_SIZE, numKeys)):
+                self.digitOffsets[self.digit(keys[i], shift), block] += 1
+
+    @ti.kernel 
+    def scanDigitCounts(self, numBlocks: int):
+        '''
+        Exclusive scan of the digit counts in digit-major order so that every block knows where to start writing the keys of each digit (this keeps the sort stable)
+        '''
+        ti.loop_config(serialize = True)
+        for _ in range(1):
+            runningCount = 0
+            for d in range(RADIX):
+                for block in range(numBlocks):
+                    count = self.digitOffsets[d, block]
+                    self.digitOffsets[d, block] = runningCount 
+                    runningCount += count 
+
+    @ti.kernel 
+    def scatter(self, keys: ti.template(), values: ti.template(), sortedKeys: ti.template(), sortedValues: ti.template(), numKeys: int, numBlocks: int, shift: int): #type: ignore
+        '''
+        Move every key and value to its position sorted by the current digit
+        '''
+        for block in range(numBlocks):
+            for i in range(block * SORT_BLOCK_SIZE, ti.min((block + 1) * SORT_BLOCK_SIZE, numKeys)):
+                d = self.digit(keys[i], shift)
+                sortedIndex = self.digitOffsets[d, block]
+                self.digitOffsets[d, block] += 1
+                sortedKeys[sortedIndex], sortedValues[sortedIndex] = keys[i], values[i]
+
+    @ti.kernel 
+    def copyBack(self, keys: ti.template(), values: ti.template(), numKeys: int): #type: ignore
+        for i in range(numKeys):
+            keys[i], values[i] = self.keyBuffer[i], self.valueBuffer[i]
+
+    def sort(self, keys, values, numKeys: int):
+        '''
+        Sort the first numKeys keys in ascending order and move their values along with them
+        '''
+        numBlocks = self.numBlocks(numKeys)
+        source, destination = (keys, values), (self.keyBuffer, self.valueBuffer)
+        for shift in range(0, self.keyBits, RADIX_BITS):
+            self.countDigits(source[0], numKeys, numBlocks, shift)
+            self.scanDigitCounts(numBlocks)
+            self.scatter(*source, *destination, numKeys, numBlocks, shift)
+            source, destination = destination, source 
+
+        if source[0] is self.keyBuffer: #An odd number of passes leaves the sorted keys in the buffers
+            self.copyBack(keys, values, numKeys)
@@ -0,0 +1,127 @@
+from .Materials import *
+from .Runtime import *
+
+@ti.data_oriented
+class temporalReprojection:
+    '''
+    Keep the camera's accumulated samples when it moves instead of throwing them away. The first hit of a ray through the center of every pixel (its world position, depth, and normal) is stored along with the camera's position and pixel grid for the view it was found in. When the view changes, the first hits of the new view are projected through the old view's pixel grid and the old samples are bilinearly resampled from the four old pixels around them. Pixels that see the sky are projected by their direction. Old pixels whose first hit isn't on the surface of the new one (it's a different object, or it was in front of what the new pixel sees) are rejected, so pixels that were hidden before start over. Reprojected pixels keep at most historyLength passes so that reprojection errors fade out
+    '''
+    def __init__(self, imageWidth: int, imageHeight: int, historyLength = 32, planeTolerance = 0.01, normalTolerance = 0.9):
+        self.imageWidth, self.imageHeight = imageWidth, imageHeight
+        self.historyLength, self.planeTolerance, self.normalTolerance = historyLength, planeTolerance, normalTolerance #Old first hits have to be within planeTolerance times the depth of the new hit's tangent plane, and their normals' dot product has to be over normalTolerance
+        self.firstHits = ti.Struct.field({
+            'position': vec3,
+            'normal': vec3,
+            'depth': float
+        }, shape = (2, imageWidth, imageHeight), layout = ti.Layout.SOA) #The first hits for the last two views (rays that hit nothing store their direction as the position and -1 as the depth)
+        self.viewField = ti.Vector.field(3, float, shape = (2, 4)) #Camera position, first pixel position, and the steps between pixels for each view
+        self.history = ti.Struct.field({
+            'colorSum': vec3,
+            'passCount': int,
+            'luminanceMean': float,
+            'luminanceM2': float
+        }, shape = (imageWidth, imageHeight), layout = ti.Layout.SOA) #A copy of the accumulation for the old view
+        self.current, self.firstHitsValid = 0, False #The slot with the current view's first hits and whether they match the scene and view
+
+    @ti.kernel
+    def findFirstHits(self, camera: ti.template(), sceneVersion: ti.template(), slot: int): #type: ignore
+        '''
+        Store the camera's view and the first hit of the ray through the center of every pixel in the slot
+        '''
+        cameraPos, firstPixel, pixelDX, pixelDY = camera.movement.cameraPos(), camera.renderValues.initPixelPos(), camera.renderValues.pixelDX(), camera.renderValues.pixelDY()
+        self.viewField[slot, 0], self.viewField[slot, 1], self.viewField[slot, 2], self.viewField[slot, 3] = cameraPos, firstPixel, pixelDX, pixelDY
+        for i, j in ti.ndrange(self.imageWidth, self.imageHeight):
+            ray = ray3(cameraPos, firstPixel + i * pixelDX + j * pixelDY - cameraPos)
+            rayHitRecord = camera.hitObjects(ray, initDefaultHitRecord(camera.tInterval))
+            self.firstHits[slot, i, j].position, self.firstHits[slot, i, j].normal, self.firstHits[slot, i, j].depth = ray.direction, vec3(0.0, 0.0, 0.0), -1.0
+            if rayHitRecord.hitAnything:
+                self.firstHits[slot, i, j].position, self.firstHits[slot, i, j].normal = rayHitRecord.pointHit, rayHitRecord.normalVector
+                self.firstHits[slot, i, j].depth = tm.distance(rayHitRecord.pointHit, cameraPos)
+
+    @ti.func
+    def projectToPixel(self, slot, direction):
+        '''
+        Return the continuous pixel coordinates where a point in the direction from the slot's camera shows up in its view, and whether it's in front of the camera
+        '''
+        cameraPos, firstPixel, pixelDX, pixelDY = self.viewField[slot, 0], self.viewField[slot, 1], self.viewField[slot, 2], self.viewField[slot, 3]
+        gridNormal = tm.cross(pixelDX, pixelDY)
+        pointDistance, gridDistance = tm.dot(direction, gridNormal), tm.dot(firstPixel - cameraPos, gridNormal)
+        pixel, inFront = tm.vec2(0.0, 0.0), pointDistance * gridDistance > 0
+        if inFront:
+            gridPoint = cameraPos + direction * (gridDistance / pointDistance) - firstPixel #Where the line from the camera crosses the pixel grid
+            pixel = tm.vec2(tm.dot(gridPoint, pixelDX) / tm.dot(pixelDX, pixelDX), tm.dot(gridPoint, pixelDY) / tm.dot(pixelDY, pixelDY))
+        return pixel, inFront
+
+    @ti.func
+    def sameSurface(self, slot, x, y, position, normal, depth):
+        '''
+        Check whether the old pixel's first hit lies on the surface of a new first hit (or whether both of them missed everything)
+        '''
+        oldDepth, oldPosition, oldNormal = self.firstHits[slot, x, y].depth, self.firstHits[slot, x, y].position, self.firstHits[slot, x, y].normal
+        isSame = oldDepth < 0 and depth < 0
+        if oldDepth > 0 and depth > 0:
+            isSame = ti.abs(tm.dot(oldPosition - position, normal)) < self.planeTolerance * depth and tm.dot(oldNormal, normal) > self.normalTolerance
+        return isSame
+
+    @ti.kernel
+    def reprojectHistory(self, camera: ti.template(), previous: int, current: int): #type: ignore
+        '''
+        Resample the accumulation of the previous view for the first hits of the current view. Pass counts, color sums, and luminance statistics are averaged over the old pixels that pass the surface test, weighted by their bilinear weights and pass counts
+        '''
+        for i, j in self.history:
+            self.history[i, j].colorSum, self.history[i, j].passCount = camera.accumulation.colorSumField[i, j], camera.accumulation.passCountField[i, j]
+            self.history[i, j].luminanceMean, self.history[i, j].luminanceM2 = camera.accumulation.luminanceMeanField[i, j], camera.accumulation.luminanceM2Field[i, j]
+
+        for i, j in self.history:
+            colorSum, passSum, luminanceSum, luminanceM2Sum, weightSum = vec3(0.0, 0.0, 0.0), 0.0, 0.0, 0.0, 0.0
+            position, normal, depth = self.firstHits[current, i, j].position, self.firstHits[current, i, j].normal, self.firstHits[current, i, j].depth
+            direction = position if depth < 0 else position - self.viewField[previous, 0] #The sky is infinitely far away, so only the direction matters for rays that missed
+            pixel, inFront = self.projectToPixel(previous, direction)
+            if inFront and -1 < pixel[0] < self.imageWidth and -1 < pixel[1] < self.imageHeight:
+                x0, y0 = int(tm.floor(pixel[0])), int(tm.floor(pixel[1]))
+                tx, ty = pixel[0] - x0, pixel[1] - y0
+                for dx, dy in ti.static(ti.ndrange(2, 2)):
+                    x, y = x0 + dx, y0 + dy
+                    if 0 <= x < self.imageWidth and 0 <= y < self.imageHeight and self.sameSurface(previous, x, y, position, normal, depth):
+                        weight = (tx if dx else 1 - tx) * (ty if dy else 1 - ty)
+                        passCount = self.history[x, y].passCount
+                        colorSum += weight * self.history[x, y].colorSum
+                        passSum += weight * passCount
+                        luminanceSum += weight * passCount * self.history[x, y].luminanceMean
+                        luminanceM2Sum += weight * self.history[x, y].luminanceM2
+                        weightSum += weight
+
+            passCount = 0
+            if passSum > 0:
+                passCount = ti.min(int(tm.round(passSum / weightSum)), self.historyLength)
+            newPasses = passCount / ti.max(passSum, 1e-6)
+            camera.accumulation.colorSumField[i, j], camera.accumulation.passCountField[i, j] = colorSum * newPasses, passCount
+            camera.accumulation.luminanceMeanField[i, j], camera.accumulation.luminanceM2Field[i, j] = luminanceSum / ti.max(passSum, 1e-6), luminanceM2Sum * newPasses
+        camera.accumulation.frameCountField[None] = 0 #Anything averaged over frames in screen space (like the denoiser's features) starts over
+
+    def storeFirstHits(self, camera):
+        '''
+        Find the first hits for the camera's current view if the stored ones are out of date
+        '''
+        if not self.firstHitsValid:
+            self.findFirstHits(camera, camera.sceneVersion, self.current)
+            self.firstHitsValid = True
+
+    def reproject(self, camera):
+        '''
+        Move the camera's accumulated samples over to its new view, or throw them away if there's no history for the scene
+        '''
+        if not self.firstHitsValid or camera.updateScene():
+            camera.accumulation.reset()
+            self.firstHitsValid = False
+            return
+        previous, self.current = self.current, 1 - self.current
+        self.findFirstHits(camera, camera.sceneVersion, self.current)
+        self.reprojectHistory(camera, previous, self.current)
+
+    def compileKernels(self, camera):
+        '''
+        Compile every kernel used to reproject without running them
+        '''
+        compileKernel(self.findFirstHits, camera, camera.sceneVersion, 0)
+        compileKernel(self.reprojectHistory, camera, 0, 1)
@@ -0,0 +1,86 @@
+from .BoundTree import *
+import hashlib
+import os
+
+TREE_CACHE_VERSION = 1 #Part of every key so that changing how trees are built or stored misses old entries
+TREE_CACHE_PARTS = ('nodes', 'leaves') #Leaves are written last, so an entry counts once its leaves exist
+
+class bvhCache:
+    '''
+    Cache of built BVH trees on disk, keyed by a hash of the objects' geometry and the tree builder, so that processes rendering the same static scene map the tree from a file instead of building it. The leaves and nodes are saved as .npy files that are memory mapped when loaded. Once the cache grows past maxBytes the least recently used trees are removed
+    '''
+    def __init__(self, cacheDir: str, maxBytes = 2 ** 30):
+        self.cacheDir, self.maxBytes = cacheDir, maxBytes
+        self.hits, self.misses = 0, 0
+        os.makedirs(cacheDir, exist_ok = True)
+
+    def treeKey(self, world):
+        '''
+        Hash everything the tree depends on: the sphere and triangle geometry, the instances' bounding boxes, and the builder (but not the materials)
+        '''
+        centers, radii, _ = world.joinSphereChunks()
+        vertices, triangles, _ = world.joinMeshChunks()
+        digest = hashlib.blake2b(f'{TREE_CACHE_VERSION} {world.treeBuilder} {len(radii)} {len(triangles)} {len(vertices)} {len(world.instanceBoxes)}'.encode(), digest_size = 20)
+        for values in (centers, radii, vertices, triangles, world.instanceBoxes): #Instances are placed in the tree by their bounding boxes
+            digest.update(np.ascontiguousarray(values).data)
+        return digest.hexdigest()
+
+    def partPath(self, key: str, part: str):
+        return os.path.join(self.cacheDir, f'{key}.{part}.npy')
+
+    def load(self, world, key: str):
+        '''
+        Copy the cached tree for the key into the world's tree fields and return whether it was there
+        '''
+        try:
+            leaves, nodes = [np.load(self.partPath(key, part), mmap_mode = 'r') for part in ('leaves', 'nodes')]
+            if leaves.dtype != TREE_ARRAY_DTYPE or nodes.dtype != TREE_ARRAY_DTYPE or len(nodes) != max(len(leaves) - 1, 0):
+                raise ValueError(f'The cached tree {key} is broken')
+            for part in TREE_CACHE_PARTS:
+                os.utime(self.partPath(key, part)) #Mark the tree as recently used
+        except (OSError, ValueError): #Missing, broken, or removed by another process while it was being loaded
+            self.misses += 1
+            return False
+        world.setTreeArrays(leaves, nodes)
+        self.hits += 1
+        return True
+
+    def store(self, world, key: str):
+        '''
+        Save the world's built tree under the key and evict the least recently used trees if the cache is too big. Every file is written under a temporary name first so that other processes never load part of a tree
+        '''
+        for part, values in zip(TREE_CACHE_PARTS, world.treeArrays()[::-1]):
+            temporaryPath = self.partPath(key, f'{part}.{os.getpid()}.tmp')
+            np.save(temporaryPath, values)
+            os.replace(temporaryPath, self.partPath(key, part))
+        self.evict()
+
+    def entries(self):
+        '''
+        Return the cached trees as (last used time, size in bytes, key) from the least recently used
+        '''
+        entries = {}
+        for fileName in os.listdir(self.cacheDir):
+            key, *part = fileName.split('.')
+            if len(part) != 2 or part[0] not in TREE_CACHE_PARTS: #Skips temporary files that are still being written
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cacheDir, fileName))
+            except OSError:
+                continue
+            lastUsed, size = entries.get(key, (0, 0))
+            entries[key] = (max(lastUsed, stat.st_mtime), size + stat.st_size)
+        return sorted((lastUsed, size, key) for key, (lastUsed, size) in entries.items())
+
+    def evict(self):
+        entries = self.entries()
+        totalBytes = sum(size for _, size, _ in entries)
+        for _, size, key in entries[:-1]: #The newest tree stays even if it's bigger than the limit by itself
+            if totalBytes <= self.maxBytes:
+                break
+            for part in TREE_CACHE_PARTS:
+                try:
+                    os.remove(self.partPath(key, part))
+                except FileNotFoundError:
+                    pass
+            totalBytes -= size
@@ -1,8 +1,6 @@
 import taichi as ti 
 import taichi.math as tm 
-import random as rand
 
-ti.init(ti.gpu, offline_cache = True, random_seed = rand.randint(0, 10000))
 vec3 = tm.vec3
 
 @ti.func 
@@ -31,16 +29,6 @@ def getY(vector):
 def getZ(vector):
     return vector[2]
 
-@ti.func 
-def getRandomValueWithR(rSquared):
-    '''
-    Get a random value for a dimension of the vector for the random vector on the unit sphere
-    '''
-    r = rSquared ** 0.5
-    value = randomRange(-r, r)
-    rSquared -= value ** 2
-    return value, rSquared
-
 @ti.func
 def defaultVec():
     '''
@@ -55,25 +43,14 @@ def defaultKernelVec() -> vec3: #type: ignore
     '''
     return vec3(0, 0, 0)
 
-@ti.func
-def chooseX(rSquared):
-    '''
-    Choose between a negative or positive x
-    '''
-    x = rSquared ** 0.5
-    if ti.random() >= 0.5: 
-        x *= -1
-    return x 
-
 @ti.func 
 def randomVectorOnUnitSphere(rSquared = 1.0):
     '''
-    Create a random vector on the unit sphere for Lambertian reflfection
+    Create a random vector uniformly distributed on the unit sphere for Lambertian reflfection (so that the normal plus the vector is cosine distributed). The height is uniform by Archimedes' hat-box theorem as long as the angle around the z axis is uniform too
     '''
-    z, rSquared = getRandomValueWithR(rSquared)
-    y, rSquared = getRandomValueWithR(rSquared)
-    x = chooseX(rSquared)
-    return vec3(x, y, z)
+    z, angle = randomRange(-1.0, 1.0), 2 * tm.pi * ti.random()
+    r = tm.sqrt(ti.max(1 - z ** 2, 0.0))
+    return rSquared ** 0.5 * vec3(r * tm.cos(angle), r * tm.sin(angle), z)
 
 @ti.kernel 
 def magnitude(v: vec3) -> float: #type: ignore 
@@ -85,7 +62,7 @@ def nearZero(v):
     Checks whether all elements of the vector are near zero
     '''
     epsilon = 1e-5
-    return getX(v) < epsilon and getY(v) < epsilon and getZ(v) < epsilon
+    return ti.abs(getX(v)) < epsilon and ti.abs(getY(v)) < epsilon and ti.abs(getZ(v)) < epsilon
 
 @ti.func 
 def reflect(v, n):
@@ -0,0 +1,165 @@
+from .Materials import *
+from .Runtime import *
+
+MEGAKERNEL_RENDERER, WAVEFRONT_RENDERER = 'megakernel', 'wavefront' #The megakernel traces each pixel's whole path in one thread while the wavefront renderer runs every bounce of every path as separate kernels over queues of rays
+
+@ti.data_oriented
+class wavefrontRenderer:
+    '''
+    Path tracer that splits every bounce into separate kernels over queues of rays: generate primary rays, intersect them with the scene, shade the hits, and compact the rays that are still alive into the next queue. Hits are binned by material type before shading so that threads running next to each other take the same material branch. Light from emissive objects is added when rays hit them and when shading sends shadow rays towards them. The queues are structures of arrays with room for one ray per pixel
+    '''
+    def __init__(self, imageWidth: int, imageHeight: int):
+        self.imageHeight, self.capacity = imageHeight, imageWidth * imageHeight
+        self.rays = ti.Struct.field({
+            'origin': vec3,
+            'direction': vec3,
+            'throughput': vec3,
+            'scatterPdf': float,
+            'pixel': int
+        }, shape = (2, self.capacity), layout = ti.Layout.SOA) #The rays for the current bounce and the next bounce
+        self.hits = ti.Struct.field({
+            'pointHit': vec3,
+            'normalVector': vec3,
+            'frontFace': bool,
+            'materialIndex': int,
+            'alive': bool
+        }, shape = (self.capacity,), layout = ti.Layout.SOA)
+        self.shadeOrder = ti.field(int, shape = (self.capacity,)) #Ray indices sorted by the material type they hit
+        self.rayCounts, self.binCounts, self.hitCount = ti.field(int, shape = (2,)), ti.field(int, shape = (len(MATERIAL_TYPES),)), ti.field(int, shape = ())
+        self.sampleColorField = ti.Vector.field(3, float, shape = (imageWidth, imageHeight))
+
+    @ti.func
+    def pixelIndex(self, i, j):
+        return i * self.imageHeight + j
+
+    @ti.func
+    def pixelCoordinates(self, pixel):
+        return pixel // self.imageHeight, pixel % self.imageHeight
+
+    @ti.kernel
+    def generate(self, camera: ti.template(), sample: int, passIndex: int): #type: ignore
+        '''
+        Fill the first queue with one camera ray for every pixel that takes the frame's passIndex'th pass (the sample'th of the pass)
+        '''
+        self.rayCounts[0] = 0
+        for i, j in self.sampleColorField:
+            if passIndex < camera.pixelPasses(i, j):
+                rayIndex = ti.atomic_add(self.rayCounts[0], 1)
+                ray = camera.constructRay(i, j, camera.pixelStream(i, j, sample).get2D(PIXEL_DIMENSION))
+                self.rays[0, rayIndex].origin, self.rays[0, rayIndex].direction = ray.origin, ray.direction
+                self.rays[0, rayIndex].throughput, self.rays[0, rayIndex].pixel = vec3(1.0, 1.0, 1.0), self.pixelIndex(i, j)
+                self.rays[0, rayIndex].scatterPdf = 0.0
+        if ti.static(camera.countPaths):
+            camera.pathStatistics.pathCountField[None] += self.rayCounts[0]
+
+    @ti.kernel
+    def intersect(self, camera: ti.template(), sceneVersion: ti.template(), queue: int): #type: ignore
+        '''
+        Find the closest hit for every ray in the queue and count the hits for each material type. Rays add the light of emissive objects they hit to their pixel, and rays that miss everything add the sky's color
+        '''
+        for b in ti.static(range(len(MATERIAL_TYPES))):
+            self.binCounts[b] = 0
+        if ti.static(camera.countPaths):
+            camera.pathStatistics.rayCountField[None] += self.rayCounts[queue]
+        for rayIndex in range(self.rayCounts[queue]):
+            ray = ray3(self.rays[queue, rayIndex].origin, self.rays[queue, rayIndex].direction)
+            rayHitRecord = camera.hitObjects(ray, initDefaultHitRecord(camera.tInterval))
+            i, j = self.pixelCoordinates(self.rays[queue, rayIndex].pixel)
+            self.hits[rayIndex].alive = rayHitRecord.hitAnything
+            if rayHitRecord.hitAnything:
+                self.hits[rayIndex].pointHit, self.hits[rayIndex].normalVector = rayHitRecord.pointHit, rayHitRecord.normalVector
+                self.hits[rayIndex].frontFace, self.hits[rayIndex].materialIndex = rayHitRecord.frontFace, rayHitRecord.materialIndex
+                ti.atomic_add(self.binCounts[camera.materials[rayHitRecord.materialIndex].materialType], 1)
+                self.sampleColorField[i, j] += self.rays[queue, rayIndex].throughput * camera.emittedLight(rayHitRecord, ray.origin, self.rays[queue, rayIndex].scatterPdf)
+            else:
+                self.sampleColorField[i, j] += self.rays[queue, rayIndex].throughput * camera.skyColor(ray)
+
+    @ti.kernel
+    def binHits(self, camera: ti.template(), sceneVersion: ti.template(), queue: int) -> int: #type: ignore
+        '''
+        Write the indices of the rays that hit something into the shading order grouped by material type and return how many there are
+        '''
+        ti.loop_config(serialize = True)
+        for _ in range(1): #Turn the counts into the first position of each bin
+            runningCount = 0
+            for b in ti.static(range(len(MATERIAL_TYPES))):
+                binCount = self.binCounts[b]
+                self.binCounts[b] = runningCount
+                runningCount += binCount
+            self.hitCount[None] = runningCount
+
+        for rayIndex in range(self.rayCounts[queue]):
+            if self.hits[rayIndex].alive:
+                position = ti.atomic_add(self.binCounts[camera.materials[self.hits[rayIndex].materialIndex].materialType], 1)
+                self.shadeOrder[position] = rayIndex
+        return self.hitCount[None]
+
+    @ti.kernel
+    def shade(self, camera: ti.template(), sceneVersion: ti.template(), queue: int, numHits: int, depth: int, sample: int): #type: ignore
+        '''
+        Scatter every ray that hit something with its material in the shading order, replacing the ray with the scattered ray in place (the ray dies if it isn't scattered or loses the camera's Russian roulette). Rays that scatter also add the light from a shadow ray towards a random light to their pixel
+        '''
+        for k in range(numHits):
+            rayIndex = self.shadeOrder[k]
+            rayHitRecord = initDefaultHitRecord(camera.tInterval)
+            rayHitRecord.hitAnything, rayHitRecord.pointHit, rayHitRecord.initRayDir = True, self.hits[rayIndex].pointHit, self.rays[queue, rayIndex].direction
+            rayHitRecord.normalVector, rayHitRecord.frontFace, rayHitRecord.materialIndex = self.hits[rayIndex].normalVector, self.hits[rayIndex].frontFace, self.hits[rayIndex].materialIndex
+
+            i, j = self.pixelCoordinates(self.rays[queue, rayIndex].pixel)
+            stream = camera.pixelStream(i, j, sample) #The same stream as the megakernel's sample, so both renderers take the same samples
+            choice = stream.get2D(bounceDimension(depth, CHOICE_DIMENSION))
+            didRayScatter, rayScatter, rayColor = camera.scatter(rayHitRecord, stream.get2D(bounceDimension(depth, SCATTER_DIMENSION)), choice[0])
+            if didRayScatter:
+                if depth + 1 < camera.maxDepth:
+                    self.sampleColorField[i, j] += self.rays[queue, rayIndex].throughput * camera.directLight(rayHitRecord, camera.tInterval, stream.get2D(bounceDimension(depth, LIGHT_DIMENSION)))
+                self.rays[queue, rayIndex].scatterPdf = camera.materials[rayHitRecord.materialIndex].scatterPdf(rayHitRecord, rayScatter.direction)
+                didRayScatter, self.rays[queue, rayIndex].throughput = camera.russianRoulette(depth, self.rays[queue, rayIndex].throughput * rayColor, choice[1])
+                self.rays[queue, rayIndex].origin, self.rays[queue, rayIndex].direction = rayScatter.origin, rayScatter.direction
+            self.hits[rayIndex].alive = didRayScatter
+
+    @ti.kernel
+    def compact(self, queue: int):
+        '''
+        Move the rays that are still alive to the front of the next queue
+        '''
+        nextQueue = 1 - queue
+        self.rayCounts[nextQueue] = 0
+        for rayIndex in range(self.rayCounts[queue]):
+            if self.hits[rayIndex].alive:
+                nextIndex = ti.atomic_add(self.rayCounts[nextQueue], 1)
+                self.rays[nextQueue, nextIndex] = self.rays[queue, rayIndex]
+        self.rayCounts[queue] = 0
+
+    def compileKernels(self, camera):
+        '''
+        Compile every kernel used to trace a sample without running them
+        '''
+        compileKernel(self.generate, camera, 0, 0)
+        compileKernel(self.intersect, camera, camera.sceneVersion, 0)
+        compileKernel(self.binHits, camera, camera.sceneVersion, 0)
+        compileKernel(self.shade, camera, camera.sceneVersion, 0, 0, 0, 0)
+        compileKernel(self.compact, 0)
+
+    def traceSample(self, camera, sample, passIndex):
+        '''
+        Trace the sample'th sample of the frame's passIndex'th pass for every pixel through up to maxDepth bounces, adding the light that reaches the camera to the sample colors
+        '''
+        self.generate(camera, sample, passIndex)
+        queue = 0
+        for depth in range(camera.maxDepth):
+            self.intersect(camera, camera.sceneVersion, queue)
+            numHits = self.binHits(camera, camera.sceneVersion, queue)
+            if numHits == 0:
+                break
+            self.shade(camera, camera.sceneVersion, queue, numHits, depth, sample)
+            self.compact(queue)
+            queue = 1 - queue
+
+    def render(self, camera, passIndex):
+        '''
+        Trace samplesPerPixel samples for every pixel that takes the frame's passIndex'th pass and return the field with the sum of their colors
+        '''
+        self.sampleColorField.fill(0)
+        for sample in range(camera.samplesPerPixel):
+            self.traceSample(camera, sample, passIndex)
+        return self.sampleColorField
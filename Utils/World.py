@@ -1,29 +1,507 @@
-from Objects import * 
+from .Objects import * 
+from .Instances import *
+from .Lights import *
+from .Meshes import *
+import numpy as np 
 
 @ti.data_oriented 
-class World: 
+class World(BVHTree): 
     '''
-    Sets the world scene for all hittable objects
+    Sets the world scene for all hittable objects. The spheres are stored as a structure of arrays in Taichi fields and triangle meshes as flat vertex and triangle fields, so the kernels stay the same size no matter how many objects there are. Groups of objects can also be placed many times with instances (see instanceStorage). Spheres come first in the object indices, then triangles, then instances. Spheres and triangles with emissive materials are gathered into a light list (see lightList) that renderers send shadow rays towards. Rays are intersected with the objects by walking the BVH tree (built with treeBuilder) unless useTree is turned off (then every object gets checked). With a tree cache (a bvhCache) built trees are saved to disk and trees for scenes that were built before are loaded from it
     '''
-    def __init__(self):
-        self.hittableList = []
-    
-    @ti.kernel 
-    def addHittable(self, hittableObject: ti.template()): #type: ignore
+    def __init__(self, useTree = True, treeBuilder = LBVH_BUILDER, countTraversal = False, treeCache = None):
+        super().__init__(treeBuilder, countTraversal)
+        self.treeCache = treeCache
+        self.useTree, self.treeOutdated, self.materialsOutdated, self.spheresMoved = useTree, True, True, False
+        self.refitThreshold, self.builtSAHCost = 1.5, 0.0 #The tree is rebuilt when refitting makes it this many times more expensive to trace than it was when it was built
+        self.materialList, self.sphereChunks = [], []
+        self.numSpheres, self.sphereCapacity, self.sphereFields = 0, 0, None
+        self.materialCapacity, self.materialFields = 0, None
+        self.meshChunks, self.numTriangles, self.vertexCapacity, self.triangleCapacity, self.meshFields = [], 0, 0, 0, None
+        self.numSpheresField = ti.field(int, shape = ()) #Objects with an index below this are spheres and the rest are triangles
+        self.groups, self.instanceChunks, self.numInstances, self.instanceBoxes = [], [], 0, np.zeros((0, 6), np.float32)
+        self.instancing, self.instanceStorage, self.groupBuilder = False, None, None #Instances are compiled out of the kernels until the first one is uploaded
+        self.lightList, self.lightSampling = lightList(), True #With light sampling off, emissive objects are only found by the rays that Lambertian materials scatter
+        
+    def addMaterial(self, material):
+        '''
+        Add a material to the world's material table (if it isn't there already) and return its material index
+        '''
+        for i, worldMaterial in enumerate(self.materialList):
+            if worldMaterial is material: 
+                return i 
+        getMaterialType(material) #Make sure that it's a material before adding it
+        self.materialList.append(material)
+        self.materialsOutdated = True 
+        return len(self.materialList) - 1
+
+    def setMaterial(self, materialIndex: int, material):
+        '''
+        Replace the material at materialIndex. This only changes the material table so nothing has to be compiled again
+        '''
+        getMaterialType(material)
+        self.materialList[materialIndex] = material 
+        self.materialsOutdated = True 
+
+    def reserveMaterials(self, numMaterials: int):
+        '''
+        Make sure that the material table has room for numMaterials materials, reallocating it with at least double the capacity if it doesn't
+        '''
+        if numMaterials <= self.materialCapacity:
+            return 
+        
+        self.materialCapacity = max(numMaterials, 2 * self.materialCapacity)
+        if self.materialFields is not None:
+            self.materialFields.destroy()
+
+        self.materials = materialProperties.field()
+        fieldsBuilder = ti.FieldsBuilder()
+        fieldsBuilder.dense(ti.i, self.materialCapacity).place(self.materials)
+        self.materialFields = fieldsBuilder.finalize()
+        self.sceneVersion += 1
+
+    def uploadMaterials(self):
+        '''
+        Copy the material list into the material table
+        '''
+        self.reserveMaterials(max(len(self.materialList), 1))
+        padding = self.materialCapacity - len(self.materialList)
+        self.materials.from_numpy({member: np.pad(values, ((0, padding),) + ((0, 0),) * (values.ndim - 1)) for member, values in createMaterialTable(self.materialList).items()})
+        self.materialsOutdated = False 
+
+    def addSpheres(self, centers, radii, materialIndices):
+        '''
+        Add many spheres at once from arrays of centers (n x 3), radii (n), and material indices (n) from addMaterial
+        '''
+        self.sphereChunks.append(validateSpheres(self, centers, radii, materialIndices))
+        self.treeOutdated = True 
+
+    def addHittable(self, hittableObject): #type: ignore
         '''
         Add a hittable object and its classification 
         '''
-        self.hittableList.append(hittableObject)
+        self.addSpheres([hittableObject.center], [hittableObject.radius], [self.addMaterial(hittableObject.material)])
+
+    def reserveSpheres(self, numSpheres: int):
+        '''
+        Make sure that the sphere fields have room for numSpheres spheres, reallocating them with at least double the capacity if they don't
+        '''
+        if numSpheres <= self.sphereCapacity:
+            return 
+        
+        self.sphereCapacity = max(numSpheres, 2 * self.sphereCapacity)
+        if self.sphereFields is not None:
+            self.sphereFields.destroy()
+
+        self.spheres = ti.Struct.field({
+            'center': vec3, 
+            'radius': float, 
+            'materialIndex': int 
+        })
+        fieldsBuilder = ti.FieldsBuilder()
+        for member in (self.spheres.center, self.spheres.radius, self.spheres.materialIndex): #Place every member on its own so that the spheres are a structure of arrays
+            fieldsBuilder.dense(ti.i, self.sphereCapacity).place(member)
+        self.sphereFields = fieldsBuilder.finalize()
+        self.sceneVersion += 1
+
+    def addMesh(self, vertices, triangles, materialIndices):
+        '''
+        Add a triangle mesh from arrays of vertices (n x 3), triangles (m x 3 indices into the vertices), and a material index from addMaterial for the whole mesh or for every triangle (m)
+        '''
+        self.meshChunks.append(validateMesh(self, vertices, triangles, materialIndices))
+        self.treeOutdated = True 
+
+    def addMeshFile(self, path: str, material, center = None, size = None):
+        '''
+        Load an OBJ or PLY mesh and add it with one material. With a center and size the mesh is moved and scaled to fit in a cube of that size around the center
+        '''
+        vertices, triangles = loadMesh(path)
+        if center is not None and size is not None:
+            vertices = fitVertices(vertices, center, size)
+        self.addMesh(vertices, triangles, self.addMaterial(material))
+
+    def reserveMeshes(self, numVertices: int, numTriangles: int):
+        '''
+        Make sure that the mesh fields have room for numVertices vertices and numTriangles triangles, reallocating them with at least double the capacity if they don't
+        '''
+        if numVertices <= self.vertexCapacity and numTriangles <= self.triangleCapacity:
+            return 
+        
+        self.vertexCapacity, self.triangleCapacity = max(numVertices, 2 * self.vertexCapacity), max(numTriangles, 2 * self.triangleCapacity)
+        if self.meshFields is not None:
+            self.meshFields.destroy()
+
+        self.vertices = ti.Vector.field(3, float)
+        self.triangles = ti.Struct.field({
+            'vertexIndices': ti.types.vector(3, int), 
+            'materialIndex': int 
+        })
+        fieldsBuilder = ti.FieldsBuilder()
+        fieldsBuilder.dense(ti.i, self.vertexCapacity).place(self.vertices)
+        for member in (self.triangles.vertexIndices, self.triangles.materialIndex):
+            fieldsBuilder.dense(ti.i, self.triangleCapacity).place(member)
+        self.meshFields = fieldsBuilder.finalize()
+        self.sceneVersion += 1
+
+    def joinMeshChunks(self):
+        '''
+        Join the meshes that were added into one mesh (offsetting every mesh's vertex indices past the vertices before it) and keep them joined
+        '''
+        if not self.meshChunks:
+            self.meshChunks = [(np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int32), np.zeros(0, np.int32))]
+        if len(self.meshChunks) > 1:
+            vertexOffsets = np.cumsum([0] + [len(vertices) for vertices, _, _ in self.meshChunks[:-1]])
+            vertices = np.concatenate([vertices for vertices, _, _ in self.meshChunks])
+            triangles = np.concatenate([triangles + offset for (_, triangles, _), offset in zip(self.meshChunks, vertexOffsets)])
+            materialIndices = np.concatenate([materialIndices for _, _, materialIndices in self.meshChunks])
+            self.meshChunks = [(vertices, triangles, materialIndices)]
+        return self.meshChunks[0]
+
+    def uploadMeshes(self):
+        '''
+        Copy the meshes that were added into the mesh fields at once
+        '''
+        vertices, triangles, materialIndices = self.joinMeshChunks()
+        self.numTriangles = len(triangles)
+
+        self.reserveMeshes(max(len(vertices), 1), max(self.numTriangles, 1))
+        self.vertices.from_numpy(np.pad(vertices, ((0, self.vertexCapacity - len(vertices)), (0, 0))))
+        padding = self.triangleCapacity - self.numTriangles 
+        self.triangles.from_numpy({'vertexIndices': np.pad(triangles, ((0, padding), (0, 0))), 'materialIndex': np.pad(materialIndices, (0, padding))})
+
+    def createGroup(self):
+        '''
+        Create an empty group to add objects to (like the world) and place in the world with addInstances
+        '''
+        group = instanceGroup(self, len(self.groups))
+        self.groups.append(group)
+        return group 
+
+    def addInstances(self, group, transforms):
+        '''
+        Place copies of a group in the world, one for every object to world transform (n x 4 x 4 or n x 3 x 4 affine matrices, or a single matrix). The copies share the group's objects and tree
+        '''
+        if group.world is not self:
+            raise ValueError('Groups can only be placed in the world that created them')
+        worldToObject = affineTransforms(transforms)
+        objectToWorld = np.asarray(transforms, dtype = np.float32).reshape(len(worldToObject), -1, 4)[:, :3]
+        self.instanceChunks.append((np.full(len(worldToObject), group.groupIndex, np.int32), objectToWorld, worldToObject))
+        self.treeOutdated = True 
+
+    def addInstance(self, group, transform = np.eye(4)):
+        self.addInstances(group, [transform])
+
+    def buildGroup(self, group):
+        '''
+        Build a group's tree (with a world of its own that's reused for every group so that its kernels are only compiled once) and return the group's objects followed by the tree's leaves and nodes
+        '''
+        if group.builtGroup is None:
+            if self.groupBuilder is None:
+                self.groupBuilder = World(treeBuilder = self.treeBuilder, treeCache = self.treeCache)
+            builder = self.groupBuilder 
+            builder.sphereChunks, builder.meshChunks = list(group.sphereChunks), list(group.meshChunks)
+            builder.compileTree()
+            if builder.numLeaves[None] == 0:
+                raise ValueError('Groups need at least one object to be placed in the world')
+            group.builtGroup = builder.joinSphereChunks() + builder.joinMeshChunks() + builder.treeArrays()
+        return group.builtGroup 
+
+    def uploadInstances(self):
+        '''
+        Build the trees of the groups that changed and copy the groups and instances into the instance fields at once. Instances are placed in the world's tree by their bounding boxes in the world, which are the group's root box moved by the instance's transform
+        '''
+        if not self.instanceChunks:
+            return 
+        groupIndices, objectToWorld, worldToObject = [np.concatenate(arrays) for arrays in zip(*self.instanceChunks)]
+        self.instanceChunks = [(groupIndices, objectToWorld, worldToObject)]
+        builtGroups = [self.buildGroup(group) for group in self.groups]
+        rootBoxes = np.array([(leaves if len(leaves) == 1 else nodes)['boundingBox'][0] for *_, leaves, nodes in builtGroups])
+        self.numInstances, self.instanceBoxes = len(groupIndices), transformBoundingBoxes(rootBoxes[groupIndices], objectToWorld)
+
+        if self.instanceStorage is None:
+            self.instancing, self.instanceStorage = True, instanceStorage()
+        groupsReallocated = self.instanceStorage.uploadGroups(builtGroups)
+        if self.instanceStorage.uploadInstances(self.numSpheres + self.numTriangles, groupIndices, worldToObject, self.instanceBoxes) or groupsReallocated:
+            self.sceneVersion += 1
+
+    def joinSphereChunks(self):
+        '''
+        Join the chunks of spheres that were added into one array for each member (and keep them joined so that they aren't joined again)
+        '''
+        if not self.sphereChunks:
+            self.sphereChunks = [(np.zeros((0, 3), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32))]
+        centers, radii, materialIndices = [np.concatenate(arrays) for arrays in zip(*self.sphereChunks)]
+        self.sphereChunks = [(centers, radii, materialIndices)]
+        return centers, radii, materialIndices 
+
+    def updateSpheres(self, centers, radii = None):
+        '''
+        Move every sphere to a new center (and optionally change their radii) for animation. The tree gets refit around the spheres the next time the scene is updated instead of being built again
+        '''
+        oldCenters, oldRadii, materialIndices = self.joinSphereChunks()
+        centers = np.asarray(centers, dtype = np.float32).reshape(-1, 3)
+        radii = oldRadii if radii is None else np.asarray(radii, dtype = np.float32).reshape(-1)
+        if len(centers) != len(oldCenters) or len(radii) != len(oldRadii):
+            raise ValueError('Every sphere needs a new center and radius (use addSpheres to add spheres)')
+        
+        self.sphereChunks = [(centers, radii, materialIndices)]
+        self.spheresMoved = True 
+
+    def uploadSpheres(self):
+        '''
+        Copy all of the spheres into the sphere fields at once
+        '''
+        centers, radii, materialIndices = self.joinSphereChunks()
+        self.numSpheres = len(radii)
+        self.numSpheresField[None] = self.numSpheres 
+
+        self.reserveSpheres(max(self.numSpheres, 1))
+        padding = self.sphereCapacity - self.numSpheres 
+        self.spheres.from_numpy({
+            'center': np.pad(centers, ((0, padding), (0, 0))), 
+            'radius': np.pad(radii, (0, padding)), 
+            'materialIndex': np.pad(materialIndices, (0, padding))
+        })
+        
+    @ti.func 
+    def sphereBoundingBox(self, sphereIndex):
+        radiusVector = vec3(self.spheres[sphereIndex].radius, self.spheres[sphereIndex].radius, self.spheres[sphereIndex].radius)
+        minPoint, maxPoint = self.spheres[sphereIndex].center - radiusVector, self.spheres[sphereIndex].center + radiusVector
+        return aabb(setInterval(getX(minPoint), getX(maxPoint)), setInterval(getY(minPoint), getY(maxPoint)), setInterval(getZ(minPoint), getZ(maxPoint)))
+
+    @ti.func 
+    def triangleVertices(self, triangleIndex):
+        vertexIndices = self.triangles[triangleIndex].vertexIndices
+        return self.vertices[vertexIndices[0]], self.vertices[vertexIndices[1]], self.vertices[vertexIndices[2]]
+
+    @ti.func 
+    def triangleBoundingBox(self, triangleIndex):
+        '''
+        Return the triangle's bounding box padded a little on every axis so that triangles lying in an axis aligned plane don't get flat boxes (rays never hit those since the box test needs the ray to spend time inside of the box)
+        '''
+        vertex0, vertex1, vertex2 = self.triangleVertices(triangleIndex)
+        minPoint, maxPoint = ti.min(vertex0, vertex1, vertex2), ti.max(vertex0, vertex1, vertex2)
+        padding = 1e-4 * ti.max(tm.length(maxPoint - minPoint), 1e-3)
+        minPoint, maxPoint = minPoint - padding, maxPoint + padding 
+        return aabb(setInterval(getX(minPoint), getX(maxPoint)), setInterval(getY(minPoint), getY(maxPoint)), setInterval(getZ(minPoint), getZ(maxPoint)))
+
+    @ti.func 
+    def instanceIndex(self, objectIndex):
+        '''
+        Return the object's index among the instances (negative when the object isn't an instance)
+        '''
+        instanceIndex = -1
+        if ti.static(self.instancing):
+            instanceIndex = objectIndex - self.instanceStorage.firstInstanceField[None]
+        return instanceIndex 
+
+    @ti.func 
+    def objectBoundingBox(self, objectIndex):
+        boundingBox, instanceIndex = aabb(), self.instanceIndex(objectIndex)
+        if objectIndex < self.numSpheresField[None]:
+            boundingBox = self.sphereBoundingBox(objectIndex)
+        elif instanceIndex >= 0:
+            if ti.static(self.instancing):
+                boundingBox = self.instanceStorage.instances[instanceIndex].boundingBox
+        else: 
+            boundingBox = self.triangleBoundingBox(objectIndex - self.numSpheresField[None])
+        return boundingBox 
+
+    @ti.kernel 
+    def initLeaves(self, sceneVersion: ti.template(), numObjects: int): #type: ignore
+        '''
+        Fill the leaves field with the bounding boxes and object indicies for compiling the BVH Tree 
+        '''
+        self.numLeaves[None] = numObjects
+        for i in ti.ndrange(numObjects):
+            self.leaves[i].objectIndex = i 
+            self.leaves[i].boundingBox = self.objectBoundingBox(i)
+
+    @ti.kernel 
+    def updateLeafBoundingBoxes(self, sceneVersion: ti.template()): #type: ignore
+        '''
+        Recalculate the leaves' bounding boxes from the spheres without changing their order
+        '''
+        for i in ti.ndrange(self.numLeaves[None]):
+            self.leaves[i].boundingBox = self.objectBoundingBox(self.leaves[i].objectIndex)
+
+    def rebuildTree(self):
+        '''
+        Build the BVH Tree from scratch over the spheres and triangles in the object fields (or load it from the tree cache). Trees too deep for the traversal stack raise a ValueError (refitting keeps the structure of the tree, so its depth only changes here)
+        '''
+        numObjects = self.numSpheres + self.numTriangles + self.numInstances 
+        cacheKey = self.treeCache.treeKey(self) if self.treeCache is not None and numObjects > 0 else None 
+        if cacheKey is None or not self.treeCache.load(self, cacheKey):
+            self.reserveLeaves(max(numObjects, 1))
+            self.initLeaves(self.sceneVersion, numObjects)
+            self.buildTree()
+            if cacheKey is not None:
+                self.treeCache.store(self, cacheKey)
+        self.checkTreeDepth()
+        self.builtSAHCost = self.sahCost()
+
+    def refitTree(self):
+        '''
+        Refit the BVH Tree around the spheres after they moved. Refitting keeps the structure of the tree, so when the objects moved far enough to make the tree's SAH cost grow past refitThreshold times its cost after it was built, the tree gets rebuilt instead
+        '''
+        self.updateLeafBoundingBoxes(self.sceneVersion)
+        self.refit()
+        if self.sahCost() > self.refitThreshold * self.builtSAHCost:
+            self.rebuildTree()
+
+    def compileTree(self):
+        '''
+        Compile the BVH Tree for the world
+        '''
+        self.uploadSpheres()
+        self.uploadMeshes()
+        self.uploadInstances()
+        self.rebuildTree()
+        self.treeOutdated, self.spheresMoved = False, False 
+
+    def updateScene(self):
+        '''
+        Upload the material table again if materials changed, compile the BVH Tree again if objects were added, and refit it if objects moved since the scene was last updated. Returns whether anything changed
+        '''
+        sceneChanged, lightsOutdated = self.materialsOutdated or self.treeOutdated or self.spheresMoved, self.materialsOutdated or self.treeOutdated 
+        if self.materialsOutdated:
+            self.uploadMaterials()
+        if self.treeOutdated:
+            self.compileTree()
+        elif self.spheresMoved:
+            self.uploadSpheres()
+            self.refitTree()
+            self.spheresMoved = False 
+        if lightsOutdated:
+            self.uploadLights()
+        return sceneChanged
+
+    def uploadLights(self):
+        '''
+        Fill the light list with the spheres and triangles that have emissive materials
+        '''
+        emissive = np.array([getMaterialType(material) == EMISSIVE for material in self.materialList] + [False])
+        _, _, sphereMaterials = self.joinSphereChunks()
+        _, _, triangleMaterials = self.joinMeshChunks()
+        if self.lightList.uploadLights(np.flatnonzero(emissive[np.concatenate([sphereMaterials, triangleMaterials])])):
+            self.sceneVersion += 1
+
+    @ti.func 
+    def hitLeaf(self, objectIndex, ray, rayHitRecord):
+        '''
+        Check whether the ray hits the object with the given index before the closest hit so far
+        '''
+        tempHitRecord, materialIndex, instanceIndex = initDefaultHitRecord(rayHitRecord.tInterval), 0, self.instanceIndex(objectIndex)
+        if objectIndex < self.numSpheresField[None]:
+            tempHitRecord = hitSphere(self.spheres[objectIndex].center, self.spheres[objectIndex].radius, ray, tempHitRecord)
+            materialIndex = self.spheres[objectIndex].materialIndex
+        elif instanceIndex >= 0:
+            if ti.static(self.instancing):
+                tempHitRecord = self.instanceStorage.hitInstance(instanceIndex, ray, tempHitRecord)
+                materialIndex = tempHitRecord.materialIndex 
+        else: 
+            triangleIndex = objectIndex - self.numSpheresField[None]
+            vertex0, vertex1, vertex2 = self.triangleVertices(triangleIndex)
+            tempHitRecord = hitTriangle(vertex0, vertex1, vertex2, ray, tempHitRecord)
+            materialIndex = self.triangles[triangleIndex].materialIndex
+        if tempHitRecord.hitAnything:
+            rayHitRecord = copyHitRecord(tempHitRecord)
+            rayHitRecord.materialIndex, rayHitRecord.objectIndex = materialIndex, objectIndex
+        return rayHitRecord
     
     @ti.func
-    def hitObjects(self, ray, rayHitRecord):
+    def hitAllObjects(self, ray, rayHitRecord):
         '''
-        Iterate through the hittable objects list and check the smallest t that it intersects with to get the closest possible object
+        Iterate through all of the objects and check the smallest t that it intersects with to get the closest possible object
         '''
-        for i in ti.static(range(len(self.hittableList))):
-            tempHitRecord = self.hittableList[i].hit(ray, initDefaultHitRecord(rayHitRecord.tInterval))
-            if tempHitRecord.hitAnything:
-                rayHitRecord = copyHitRecord(tempHitRecord)
+        for i in range(self.numLeaves[None]):
+            rayHitRecord = self.hitLeaf(i, ray, rayHitRecord)
+        return rayHitRecord
 
+    @ti.func
+    def hitObjects(self, ray, rayHitRecord):
+        '''
+        Return the hit record for the closest object that the ray hits
+        '''
+        if ti.static(self.useTree):
+            rayHitRecord = self.walkTree(ray, rayHitRecord)
+        else:
+            rayHitRecord = self.hitAllObjects(ray, rayHitRecord)
+            if ti.static(self.countTraversal):
+                self.traversalStatistics.addRay(ti.Vector([0, self.numLeaves[None], 0]))
         return rayHitRecord
-    
+
+    @ti.func 
+    def traversalCost(self, ray, rayHitRecord):
+        '''
+        Return the number of box tests, object tests, and nodes visited to find the closest object that the ray hits
+        '''
+        cost = ti.Vector([0, self.numLeaves[None], 0])
+        if ti.static(self.useTree):
+            _, cost = self.traverseTree(ray, rayHitRecord, True)
+        return cost 
+
+    @ti.func 
+    def lightPdf(self, objectIndex, point, lightPoint):
+        '''
+        Return the solid angle density of sampleLight picking the direction from the point to the light point on a light in the light list
+        '''
+        pdf = 0.0
+        if objectIndex < self.numSpheresField[None]:
+            pdf = sphereLightPdf(self.spheres[objectIndex].center, self.spheres[objectIndex].radius, point)
+        else:
+            vertex0, vertex1, vertex2 = self.triangleVertices(objectIndex - self.numSpheresField[None])
+            pdf = triangleLightPdf(vertex0, vertex1, vertex2, point, lightPoint)
+        return pdf / self.lightList.numLightsField[None]
+
+    @ti.func 
+    def sampleLight(self, point, u):
+        '''
+        Pick a light uniformly from the light list and sample a direction towards it from the point with the point u in the unit square. Returns the light's object index, the direction, and its solid angle density
+        '''
+        numLights = self.lightList.numLightsField[None]
+        lightIndex = ti.min(int(u[0] * numLights), numLights - 1)
+        lightSample = tm.vec2(ti.min(u[0] * numLights - lightIndex, 1 - 1e-6), u[1]) #Stretch the part of u[0] that picked the light back over [0, 1) so the light's sample keeps its stratification
+        objectIndex = self.lightList.lights[lightIndex]
+        direction, pdf = defaultVec(), 0.0
+        if objectIndex < self.numSpheresField[None]:
+            direction, pdf = sampleSphereLight(self.spheres[objectIndex].center, self.spheres[objectIndex].radius, point, lightSample)
+        else:
+            vertex0, vertex1, vertex2 = self.triangleVertices(objectIndex - self.numSpheresField[None])
+            direction, pdf = sampleTriangleLight(vertex0, vertex1, vertex2, point, lightSample)
+        return objectIndex, direction, pdf / numLights
+
+    @ti.func 
+    def directLight(self, rayHitRecord, tInterval, u):
+        '''
+        Next event estimation: send a shadow ray from the hit point towards a light picked with the point u in the unit square and return the light that reaches the camera through the hit's material (for each unit of throughput), weighted against the material sampling the same direction with the power heuristic. Only Lambertian materials are lit this way
+        '''
+        light = vec3(0.0, 0.0, 0.0)
+        if ti.static(self.lightSampling):
+            if self.lightList.numLightsField[None] > 0:
+                objectIndex, direction, lightPdf = self.sampleLight(rayHitRecord.pointHit, u)
+                scatterPdf = self.materials[rayHitRecord.materialIndex].scatterPdf(rayHitRecord, direction)
+                if lightPdf > 0 and scatterPdf > 0:
+                    shadowHitRecord = self.hitObjects(ray3(rayHitRecord.pointHit, direction), initDefaultHitRecord(tInterval))
+                    if shadowHitRecord.hitAnything and shadowHitRecord.objectIndex == objectIndex: #Nothing blocks the light
+                        emittedLight = self.materials[shadowHitRecord.materialIndex].emitted()
+                        light = self.materials[rayHitRecord.materialIndex].color * scatterPdf * emittedLight / lightPdf * powerHeuristic(lightPdf, scatterPdf) #A Lambertian material's color / pi * cos is its color times its scatter density
+        return light 
+
+    @ti.func 
+    def emittedLight(self, rayHitRecord, rayOrigin, scatterPdf):
+        '''
+        Return the light given off by the object that a ray from rayOrigin hit. When the ray was scattered by a material that's also lit with next event estimation (scatterPdf > 0) and the object is in the light list, the light is weighted against light sampling picking the same direction
+        '''
+        light = self.materials[rayHitRecord.materialIndex].emitted()
+        if ti.static(self.lightSampling):
+            if scatterPdf > 0 and self.lightList.numLightsField[None] > 0 and self.materials[rayHitRecord.materialIndex].materialType == EMISSIVE and self.instanceIndex(rayHitRecord.objectIndex) < 0:
+                light *= powerHeuristic(scatterPdf, self.lightPdf(rayHitRecord.objectIndex, rayOrigin, rayHitRecord.pointHit))
+        return light 
+
+    @ti.func 
+    def scatter(self, rayHitRecord, u, uChoice):
+        '''
+        Scatter the ray with the material of the object that it hit
+        '''
+        return self.materials[rayHitRecord.materialIndex].scatter(rayHitRecord, u, uChoice)
@@ -1,7 +1,9 @@
-import os 
-import sys 
+import time
+importStart = time.perf_counter()
 
-WORKING_DIR = os.getcwd()
-sys.path.append(os.path.join(WORKING_DIR, 'Utils'))
+from .Runtime import *
+from .Camera import *
+from .SceneFiles import *
+from .AOT import *
 
-from Camera import *
+startupTimes['import'] = time.perf_counter() - importStart